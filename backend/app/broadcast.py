@@ -0,0 +1,122 @@
+from typing import Dict, Any, Optional, Set
+from fastapi import WebSocket
+from loguru import logger
+import asyncio
+import os
+
+from .kpi import kpi_summary
+
+# One poller per process reads the KPI store and fans the result out to every
+# /ws/dashboard socket, so Neo4j load does not grow with the number of sockets.
+WS_DASHBOARD_INTERVAL_S = float(os.getenv("WS_DASHBOARD_INTERVAL_S", "2"))
+# A socket that cannot take a message within this long is dropped
+WS_SEND_TIMEOUT_S = float(os.getenv("WS_SEND_TIMEOUT_S", "10"))
+
+SECTIONS = ("kpis", "clusters", "components")
+EMPTY_PAYLOAD = {
+    "kpis": {"taxpayers": 0, "invoices": 0, "returns": 0, "high_risk_taxpayers": 0, "high_risk_invoices": 0},
+    "clusters": {},
+    "components": {},
+}
+
+
+class Subscriber:
+    """One socket's outbox: at most one pending message, replaced rather than queued."""
+
+    def __init__(self):
+        self.pending: Optional[Dict[str, Any]] = None
+        self.ready = asyncio.Event()
+
+    def offer(self, message: Dict[str, Any]):
+        if self.pending is not None:
+            # The client has not taken the last diff yet; folding diffs together
+            # could lose removals, so it gets the whole current payload instead
+            message = snapshot_message(message["seq"])
+        self.pending = message
+        self.ready.set()
+
+    async def take(self) -> Dict[str, Any]:
+        await self.ready.wait()
+        self.ready.clear()
+        message, self.pending = self.pending, None
+        return message
+
+
+_subscribers: Set[Subscriber] = set()
+_latest: Dict[str, Any] = EMPTY_PAYLOAD
+_seq = 0
+
+
+def diff(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """Changed and added keys per section; keys that disappeared map to None."""
+    changes: Dict[str, Any] = {}
+    for section in SECTIONS:
+        before, after = old.get(section, {}), new.get(section, {})
+        changed = {k: v for k, v in after.items() if before.get(k) != v}
+        changed.update({k: None for k in before if k not in after})
+        if changed:
+            changes[section] = changed
+    return changes
+
+
+def snapshot_message(seq: int) -> Dict[str, Any]:
+    return {"type": "snapshot", "seq": seq, **_latest}
+
+
+def publish(payload: Dict[str, Any]):
+    """Record the latest payload and offer its diff to every subscriber; no-op if nothing changed."""
+    global _latest, _seq
+    changes = diff(_latest, payload)
+    if not changes:
+        return
+    _latest, _seq = payload, _seq + 1
+    message = {"type": "diff", "seq": _seq, **changes}
+    for subscriber in _subscribers:
+        subscriber.offer(message)
+
+
+async def poll_loop():
+    """Publish the global KPI summary every WS_DASHBOARD_INTERVAL_S; runs until cancelled.
+
+    A failed poll publishes nothing, so subscribers keep the last good payload.
+
+    Also keeps the KPI store's global entry warm for /dashboard-summary.
+    """
+    while True:
+        try:
+            publish(await kpi_summary())
+        except Exception as e:
+            # Keep the last good payload: sockets see no change rather than zeros
+            # and back. Logged at debug since the mock-backed demo runs without Neo4j.
+            logger.debug(f"dashboard poll failed: {e}")
+        await asyncio.sleep(max(WS_DASHBOARD_INTERVAL_S, 0.1))
+
+
+async def _send(ws: WebSocket, subscriber: Subscriber):
+    while True:
+        message = await subscriber.take()
+        await asyncio.wait_for(ws.send_json(message), WS_SEND_TIMEOUT_S)
+
+
+async def _receive(ws: WebSocket):
+    # Clients send nothing; reading only notices the socket closing between changes
+    while (await ws.receive())["type"] != "websocket.disconnect":
+        pass
+
+
+async def serve(ws: WebSocket):
+    """Send the current payload, then diffs as they are published, until the socket goes away."""
+    subscriber = Subscriber()
+    subscriber.offer(snapshot_message(_seq))
+    _subscribers.add(subscriber)
+    tasks = [asyncio.create_task(_send(ws, subscriber)), asyncio.create_task(_receive(ws))]
+    try:
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+        for task in done:
+            if isinstance(task.exception(), asyncio.TimeoutError):
+                logger.info("dropping slow dashboard socket")
+                await ws.close()
+    finally:
+        _subscribers.discard(subscriber)
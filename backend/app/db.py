@@ -2,15 +2,28 @@ import os
 from neo4j import AsyncGraphDatabase
 from motor.motor_asyncio import AsyncIOMotorClient
 
+from .neo4j_guard import GuardedDriver
+
 NEO4J_URI = os.getenv("NEO4J_URI", "bolt://localhost:7687")
 NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
 NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "neo4j")
 NEO4J_DB = os.getenv("NEO4J_DB", "neo4j")
+# Bounds connecting and waiting for a pooled connection, so an unreachable
+# server fails fast instead of after the driver's default of a minute
+NEO4J_CONNECT_TIMEOUT_S = float(os.getenv("NEO4J_CONNECT_TIMEOUT_S", "3"))
 
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
 MONGO_DB = os.getenv("MONGO_DB", "gstkg")
 
 
-neo4j_driver = AsyncGraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+neo4j_driver = GuardedDriver(
+    AsyncGraphDatabase.driver(
+        NEO4J_URI,
+        auth=(NEO4J_USER, NEO4J_PASSWORD),
+        connection_timeout=NEO4J_CONNECT_TIMEOUT_S,
+        connection_acquisition_timeout=NEO4J_CONNECT_TIMEOUT_S,
+    ),
+    NEO4J_DB,
+)
 mongo_client = AsyncIOMotorClient(MONGO_URI)
 mongo_db = mongo_client[MONGO_DB]
@@ -0,0 +1,201 @@
+from typing import Dict, Any, List, Optional, Tuple
+from recon.engine import read_frame
+from loguru import logger
+import numpy as np
+import pandas as pd
+import os
+import threading
+import time
+
+# Degraded mode (Neo4j unreachable) serves dashboard, graph, risk and trace
+# fallbacks from this file. It is loaded and indexed once, and reloaded when
+# its mtime changes.
+FALLBACK_DATA_PATH = os.getenv("FALLBACK_DATA_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), "mock", "mock_data.csv"))
+COLUMNS = (
+    "seller_gstin", "seller_name", "seller_state", "buyer_gstin", "buyer_name", "buyer_state",
+    "invoice_id", "tax_amount", "claimed_tax_amount", "return_id", "filing_date", "status",
+)
+
+# Demo risk for the sample taxpayers; everyone else gets DEFAULT_RISK
+RISK_MAP: Dict[str, Tuple[str, float]] = {
+    "27ABCDE1234F1Z5": ("LOW", 30.0),
+    "33QWERT5678U1Z1": ("MEDIUM", 55.0),
+    "29LMNOP4321Q1Z3": ("HIGH", 85.0),
+    "09PQRS5678T1Z2": ("LOW", 25.0),
+    "07XYZAB9876C1Z7": ("MEDIUM", 45.0),
+}
+DEFAULT_RISK = ("LOW", 20.0)
+
+
+def risk(gstin: Optional[str]) -> Tuple[str, float]:
+    """(risk band, risk score) used for a taxpayer in degraded mode."""
+    return RISK_MAP.get(gstin, DEFAULT_RISK)
+
+
+def _text(value) -> Optional[str]:
+    return None if pd.isna(value) else str(value)
+
+
+class FallbackStore:
+    """The fallback dataset as column arrays with hash indexes by invoice id, seller GSTIN and state.
+
+    The global KPI and graph payloads are built at load time; per-GSTIN
+    summaries on first use.
+    """
+
+    def __init__(self, frame: pd.DataFrame):
+        frame = frame.reindex(columns=COLUMNS).dropna(subset=["invoice_id"]).reset_index(drop=True)
+        self.frame = frame
+        seller = frame["seller_gstin"].to_numpy(dtype=object)
+        buyer = frame["buyer_gstin"].to_numpy(dtype=object)
+        tax = frame["tax_amount"].fillna(0.0).to_numpy(dtype=np.float64)
+        claimed = frame["claimed_tax_amount"].to_numpy(dtype=np.float64)
+        self.return_id = frame["return_id"].to_numpy(dtype=object)
+        self.missing_return = frame["return_id"].isna().to_numpy()
+        self.missing_claim = frame["buyer_gstin"].isna().to_numpy()
+        with np.errstate(invalid="ignore"):
+            self.tax_discrepancy = ~np.isnan(claimed) & (np.abs(tax - claimed) > 0.01)
+        # The dashboard counts unreported or disputed invoices as high risk
+        self.high_risk = self.missing_return | self.tax_discrepancy
+
+        # First row wins per invoice, as the CSV scan this replaces did
+        ids = frame["invoice_id"].tolist()
+        self.by_invoice: Dict[str, int] = dict(zip(reversed(ids), range(len(ids) - 1, -1, -1)))
+        roles = pd.DataFrame({
+            "gstin": np.concatenate([seller, buyer]),
+            "state": np.concatenate([frame["seller_state"].to_numpy(dtype=object), frame["buyer_state"].to_numpy(dtype=object)]),
+            "name": np.concatenate([frame["seller_name"].to_numpy(dtype=object), frame["buyer_name"].to_numpy(dtype=object)]),
+            "pos": np.concatenate([np.arange(len(frame))] * 2),
+        }).dropna(subset=["gstin"])
+        # Positions of the rows each GSTIN issued, in file order, from one sort
+        # rather than a group per taxpayer
+        codes, sellers = pd.factorize(frame["seller_gstin"])
+        positions = np.flatnonzero(codes >= 0)
+        codes = codes[positions]
+        order = np.argsort(codes, kind="stable")
+        splits = np.split(positions[order], np.cumsum(np.bincount(codes, minlength=len(sellers)))[:-1])
+        self.by_seller: Dict[str, np.ndarray] = dict(zip(sellers.tolist(), splits))
+        self.buyer = buyer
+        first = roles.drop_duplicates("gstin")
+        self.state: Dict[str, str] = {g: _text(s) or "NA" for g, s in zip(first["gstin"], first["state"])}
+        self.name: Dict[str, Optional[str]] = {
+            g: _text(n) for g, n in roles.dropna(subset=["name"]).drop_duplicates("gstin")[["gstin", "name"]].itertuples(index=False)
+        }
+        self.by_state: Dict[str, List[str]] = {}
+        for g, s in self.state.items():
+            self.by_state.setdefault(s, []).append(g)
+
+        self.global_summary = self._global()
+        self._summaries: Dict[str, Dict[str, Any]] = {}
+        # One link per trading pair, as SELLS_TO has, in file order
+        pairs = frame.loc[frame["seller_gstin"].notna() & frame["buyer_gstin"].notna(), ["seller_gstin", "buyer_gstin"]]
+        self.links: List[Tuple[str, str]] = list(pairs.drop_duplicates().itertuples(index=False, name=None))
+
+    def _kpis(self, taxpayers: int, positions: np.ndarray, high_risk_taxpayers: int) -> Dict[str, int]:
+        # Invoices and returns are distinct ids; the file may repeat an invoice
+        return {
+            "taxpayers": taxpayers,
+            "invoices": len(pd.unique(self.frame["invoice_id"].to_numpy(dtype=object)[positions])),
+            "returns": len(pd.unique(self.return_id[positions][~self.missing_return[positions]])),
+            "high_risk_taxpayers": high_risk_taxpayers,
+            "high_risk_invoices": int(self.high_risk[positions].sum()),
+        }
+
+    def _global(self) -> Dict[str, Any]:
+        # Clusters and components fall back to grouping taxpayers by state
+        clusters: Dict[str, int] = {}
+        for state, gstins in self.by_state.items():
+            clusters[state] = len(gstins)
+        high = sum(1 for g in self.state if risk(g)[0] == "HIGH")
+        return {"kpis": self._kpis(len(self.state), np.arange(len(self.frame)), high), "clusters": clusters, "components": clusters}
+
+    def summary(self, gstin: Optional[str] = None) -> Dict[str, Any]:
+        """Dashboard summary for the whole file, or for the invoices `gstin` issued.
+
+        Per GSTIN this matches kpi.GSTIN_KPI_QUERY: taxpayers are the GSTIN and
+        its buyers, invoices, returns and high-risk invoices those it issued.
+        """
+        if gstin is None:
+            return self.global_summary
+        if gstin not in self._summaries:
+            positions = self.by_seller.get(gstin, np.empty(0, dtype=np.int64))
+            buyers = {b for b in self.buyer[positions] if isinstance(b, str) and b != gstin}
+            taxpayers = 1 + len(buyers) if len(positions) else 0
+            known = gstin in self.state
+            cluster = {self.state[gstin]: 1} if known else {}
+            self._summaries[gstin] = {
+                "kpis": self._kpis(taxpayers, positions, int(known and risk(gstin)[0] == "HIGH")),
+                "clusters": cluster,
+                "components": cluster,
+            }
+        return self._summaries[gstin]
+
+    def graph(self, limit: int) -> Tuple[List[Dict[str, Any]], List[Tuple[str, str]]]:
+        """(taxpayer node properties, seller->buyer links) for the first `limit` trading pairs."""
+        links = self.links[:max(limit, 0)]
+        nodes: Dict[str, Dict[str, Any]] = {}
+        for pair in links:
+            for g in pair:
+                if g not in nodes:
+                    band, score = risk(g)
+                    nodes[g] = {"gstin": g, "risk_band": band, "risk_score": score, "state": self.state.get(g)}
+        return list(nodes.values()), links
+
+    def trace(self, invoice_id: str) -> Optional[Dict[str, Any]]:
+        pos = self.by_invoice.get(invoice_id)
+        if pos is None:
+            return None
+        row = {k: _text(v) for k, v in self.frame.iloc[pos].items()}
+        tax_amount = float(self.frame["tax_amount"].iat[pos]) if row["tax_amount"] is not None else 0.0
+        claimed = float(self.frame["claimed_tax_amount"].iat[pos]) if row["claimed_tax_amount"] is not None else None
+        seller, buyer = row["seller_gstin"], row["buyer_gstin"]
+        root = []
+        if self.missing_return[pos]:
+            root.append("Invoice not reported in return")
+        if self.missing_claim[pos]:
+            root.append("Missing claim edge to buyer")
+        if self.tax_discrepancy[pos]:
+            root.append("Tax amount discrepancy detected")
+        path = [
+            {"type": "seller", "gstin": seller, "name": row["seller_name"]},
+            {"type": "invoice", "invoice_id": invoice_id, "tax_amount": tax_amount, "claimed_tax_amount": claimed},
+        ]
+        if buyer:
+            path.append({"type": "buyer", "gstin": buyer, "name": row["buyer_name"]})
+        if not self.missing_return[pos]:
+            path.append({"type": "return", "return_id": row["return_id"], "status": row["status"], "filing_date": row["filing_date"]})
+        return {
+            "invoice_id": invoice_id,
+            "found": True,
+            "root_cause": root or ["No mismatch detected"],
+            "path": path,
+            "risk_indicators": {
+                "seller_risk": risk(seller)[1] if seller else None,
+                "buyer_risk": risk(buyer)[1] if buyer else None,
+                "cluster_id": None,
+                "component_id": None,
+            },
+        }
+
+
+_store: Optional[FallbackStore] = None
+_mtime: Optional[float] = None
+_lock = threading.Lock()
+
+
+def get_store() -> FallbackStore:
+    """The indexed fallback dataset, reloaded when FALLBACK_DATA_PATH's mtime changes; empty if it is missing."""
+    global _store, _mtime
+    try:
+        mtime = os.stat(FALLBACK_DATA_PATH).st_mtime
+    except OSError:
+        mtime = None
+    if _store is not None and mtime == _mtime:
+        return _store
+    with _lock:
+        if _store is None or mtime != _mtime:
+            started = time.perf_counter()
+            frame = read_frame(FALLBACK_DATA_PATH, COLUMNS) if mtime is not None else pd.DataFrame(columns=COLUMNS)
+            _store, _mtime = FallbackStore(frame), mtime
+            logger.info(f"Loaded fallback data from {FALLBACK_DATA_PATH}: {len(frame)} rows in {time.perf_counter() - started:.2f}s")
+    return _store
@@ -0,0 +1,124 @@
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+from .db import neo4j_driver, mongo_db, NEO4J_DB
+from pipeline.state import GRAPH_STATE_ID
+from loguru import logger
+import asyncio
+import os
+import time
+
+# Dashboard KPIs are computed once per graph version (bumped by ingest and risk
+# scoring) and kept in memory. An entry is served without any I/O for
+# KPI_TTL_S; after that the version is rechecked and the entry recomputed only
+# if it moved.
+KPI_TTL_S = float(os.getenv("KPI_TTL_S", "5"))
+KPI_GSTIN_CACHE_SIZE = int(os.getenv("KPI_GSTIN_CACHE_SIZE", "10000"))
+
+GLOBAL_KPI_QUERY = """
+MATCH (t:Taxpayer) WITH count(t) AS taxpayers
+MATCH (i:Invoice) WITH taxpayers, count(i) AS invoices
+MATCH (r:Return) WITH taxpayers, invoices, count(r) AS returns
+RETURN taxpayers, invoices, returns
+"""
+HIGH_RISK_TAXPAYERS_QUERY = "MATCH (t:Taxpayer) WHERE t.risk_band='HIGH' RETURN count(t) AS c"
+HIGH_RISK_INVOICES_QUERY = "MATCH (i:Invoice) WHERE i.risk_band='HIGH' RETURN count(i) AS c"
+CLUSTER_HISTOGRAM_QUERY = "MATCH (t:Taxpayer) WHERE t.cluster_id IS NOT NULL RETURN t.cluster_id AS cid, count(*) AS c"
+COMPONENT_HISTOGRAM_QUERY = "MATCH (t:Taxpayer) WHERE t.component_id IS NOT NULL RETURN t.component_id AS cid, count(*) AS c"
+# Everything the dashboard shows for one GSTIN in a single round trip; reads the
+# aggregates ingest keeps on the Taxpayer instead of walking its invoices. All
+# counts are over the invoices the GSTIN issued (taxpayers: itself plus its
+# buyers), as FallbackStore.summary computes them in degraded mode.
+GSTIN_KPI_QUERY = """
+OPTIONAL MATCH (s:Taxpayer {gstin: $gstin})
+WITH s, COALESCE(s.invoice_count, 0) AS invoices
+RETURN CASE WHEN invoices = 0 THEN 0 ELSE 1 + size([(s)-[:SELLS_TO]->(b:Taxpayer) WHERE b <> s | b]) END AS taxpayers,
+       invoices,
+       COALESCE(s.return_count, 0) AS returns,
+       CASE WHEN s.risk_band = 'HIGH' THEN 1 ELSE 0 END AS high_risk_taxpayers,
+       size([(s)-[:ISSUED]->(i:Invoice) WHERE i.risk_band = 'HIGH' | i]) AS high_risk_invoices,
+       s.cluster_id AS cluster_id, s.component_id AS component_id
+"""
+
+# gstin (None for the whole graph) -> {"version", "checked_at", "summary"}, least recently used first
+_cache: "OrderedDict[Optional[str], Dict[str, Any]]" = OrderedDict()
+# Recomputes in flight per key; concurrent misses on one key share it, other keys do not wait
+_pending: Dict[Optional[str], "asyncio.Future[Dict[str, Any]]"] = {}
+
+
+async def _graph_version() -> Optional[int]:
+    try:
+        state = await mongo_db["graph_state"].find_one({"_id": GRAPH_STATE_ID})
+    except Exception as e:
+        # Without the version only the TTL bounds staleness
+        logger.warning(f"graph version unavailable for KPI cache: {e}")
+        return None
+    return state["version"] if state else 0
+
+
+async def _global_summary() -> Dict[str, Any]:
+    async with neo4j_driver.session(database=NEO4J_DB) as session:
+        k = await (await session.run(GLOBAL_KPI_QUERY)).single()
+        c1 = await (await session.run(HIGH_RISK_TAXPAYERS_QUERY)).single()
+        c2 = await (await session.run(HIGH_RISK_INVOICES_QUERY)).single()
+        clusters = await (await session.run(CLUSTER_HISTOGRAM_QUERY)).data()
+        comp = await (await session.run(COMPONENT_HISTOGRAM_QUERY)).data()
+    return {
+        "kpis": {
+            "taxpayers": k["taxpayers"] or 0,
+            "invoices": k["invoices"] or 0,
+            "returns": k["returns"] or 0,
+            "high_risk_taxpayers": c1["c"] or 0,
+            "high_risk_invoices": c2["c"] or 0,
+        },
+        "clusters": {str(r["cid"]): r["c"] for r in clusters},
+        "components": {str(r["cid"]): r["c"] for r in comp},
+    }
+
+
+async def _gstin_summary(gstin: str) -> Dict[str, Any]:
+    async with neo4j_driver.session(database=NEO4J_DB) as session:
+        k = await (await session.run(GSTIN_KPI_QUERY, gstin=gstin)).single()
+    return {
+        "kpis": {key: k[key] or 0 for key in ("taxpayers", "invoices", "returns", "high_risk_taxpayers", "high_risk_invoices")},
+        "clusters": {} if k["cluster_id"] is None else {str(k["cluster_id"]): 1},
+        "components": {} if k["component_id"] is None else {str(k["component_id"]): 1},
+    }
+
+
+def _store(gstin: Optional[str], version: Optional[int], summary: Dict[str, Any]):
+    _cache[gstin] = {"version": version, "checked_at": time.monotonic(), "summary": summary}
+    _cache.move_to_end(gstin)
+    # Room for the global entry on top of KPI_GSTIN_CACHE_SIZE per-GSTIN ones
+    while len(_cache) > KPI_GSTIN_CACHE_SIZE + 1:
+        _cache.popitem(last=False)
+
+
+async def kpi_summary(gstin: Optional[str] = None) -> Dict[str, Any]:
+    """Dashboard KPIs and cluster/component histograms, for one GSTIN or the whole graph.
+
+    Served from memory; recomputed from Neo4j only when the graph version has
+    moved (checked at most every KPI_TTL_S). The returned dict is shared, so
+    callers must not modify it.
+    """
+    entry = _cache.get(gstin)
+    if entry and time.monotonic() - entry["checked_at"] < KPI_TTL_S:
+        _cache.move_to_end(gstin)
+        return entry["summary"]
+    version = await _graph_version()
+    if entry and version is not None and entry["version"] == version:
+        entry["checked_at"] = time.monotonic()
+        return entry["summary"]
+    task = _pending.get(gstin)
+    if task is None:
+        task = asyncio.ensure_future(_recompute(gstin, version))
+        _pending[gstin] = task
+        task.add_done_callback(lambda _: _pending.pop(gstin, None))
+    # Shielded so one caller going away does not cancel the others' result
+    return await asyncio.shield(task)
+
+
+async def _recompute(gstin: Optional[str], version: Optional[int]) -> Dict[str, Any]:
+    summary = await (_global_summary() if gstin is None else _gstin_summary(gstin))
+    _store(gstin, version, summary)
+    return summary
+
@@ -1,13 +1,15 @@
 import os
-import csv
+from datetime import date, timedelta
 from typing import List, Dict, Any, Optional
-from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
-from fastapi.responses import RedirectResponse, JSONResponse
+from fastapi import FastAPI, HTTPException, Query, Request, Response, WebSocket
+from fastapi.responses import RedirectResponse, JSONResponse, StreamingResponse
 import urllib.parse
 import urllib.request
 import json
 import asyncio
 from ml.train_model import train as ml_train, predict as ml_predict, MODEL_PATH, list_available
+from gds.cycle_detection import CAROUSELS, MAX_LENGTH as CAROUSEL_MAX_LENGTH
+from recon.engine import reconcile_files, records as recon_records, resolve_path, DATA_PATH as RECON_DATA_PATH, FUZZY as RECON_FUZZY
 from fastapi.middleware.cors import CORSMiddleware
 from loguru import logger
 
@@ -16,131 +18,93 @@ from .models import (
     DashboardSummary,
     RiskInfo,
     InvoiceTraceResponse,
+    InvoiceTraceBatchRequest,
     ReconcileItem,
+    Carousel,
+    ReconcileFilesRequest,
+    ReconcileFilesResponse,
+    ReconcilePartitionsResponse,
     GraphData,
     GraphNode,
     GraphLink,
     SimulateRiskRequest,
     SimulateRiskResponse,
 )
-from .reconcile import invoice_trace, reconcile
+from .reconcile import (
+    invoice_trace, invoice_traces, reconcile, reconcile_item, reconcile_stream, reconcile_query, RootCause, RECONCILE_PAGE_SIZE,
+    TRACE_QUERY, COUNTERPART_RISK_QUERY, BATCH_TRACE_QUERY, TRACE_BATCH_MAX, RECONCILE_MAX_PAGE_SIZE,
+    reconcile_partitioned, partition_query, STATES_QUERY,
+)
 from .explain import build_invoice_explanation, write_audit
+from .fallback_store import get_store as get_fallback_store, risk as fallback_risk
+from .neo4j_guard import CircuitOpenError, LONG_QUERY_TIMEOUT_S, BREAKER_PROBE_S as NEO4J_BREAKER_PROBE_S
+from . import broadcast
+from .kpi import (
+    kpi_summary, GLOBAL_KPI_QUERY, GSTIN_KPI_QUERY, HIGH_RISK_TAXPAYERS_QUERY,
+    HIGH_RISK_INVOICES_QUERY, CLUSTER_HISTOGRAM_QUERY, COMPONENT_HISTOGRAM_QUERY,
+)
+from schema.schema_manager import ensure_schema_async, explain_async
 
 app = FastAPI(title="GST KG Reconciliation & Risk Intelligence")
 
+VENDOR_RISK_QUERY = "MATCH (t:Taxpayer {gstin: $gstin}) RETURN t.gstin AS gstin, t.name AS name, t.risk_score AS risk_score, t.risk_band AS risk_band, t.pagerank_score AS pagerank_score, t.degree_centrality AS degree_centrality, t.cluster_id AS cluster_id, t.component_id AS component_id"
+VENDOR_SAMPLE_QUERY = "MATCH (t:Taxpayer) WHERE t.risk_band=$band RETURN t.gstin AS gstin LIMIT 1"
+GRAPH_DATA_QUERY = """
+MATCH (t:Taxpayer)-[rel:SELLS_TO]->(t2:Taxpayer)
+WITH t, rel, t2 LIMIT $limit
+RETURN t, t2, rel
+"""
+TAXPAYER_RISK_QUERY = "MATCH (t:Taxpayer {gstin: $gstin}) RETURN t.risk_score AS risk_score"
+INVOICE_RISK_QUERY = "MATCH (i:Invoice {invoice_id: $iid}) RETURN i.risk_score AS risk_score, i.mismatch_flag AS mismatch"
+
+# Fixed statements checked with EXPLAIN at startup, with representative parameters.
+APP_STATEMENTS = {
+    "dashboard_kpis": (GLOBAL_KPI_QUERY, {}),
+    "dashboard_kpis_gstin": (GSTIN_KPI_QUERY, {"gstin": ""}),
+    "high_risk_taxpayers": (HIGH_RISK_TAXPAYERS_QUERY, {}),
+    "high_risk_invoices": (HIGH_RISK_INVOICES_QUERY, {}),
+    "cluster_histogram": (CLUSTER_HISTOGRAM_QUERY, {}),
+    "component_histogram": (COMPONENT_HISTOGRAM_QUERY, {}),
+    "vendor_risk": (VENDOR_RISK_QUERY, {"gstin": ""}),
+    "vendor_samples": (VENDOR_SAMPLE_QUERY, {"band": "HIGH"}),
+    "graph_data": (GRAPH_DATA_QUERY, {"limit": 200}),
+    "simulate_invoice_risk": (INVOICE_RISK_QUERY, {"iid": ""}),
+    "invoice_trace": (TRACE_QUERY, {"invoice_id": ""}),
+    "counterpart_risk": (COUNTERPART_RISK_QUERY, {"seller": "", "buyer": ""}),
+    "invoice_trace_batch": (BATCH_TRACE_QUERY, {"invoice_ids": []}),
+    "reconcile_page": (reconcile_query(), {"after": "", "after_buyer": None, "seller": None, "buyer": None, "root_cause": None, "limit": RECONCILE_PAGE_SIZE}),
+    "reconcile_page_seller": (reconcile_query(seller=""), {"after": "", "after_buyer": None, "seller": "", "buyer": None, "root_cause": None, "limit": RECONCILE_PAGE_SIZE}),
+    "reconcile_page_buyer": (reconcile_query(buyer=""), {"after": "", "after_buyer": None, "seller": None, "buyer": "", "root_cause": None, "limit": RECONCILE_PAGE_SIZE}),
+    "reconcile_partition_period": (partition_query(True), {"date_from": date(2025, 1, 1), "date_to": date(2025, 2, 1), "state": None, "seller": None}),
+    "reconcile_partition_state": (partition_query(False), {"state": "", "seller": None}),
+    "reconcile_states": (STATES_QUERY, {}),
+}
+
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 
+@app.exception_handler(CircuitOpenError)
+async def circuit_open_handler(request: Request, exc: CircuitOpenError):
+    # Endpoints without a fallback answer at once instead of waiting on Neo4j
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": str(max(1, int(NEO4J_BREAKER_PROBE_S)))})
+
+
 @app.get("/dashboard-summary", response_model=DashboardSummary)
 async def dashboard_summary(gstin: Optional[str] = None):
+    """Dashboard KPIs from the in-memory KPI store; Neo4j is only queried when the graph version moves."""
     try:
-        async with neo4j_driver.session(database=NEO4J_DB) as session:
-            if gstin:
-                q = """
-                MATCH (s:Taxpayer {gstin: $gstin})-[:ISSUED]->(i:Invoice)
-                OPTIONAL MATCH Madd pipeline
-                OPTIONAL MATCH (i)-[:CLAIMED_BY]->(b:Taxpayer)
-                OPTIONAL MATCH (i)-[:REPORTED_IN]->(r:Return)
-                WITH collect(distinct s) + collect(distinct b) AS parties, collect(i) AS invs, collect(r) AS rets
-                RETURN size([p in parties WHERE p IS NOT NULL]) AS taxpayers,
-                       size(invs) AS invoices,
-                       size([x in rets WHERE x IS NOT NULL]) AS returns
-                """
-                kpi = await session.run(q, gstin=gstin)
-            else:
-                kpi = await session.run(
-                """
-                MATCH (t:Taxpayer) WITH count(t) AS taxpayers
-                MATCH (i:Invoice) WITH taxpayers, count(i) AS invoices
-                MATCH (r:Return) WITH taxpayers, invoices, count(r) AS returns
-                RETURN taxpayers, invoices, returns
-                """
-                )
-            k = await kpi.single()
-            if gstin:
-                hi_taxpayers_q = await session.run("MATCH (t:Taxpayer) WHERE t.gstin=$gstin AND t.risk_band='HIGH' RETURN count(t) AS c", gstin=gstin)
-                hi_invoices_q = await session.run("MATCH (:Taxpayer {gstin: $gstin})-[:ISSUED]->(i:Invoice) WHERE i.risk_band='HIGH' RETURN count(i) AS c", gstin=gstin)
-                c1 = await hi_taxpayers_q.single()
-                c2 = await hi_invoices_q.single()
-                clusters = await session.run("MATCH (t:Taxpayer {gstin: $gstin}) RETURN t.cluster_id AS cid, 1 AS c", gstin=gstin)
-                comp = await session.run("MATCH (t:Taxpayer {gstin: $gstin}) RETURN t.component_id AS cid, 1 AS c", gstin=gstin)
-            else:
-                hi_taxpayers = await session.run("MATCH (t:Taxpayer) WHERE t.risk_band='HIGH' RETURN count(t) AS c")
-                hi_invoices = await session.run("MATCH (i:Invoice) WHERE i.risk_band='HIGH' RETURN count(i) AS c")
-                c1 = await hi_taxpayers.single()
-                c2 = await hi_invoices.single()
-                clusters = await session.run("MATCH (t:Taxpayer) WHERE exists(t.cluster_id) RETURN t.cluster_id AS cid, count(*) AS c")
-                comp = await session.run("MATCH (t:Taxpayer) WHERE exists(t.component_id) RETURN t.component_id AS cid, count(*) AS c")
-            cluster_map = {str(r["cid"]): r["c"] for r in await clusters.data()}
-            comp_map = {str(r["cid"]): r["c"] for r in await comp.data()}
-            return DashboardSummary(
-                kpis={
-                    "taxpayers": k["taxpayers"] or 0,
-                    "invoices": k["invoices"] or 0,
-                    "returns": k["returns"] or 0,
-                    "high_risk_taxpayers": (c1["c"] or 0),
-                    "high_risk_invoices": (c2["c"] or 0),
-                },
-                clusters=cluster_map,
-                components=comp_map,
-            )
+        return DashboardSummary(**await kpi_summary(gstin))
     except Exception:
         try:
-            base = os.path.dirname(os.path.dirname(__file__))
-            csv_path = os.path.join(base, "mock", "mock_data.csv")
-            risk_map = {
-                "27ABCDE1234F1Z5": ("LOW", 30.0, "MH"),
-                "33QWERT5678U1Z1": ("MEDIUM", 55.0, "TN"),
-                "29LMNOP4321Q1Z3": ("HIGH", 85.0, "KA"),
-                "09PQRS5678T1Z2": ("LOW", 25.0, "UP"),
-                "07XYZAB9876C1Z7": ("MEDIUM", 45.0, "DL"),
-            }
-            rows: list[dict[str, Any]] = []
-            if os.path.exists(csv_path):
-                with open(csv_path, newline="") as f:
-                    rows = list(csv.DictReader(f))
-            def mismatch(row: dict[str, Any]) -> bool:
-                try:
-                    ta = float(row.get("tax_amount") or 0.0)
-                    ca = float(row.get("claimed_tax_amount"))
-                except Exception:
-                    ca = None
-                ret_missing = not bool(row.get("return_id"))
-                tax_disc = (ca is not None) and (abs(ta - ca) > 0.01)
-                return ret_missing or tax_disc
-            if gstin:
-                rows = [r for r in rows if r.get("seller_gstin") == gstin or r.get("buyer_gstin") == gstin]
-            gstins = set()
-            for r in rows:
-                if r.get("seller_gstin"): gstins.add(r["seller_gstin"])
-                if r.get("buyer_gstin"): gstins.add(r["buyer_gstin"])
-            taxpayers = len(gstins)
-            invoices = len(rows)
-            returns = len([r for r in rows if r.get("return_id")])
-            hi_taxpayers = len([g for g in gstins if risk_map.get(g, ("LOW", 0.0, None))[0] == "HIGH"])
-            hi_invoices = len([r for r in rows if mismatch(r)])
-            # clusters/components fallback: group by state
-            clusters: dict[str, int] = {}
-            for g in gstins:
-                st = risk_map.get(g, ("LOW", 0.0, None))[2] or "NA"
-                clusters[st] = clusters.get(st, 0) + 1
-            return DashboardSummary(
-                kpis={
-                    "taxpayers": taxpayers,
-                    "invoices": invoices,
-                    "returns": returns,
-                    "high_risk_taxpayers": hi_taxpayers,
-                    "high_risk_invoices": hi_invoices,
-                },
-                clusters=clusters,
-                components=clusters,
-            )
+            return DashboardSummary(**get_fallback_store().summary(gstin))
         except Exception:
             return DashboardSummary(
                 kpis={"taxpayers": 0, "invoices": 0, "returns": 0, "high_risk_taxpayers": 0, "high_risk_invoices": 0},
@@ -153,24 +117,14 @@ async def dashboard_summary(gstin: Optional[str] = None):
 async def vendor_risk(gstin: str):
     try:
         async with neo4j_driver.session(database=NEO4J_DB) as session:
-            res = await session.run(
-                "MATCH (t:Taxpayer {gstin: $gstin}) RETURN t.gstin AS gstin, t.name AS name, t.risk_score AS risk_score, t.risk_band AS risk_band, t.pagerank_score AS pagerank_score, t.degree_centrality AS degree_centrality, t.cluster_id AS cluster_id, t.component_id AS component_id",
-                gstin=gstin,
-            )
+            res = await session.run(VENDOR_RISK_QUERY, gstin=gstin)
             r = await res.single()
             if not r:
                 raise HTTPException(404, "Taxpayer not found")
             return RiskInfo(**r)
     except Exception:
-        mapping = {
-            "27ABCDE1234F1Z5": ("LOW", 30.0),
-            "33QWERT5678U1Z1": ("MEDIUM", 55.0),
-            "29LMNOP4321Q1Z3": ("HIGH", 85.0),
-            "09PQRS5678T1Z2": ("LOW", 25.0),
-            "07XYZAB9876C1Z7": ("MEDIUM", 45.0),
-        }
-        band, score = mapping.get(gstin, ("LOW", 20.0))
-        return RiskInfo(gstin=gstin, name=None, risk_score=score, risk_band=band, pagerank_score=0.0, degree_centrality=0.0, cluster_id=None, component_id=None)
+        band, score = fallback_risk(gstin)
+        return RiskInfo(gstin=gstin, name=get_fallback_store().name.get(gstin), risk_score=score, risk_band=band, pagerank_score=0.0, degree_centrality=0.0, cluster_id=None, component_id=None)
 
 
 @app.get("/invoice-trace/{invoice_id}", response_model=InvoiceTraceResponse)
@@ -186,28 +140,154 @@ async def invoice_trace_endpoint(invoice_id: str):
         return InvoiceTraceResponse(invoice_id=invoice_id, found=False, root_cause=["Neo4j unavailable"], path=[], risk_indicators={}, explanation="Neo4j unavailable")
 
 
+@app.post("/invoice-trace/batch", response_model=List[InvoiceTraceResponse])
+async def invoice_trace_batch_endpoint(payload: InvoiceTraceBatchRequest):
+    """Traces for many invoices from one query, audited as a single record."""
+    if len(payload.invoice_ids) > TRACE_BATCH_MAX:
+        raise HTTPException(422, f"At most {TRACE_BATCH_MAX} invoice ids per batch")
+    traces = await invoice_traces(payload.invoice_ids)
+    for trace in traces:
+        trace["explanation"] = build_invoice_explanation(trace)
+    try:
+        await mongo_db["audit_trail"].insert_one({
+            "type": "invoice_trace_batch",
+            "invoice_ids": payload.invoice_ids,
+            "found": sum(1 for t in traces if t["found"]),
+            "traces": traces,
+        })
+    except Exception as e:
+        logger.warning(f"invoice trace batch audit failed: {e}")
+    return [InvoiceTraceResponse(**t) for t in traces]
+
+
 @app.get("/reconcile", response_model=List[ReconcileItem])
-async def reconcile_endpoint():
+async def reconcile_endpoint(response: Response, after: Optional[str] = None, page_size: int = RECONCILE_PAGE_SIZE,
+                             root_cause: Optional[RootCause] = None, seller: Optional[str] = None, buyer: Optional[str] = None,
+                             depth: int = 3):
+    """One page of mismatches; pass the X-Next-Cursor header back as `after` for the next.
+
+    Items on a detected carousel of at most `depth` hops carry carousel_length.
+    """
     try:
-        rows = await reconcile(depth=3)
-        await mongo_db["audit_trail"].insert_one({"type": "reconcile_run", "items": rows})
+        rows, next_cursor = await reconcile(depth=depth, after=after, page_size=page_size, root_cause=root_cause, seller=seller, buyer=buyer)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        filters = {"root_cause": root_cause, "seller": seller, "buyer": buyer}
+        await mongo_db["audit_trail"].insert_one({"type": "reconcile_run", "mode": "page", "after": after, "count": len(rows), "next_cursor": next_cursor, "filters": filters})
         return [ReconcileItem(**r) for r in rows]
     except Exception:
         return []
 
 
+@app.get("/reconcile/stream")
+async def reconcile_stream_endpoint(after: Optional[str] = None, root_cause: Optional[RootCause] = None,
+                                    seller: Optional[str] = None, buyer: Optional[str] = None):
+    """All mismatches as NDJSON, one line per invoice, written as Neo4j yields them."""
+    filters = {"root_cause": root_cause, "seller": seller, "buyer": buyer}
+
+    async def lines():
+        count = 0
+        async for row in reconcile_stream(after=after, **filters):
+            count += 1
+            yield json.dumps(ReconcileItem(**row).model_dump()) + "\n"
+        try:
+            await mongo_db["audit_trail"].insert_one({"type": "reconcile_run", "mode": "stream", "after": after, "count": count, "filters": filters})
+        except Exception as e:
+            logger.warning(f"reconcile stream audit failed: {e}")
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@app.post("/reconcile/files", response_model=ReconcileFilesResponse)
+async def reconcile_files_endpoint(payload: ReconcileFilesRequest, root_cause: Optional[RootCause] = None,
+                                   limit: int = RECONCILE_PAGE_SIZE, fuzzy: bool = RECON_FUZZY):
+    """Reconcile supplier/claim/return files in RECON_DATA_DIR with the columnar engine, no Neo4j.
+
+    Without `supply` the ingest CSV is used; `fuzzy` pairs differently
+    formatted invoice numbers; `limit` caps the items returned, the summary
+    counts every mismatch.
+    """
+    try:
+        supply = resolve_path(payload.supply) if payload.supply else RECON_DATA_PATH
+        claims = resolve_path(payload.claims) if payload.claims else None
+        returns = resolve_path(payload.returns) if payload.returns else None
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    mismatches, summary = await asyncio.to_thread(reconcile_files, supply, claims, returns, fuzzy)
+    if root_cause:
+        mismatches = mismatches[mismatches[root_cause]]
+    items = [reconcile_item(row) for row in recon_records(mismatches.head(max(0, limit)))]
+    try:
+        await mongo_db["audit_trail"].insert_one({"type": "reconcile_run", "mode": "files", "files": payload.model_dump(), "root_cause": root_cause, "fuzzy": fuzzy, **summary})
+    except Exception as e:
+        logger.warning(f"file reconcile audit failed: {e}")
+    return ReconcileFilesResponse(summary=summary, items=[ReconcileItem(**item) for item in items])
+
+
+async def _partitioned_response(date_from: Optional[date], date_to: Optional[date], by_month: bool, by_state: bool,
+                                states: Optional[List[str]], seller: Optional[str], limit: int) -> ReconcilePartitionsResponse:
+    try:
+        rows, partitions = await reconcile_partitioned(date_from, date_to, by_month, by_state, states, seller)
+    except ValueError as e:
+        raise HTTPException(422, str(e))
+    try:
+        await mongo_db["audit_trail"].insert_one({
+            "type": "reconcile_run", "mode": "partitioned", "count": len(rows), "partitions": partitions,
+            "filters": {"date_from": str(date_from) if date_from else None, "date_to": str(date_to) if date_to else None,
+                        "states": states, "seller": seller},
+        })
+    except Exception as e:
+        logger.warning(f"partitioned reconcile audit failed: {e}")
+    items = rows[:max(0, min(limit, RECONCILE_MAX_PAGE_SIZE))]
+    return ReconcilePartitionsResponse(partitions=partitions, mismatches=len(rows), items=[ReconcileItem(**r) for r in items])
+
+
+@app.get("/reconcile/partitioned", response_model=ReconcilePartitionsResponse)
+async def reconcile_partitioned_endpoint(date_from: Optional[date] = None, date_to: Optional[date] = None,
+                                         by_month: bool = True, by_state: bool = False,
+                                         state: Optional[List[str]] = Query(None), seller: Optional[str] = None,
+                                         limit: int = RECONCILE_PAGE_SIZE):
+    """Reconcile invoice_date months and/or seller states concurrently and merge the results.
+
+    `state` may repeat; `by_state` without it partitions over every state.
+    `mismatches` counts every row, `items` holds the first `limit` by invoice_id.
+    """
+    if date_from and date_to and date_to < date_from:
+        raise HTTPException(422, "date_to is before date_from")
+    return await _partitioned_response(date_from, date_to, by_month, by_state, state, seller, limit)
+
+
+@app.get("/reconcile/period/{month}", response_model=ReconcilePartitionsResponse)
+async def reconcile_period_endpoint(month: str, state: Optional[str] = None, seller: Optional[str] = None,
+                                    limit: int = RECONCILE_PAGE_SIZE):
+    """Month-end run: reconcile one invoice_date month (YYYY-MM) only."""
+    try:
+        start = date.fromisoformat(f"{month}-01")
+    except ValueError:
+        raise HTTPException(422, "month must be YYYY-MM")
+    end = (start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    return await _partitioned_response(start, end, True, False, [state] if state else None, seller, limit)
+
+
+@app.get("/carousels", response_model=List[Carousel])
+async def carousels(gstin: Optional[str] = None, max_length: int = CAROUSEL_MAX_LENGTH, limit: int = 100):
+    """Circular-trading loops from the latest gds.cycle_detection run, by tax flowing around them."""
+    query: Dict[str, Any] = {"length": {"$lte": max_length}}
+    if gstin:
+        query["members"] = gstin
+    try:
+        cursor = mongo_db[CAROUSELS].find(query, {"_id": 0, "edges": 0, "run_id": 0}).sort("rank", 1).limit(max(1, min(limit, RECONCILE_MAX_PAGE_SIZE)))
+        return [Carousel(**doc) async for doc in cursor]
+    except Exception as e:
+        logger.warning(f"carousel lookup failed: {e}")
+        return []
+
+
 @app.get("/graph-data", response_model=GraphData)
 async def graph_data(limit: int = 200):
     try:
         async with neo4j_driver.session(database=NEO4J_DB) as session:
-            res = await session.run(
-            """
-            MATCH (t:Taxpayer)-[rel:SELLS_TO]->(t2:Taxpayer)
-            WITH t, rel, t2 LIMIT $limit
-            RETURN t, t2, rel
-            """,
-            limit=limit,
-            )
+            res = await session.run(GRAPH_DATA_QUERY, limit=limit)
             rows = await res.data()
             nodes: Dict[str, GraphNode] = {}
             links: List[GraphLink] = []
@@ -225,31 +305,11 @@ async def graph_data(limit: int = 200):
                 links.append(GraphLink(source=t["gstin"], target=t2["gstin"], type="SELLS_TO"))
             return GraphData(nodes=list(nodes.values()), links=links)
     except Exception:
-        base = os.path.dirname(os.path.dirname(__file__))
-        csv_path = os.path.join(base, "mock", "mock_data.csv")
-        nodes: Dict[str, GraphNode] = {}
-        links: List[GraphLink] = []
-        risk_map = {
-            "27ABCDE1234F1Z5": ("LOW", 30.0),
-            "33QWERT5678U1Z1": ("MEDIUM", 55.0),
-            "29LMNOP4321Q1Z3": ("HIGH", 85.0),
-            "09PQRS5678T1Z2": ("LOW", 25.0),
-            "07XYZAB9876C1Z7": ("MEDIUM", 45.0),
-        }
-        if os.path.exists(csv_path):
-            with open(csv_path, newline="") as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    s = row.get("seller_gstin")
-                    b = row.get("buyer_gstin")
-                    for g in [s, b]:
-                        if g and g not in nodes:
-                            band, score = risk_map.get(g, ("LOW", 20.0))
-                            state = row.get("seller_state") if g == s else row.get("buyer_state")
-                            nodes[g] = GraphNode(id=g, label="Taxpayer", properties={"gstin": g, "risk_band": band, "risk_score": score, "state": state})
-                    if s and b:
-                        links.append(GraphLink(source=s, target=b, type="SELLS_TO"))
-        return GraphData(nodes=list(nodes.values()), links=links)
+        nodes, links = get_fallback_store().graph(limit)
+        return GraphData(
+            nodes=[GraphNode(id=n["gstin"], label="Taxpayer", properties=n) for n in nodes],
+            links=[GraphLink(source=s, target=b, type="SELLS_TO") for s, b in links],
+        )
 
 @app.get("/vendor-samples")
 async def vendor_samples():
@@ -257,10 +317,7 @@ async def vendor_samples():
         out = {"low": None, "medium": None, "high": None}
         async with neo4j_driver.session(database=NEO4J_DB) as session:
             for band, key in [("LOW", "low"), ("MEDIUM", "medium"), ("HIGH", "high")]:
-                res = await session.run(
-                    "MATCH (t:Taxpayer) WHERE t.risk_band=$band RETURN t.gstin AS gstin LIMIT 1",
-                    band=band,
-                )
+                res = await session.run(VENDOR_SAMPLE_QUERY, band=band)
                 row = await res.single()
                 out[key] = row["gstin"] if row and "gstin" in row else None
         return out
@@ -325,19 +382,27 @@ async def simulate_risk(req: SimulateRiskRequest):
     async with neo4j_driver.session(database=NEO4J_DB) as session:
         result: Dict[str, Any] = {"threshold": req.risk_threshold, "itc_simulation": req.itc_simulation}
         if req.gstin:
-            res = await session.run("MATCH (t:Taxpayer {gstin: $gstin}) RETURN t.risk_score AS risk_score", gstin=req.gstin)
+            res = await session.run(TAXPAYER_RISK_QUERY, gstin=req.gstin)
             r = await res.single()
             if r:
                 result["gstin"] = req.gstin
                 result["current_risk"] = r["risk_score"]
                 result["meets_threshold"] = (r["risk_score"] or 0) >= req.risk_threshold
         if req.invoice_id:
-            res = await session.run("MATCH (i:Invoice {invoice_id: $iid}) RETURN i.risk_score AS risk_score, i.mismatch_flag AS mismatch", iid=req.invoice_id)
+            res = await session.run(INVOICE_RISK_QUERY, iid=req.invoice_id)
             r = await res.single()
             if r:
                 result["invoice_id"] = req.invoice_id
                 result["current_risk"] = r["risk_score"]
                 result["mismatch_flag"] = r["mismatch"]
+        if req.date_from and req.date_to:
+            try:
+                rows, partitions = await reconcile_partitioned(
+                    date.fromisoformat(req.date_from), date.fromisoformat(req.date_to), seller=req.gstin,
+                )
+            except ValueError as e:
+                raise HTTPException(422, str(e))
+            result["reconcile"] = {"date_from": req.date_from, "date_to": req.date_to, "mismatches": len(rows), "partitions": partitions}
         await mongo_db["audit_trail"].insert_one({"type": "simulate_risk", "request": req.dict(), "result": result})
         return SimulateRiskResponse(result=result)
 
@@ -375,54 +440,48 @@ async def report_export():
         return JSONResponse(content=data, media_type="application/json", headers={"Content-Disposition": "attachment; filename=report.json"})
     except Exception as e:
         return {"status": "error", "message": str(e)}
+
+
+@app.get("/health/neo4j")
+async def neo4j_health():
+    """Circuit breaker state plus query, failure, timeout and rejection counts since startup."""
+    return neo4j_driver.breaker.status()
+
+
 @app.websocket("/ws/dashboard")
 async def ws_dashboard(ws: WebSocket):
+    """Global KPIs: a full "snapshot" message on connect, then "diff" messages with only the changed keys.
+
+    Every socket is fed by the one broadcast poller, so Neo4j load does not
+    depend on how many dashboards are open.
+    """
     await ws.accept()
+    await broadcast.serve(ws)
+
+
+async def bootstrap_schema():
     try:
-        while True:
-            try:
-                async with neo4j_driver.session(database=NEO4J_DB) as session:
-                    kpi = await session.run(
-                        """
-                        MATCH (t:Taxpayer) WITH count(t) AS taxpayers
-                        MATCH (i:Invoice) WITH taxpayers, count(i) AS invoices
-                        MATCH (r:Return) WITH taxpayers, invoices, count(r) AS returns
-                        RETURN taxpayers, invoices, returns
-                        """
-                    )
-                    k = await kpi.single()
-                    hi_taxpayers = await session.run("MATCH (t:Taxpayer) WHERE t.risk_band='HIGH' RETURN count(t) AS c")
-                    hi_invoices = await session.run("MATCH (i:Invoice) WHERE i.risk_band='HIGH' RETURN count(i) AS c")
-                    c1 = await hi_taxpayers.single()
-                    c2 = await hi_invoices.single()
-                    clusters = await session.run("MATCH (t:Taxpayer) WHERE exists(t.cluster_id) RETURN t.cluster_id AS cid, count(*) AS c")
-                    comp = await session.run("MATCH (t:Taxpayer) WHERE exists(t.component_id) RETURN t.component_id AS cid, count(*) AS c")
-                    payload = {
-                        "kpis": {
-                            "taxpayers": k["taxpayers"],
-                            "invoices": k["invoices"],
-                            "returns": k["returns"],
-                            "high_risk_taxpayers": c1["c"],
-                            "high_risk_invoices": c2["c"],
-                        },
-                        "clusters": {str(r["cid"]): r["c"] for r in await clusters.data()},
-                        "components": {str(r["cid"]): r["c"] for r in await comp.data()},
-                    }
-                    await ws.send_json(payload)
-            except Exception:
-                await ws.send_json({"kpis": {"taxpayers": 0, "invoices": 0, "returns": 0, "high_risk_taxpayers": 0, "high_risk_invoices": 0}, "clusters": {}, "components": {}})
-            await asyncio.sleep(2)
-    except WebSocketDisconnect:
-        return
+        async with neo4j_driver.session(database=NEO4J_DB, query_timeout=LONG_QUERY_TIMEOUT_S) as session:
+            await ensure_schema_async(session)
+            await explain_async(session, APP_STATEMENTS)
+    except Exception as e:
+        logger.warning(f"Schema bootstrap skipped, Neo4j unavailable: {e}")
+
 
 @app.on_event("startup")
 async def startup_event():
     logger.info("FastAPI app starting")
+    # in the background so an absent Neo4j does not delay startup of the mock-backed API
+    app.state.schema_task = asyncio.create_task(bootstrap_schema())
+    app.state.broadcast_task = asyncio.create_task(broadcast.poll_loop())
+    # Index the fallback data off the event loop so the first degraded request does not pay for it
+    app.state.fallback_task = asyncio.create_task(asyncio.to_thread(get_fallback_store))
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("FastAPI app shutting down")
+    app.state.broadcast_task.cancel()
 
 @app.post("/model/train")
 async def model_train(payload: Dict[str, Any] = None):
@@ -41,11 +41,46 @@ class InvoiceTraceResponse(BaseModel):
     explanation: Optional[str] = None
 
 
+class InvoiceTraceBatchRequest(BaseModel):
+    invoice_ids: List[str] = Field(min_length=1)
+
+
 class ReconcileItem(BaseModel):
     seller: str
     invoice_id: str
     buyer: Optional[str]
     root_cause: List[str]
+    risk_score: Optional[float] = None
+    risk_band: Optional[str] = None
+    # 1.0 for an exact invoice match, the fuzzy score for one found by recon.fuzzy
+    match_confidence: Optional[float] = None
+    # Hops in the shortest detected carousel through this seller->buyer trade
+    carousel_length: Optional[int] = None
+
+
+class Carousel(BaseModel):
+    rank: int
+    members: List[str]
+    length: int
+    total_tax: float
+    min_edge_tax: float
+
+
+class ReconcileFilesRequest(BaseModel):
+    supply: Optional[str] = None
+    claims: Optional[str] = None
+    returns: Optional[str] = None
+
+
+class ReconcileFilesResponse(BaseModel):
+    summary: Dict[str, Any]
+    items: List[ReconcileItem]
+
+
+class ReconcilePartitionsResponse(BaseModel):
+    partitions: List[Dict[str, Any]]
+    mismatches: int
+    items: List[ReconcileItem]
 
 
 class GraphNode(BaseModel):
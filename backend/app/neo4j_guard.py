@@ -0,0 +1,186 @@
+from datetime import datetime
+from typing import Dict, Any, Optional
+from neo4j import Query
+from neo4j.exceptions import ClientError, IncompleteCommit, ServiceUnavailable, SessionExpired, TransientError
+from loguru import logger
+import asyncio
+import os
+
+# Every API query goes through GuardedDriver: a per-query timeout (sent to the
+# server as the transaction timeout and enforced client-side while waiting)
+# and a circuit breaker. After NEO4J_BREAKER_THRESHOLD consecutive connection
+# failures or timeouts the breaker opens; sessions then fail at once, so
+# handlers serve their fallbacks without waiting on Bolt, while a background
+# probe retries every NEO4J_BREAKER_PROBE_S and closes it on success.
+QUERY_TIMEOUT_S = float(os.getenv("NEO4J_QUERY_TIMEOUT_S", "10"))
+# Whole-graph scans (snapshot builds, streams, schema bootstrap)
+LONG_QUERY_TIMEOUT_S = float(os.getenv("NEO4J_LONG_QUERY_TIMEOUT_S", "600"))
+BREAKER_THRESHOLD = int(os.getenv("NEO4J_BREAKER_THRESHOLD", "3"))
+BREAKER_PROBE_S = float(os.getenv("NEO4J_BREAKER_PROBE_S", "5"))
+PROBE_QUERY = "RETURN 1 AS ok"
+
+# Errors that say the database is unreachable or overloaded, as opposed to a bad
+# query or client-side misuse (ResultConsumedError, SessionError, ... are DriverErrors too)
+_OUTAGE_ERRORS = (ServiceUnavailable, SessionExpired, TransientError, IncompleteCommit, OSError)
+
+
+class CircuitOpenError(ServiceUnavailable):
+    """Raised instead of contacting Neo4j while the breaker is open."""
+
+
+class Breaker:
+    def __init__(self):
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+        self.counts = {"queries": 0, "failures": 0, "timeouts": 0, "rejected": 0, "trips": 0, "probes": 0}
+
+    def check(self):
+        if self.state == "open":
+            self.counts["rejected"] += 1
+            raise CircuitOpenError(f"Neo4j circuit open since {self.opened_at:%H:%M:%S}: {self.last_error}")
+
+    def success(self):
+        self.consecutive_failures = 0
+
+    def failure(self, error: BaseException) -> bool:
+        """Count a failure; True if it just opened the breaker."""
+        self.counts["failures"] += 1
+        self.consecutive_failures += 1
+        self.last_error = f"{type(error).__name__}: {str(error) or 'timed out'}"
+        if self.state == "closed" and self.consecutive_failures >= BREAKER_THRESHOLD:
+            self.state, self.opened_at = "open", datetime.utcnow()
+            self.counts["trips"] += 1
+            logger.warning(f"Neo4j circuit opened after {self.consecutive_failures} failures: {self.last_error}")
+            return True
+        return False
+
+    def close(self):
+        logger.info(f"Neo4j circuit closed after being open since {self.opened_at}")
+        self.state, self.opened_at, self.consecutive_failures = "closed", None, 0
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "opened_at": self.opened_at,
+            "consecutive_failures": self.consecutive_failures,
+            "last_error": self.last_error,
+            "query_timeout_s": QUERY_TIMEOUT_S,
+            **self.counts,
+        }
+
+
+def _timed_out(error: BaseException) -> bool:
+    # The server reports its transaction timeout as a client error
+    return isinstance(error, asyncio.TimeoutError) or (isinstance(error, ClientError) and "TransactionTimedOut" in (error.code or ""))
+
+
+class GuardedResult:
+    """Result whose buffered reads (single, data, consume, ...) are bounded by the query timeout.
+
+    Record-by-record iteration is bounded by the server-side transaction timeout only.
+    """
+
+    def __init__(self, result, session: "GuardedSession"):
+        self._result = result
+        self._session = session
+
+    async def __aiter__(self):
+        async for record in self._result:
+            yield record
+        self._session._guard_driver.breaker.success()
+
+    def __getattr__(self, name):
+        attr = getattr(self._result, name)
+        if name not in ("single", "data", "consume", "values", "value", "fetch", "peek", "to_df"):
+            return attr
+
+        async def bounded(*args, **kwargs):
+            return await self._session._guard(attr(*args, **kwargs))
+
+        return bounded
+
+
+class GuardedSession:
+    def __init__(self, session, guard: "GuardedDriver", timeout: Optional[float]):
+        self._session = session
+        self._guard_driver = guard
+        self._timeout = timeout
+
+    async def __aenter__(self):
+        await self._session.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc):
+        return await self._session.__aexit__(*exc)
+
+    async def _guard(self, awaitable, completes: bool = True):
+        """Await under the query timeout, counting outages; `completes` if success means the query finished."""
+        breaker = self._guard_driver.breaker
+        try:
+            value = await asyncio.wait_for(awaitable, self._timeout)
+        except Exception as e:
+            if _timed_out(e):
+                breaker.counts["timeouts"] += 1
+            elif not isinstance(e, _OUTAGE_ERRORS):
+                # A failing query is not an outage
+                raise
+            if breaker.failure(e):
+                self._guard_driver.start_probe()
+            raise
+        if completes:
+            breaker.success()
+        return value
+
+    async def run(self, query, **params) -> GuardedResult:
+        breaker = self._guard_driver.breaker
+        breaker.check()
+        breaker.counts["queries"] += 1
+        if not isinstance(query, Query) and self._timeout is not None:
+            query = Query(query, timeout=self._timeout)
+        # The server may accept a query and then stall, so only reading the result counts as success
+        return GuardedResult(await self._guard(self._session.run(query, **params), completes=False), self)
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+
+class GuardedDriver:
+    """Wraps an async driver so every session gets timeouts and the shared breaker.
+
+    `session(query_timeout=...)` overrides NEO4J_QUERY_TIMEOUT_S for that
+    session's queries; None disables the timeout.
+    """
+
+    def __init__(self, driver, database: str):
+        self._driver = driver
+        self._database = database
+        self.breaker = Breaker()
+        self._probe: Optional[asyncio.Task] = None
+
+    def start_probe(self):
+        if self._probe is None or self._probe.done():
+            self._probe = asyncio.get_running_loop().create_task(self._probe_until_closed())
+
+    async def _probe_until_closed(self):
+        # Straight to the wrapped driver: the breaker would reject these
+        while self.breaker.state == "open":
+            await asyncio.sleep(BREAKER_PROBE_S)
+            self.breaker.counts["probes"] += 1
+            try:
+                async with self._driver.session(database=self._database) as session:
+                    result = await asyncio.wait_for(session.run(Query(PROBE_QUERY, timeout=QUERY_TIMEOUT_S)), QUERY_TIMEOUT_S)
+                    await asyncio.wait_for(result.consume(), QUERY_TIMEOUT_S)
+            except Exception as e:
+                self.breaker.last_error = f"{type(e).__name__}: {e}"
+                continue
+            self.breaker.close()
+
+    def session(self, query_timeout: Optional[float] = QUERY_TIMEOUT_S, **kwargs) -> GuardedSession:
+        self.breaker.check()
+        kwargs.setdefault("database", self._database)
+        return GuardedSession(self._driver.session(**kwargs), self, query_timeout)
+
+    def __getattr__(self, name):
+        return getattr(self._driver, name)
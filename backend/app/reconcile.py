@@ -1,72 +1,284 @@
-from typing import Dict, Any, List, Optional
-from .db import neo4j_driver, NEO4J_DB
-import csv
+from datetime import date, timedelta
+from typing import Dict, Any, AsyncIterator, List, Literal, Optional, Tuple
+from .db import neo4j_driver, mongo_db, NEO4J_DB
+from .neo4j_guard import QUERY_TIMEOUT_S, LONG_QUERY_TIMEOUT_S
+from .fallback_store import get_store as get_fallback_store
+from pipeline.state import GRAPH_STATE_ID
+from pipeline.snapshot import (
+    RECONCILE_BODY, RECONCILE_QUERY, RECONCILE_RETURN, ROOT_CAUSE_TEXT, SNAPSHOTS, SNAPSHOT_INDEXES, SNAPSHOT_STATE,
+    SNAPSHOT_STATE_ID, SnapshotBuild, duplicates_only, join_query, reconcile_item,
+)
+from gds.cycle_detection import CAROUSELS
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from loguru import logger
+import asyncio
 import os
+import time
+
+RECONCILE_PAGE_SIZE = int(os.getenv("RECONCILE_PAGE_SIZE", "500"))
+RECONCILE_MAX_PAGE_SIZE = int(os.getenv("RECONCILE_MAX_PAGE_SIZE", "5000"))
+# Partitions of a partitioned reconcile queried at once, each on its own session
+RECONCILE_PARTITION_CONCURRENCY = int(os.getenv("RECONCILE_PARTITION_CONCURRENCY", "4"))
+
+# Pages and streams are served from the snapshot until the graph version moves
+_SNAPSHOT_SORT = [("invoice_id", 1), ("buyer", 1)]
+_SNAPSHOT_PROJECTION = {"_id": 0, "version": 0, "causes": 0}
+
+RootCause = Literal["missing_return", "missing_claim", "tax_discrepancy"]
+
+
+TRACE_QUERY = """
+MATCH (s:Taxpayer)-[:ISSUED]->(i:Invoice {invoice_id: $invoice_id})
+OPTIONAL MATCH (i)-[:CLAIMED_BY]->(b:Taxpayer)
+OPTIONAL MATCH (i)-[:REPORTED_IN]->(r:Return)
+WITH s, i, b, r,
+    CASE WHEN r IS NULL THEN true ELSE false END AS missing_return,
+    CASE WHEN b IS NULL THEN true ELSE false END AS missing_claim,
+    CASE WHEN i.claimed_tax_amount IS NOT NULL AND abs(i.tax_amount - i.claimed_tax_amount) > 0.01 THEN true ELSE false END AS tax_discrepancy
+RETURN s.gstin AS seller, s.name AS seller_name, b.gstin AS buyer, b.name AS buyer_name,
+    i.invoice_id AS invoice_id, i.tax_amount AS tax_amount, i.claimed_tax_amount AS claimed_tax_amount,
+    r.return_id AS return_id, r.status AS return_status, r.filing_date AS filing_date,
+    missing_return, missing_claim, tax_discrepancy
+"""
+COUNTERPART_RISK_QUERY = """
+MATCH (s:Taxpayer {gstin: $seller})
+OPTIONAL MATCH (b:Taxpayer {gstin: $buyer})
+RETURN s.risk_score AS srisk, s.cluster_id AS scluster, s.component_id AS scomp,
+    b.risk_score AS brisk, b.cluster_id AS bcluster, b.component_id AS bcomp
+"""
+# Trace plus counterpart risk for many invoices in one round trip; one row per
+# invoice (the first return it was reported in, as TRACE_QUERY's single() takes).
+BATCH_TRACE_QUERY = """
+UNWIND $invoice_ids AS iid
+MATCH (s:Taxpayer)-[:ISSUED]->(i:Invoice {invoice_id: iid})
+OPTIONAL MATCH (i)-[:CLAIMED_BY]->(b:Taxpayer)
+OPTIONAL MATCH (i)-[:REPORTED_IN]->(r:Return)
+WITH s, i, b, head(collect(r)) AS r
+RETURN s.gstin AS seller, s.name AS seller_name, b.gstin AS buyer, b.name AS buyer_name,
+    i.invoice_id AS invoice_id, i.tax_amount AS tax_amount, i.claimed_tax_amount AS claimed_tax_amount,
+    r.return_id AS return_id, r.status AS return_status, r.filing_date AS filing_date,
+    r IS NULL AS missing_return,
+    b IS NULL AS missing_claim,
+    COALESCE(i.claimed_tax_amount IS NOT NULL AND abs(i.tax_amount - i.claimed_tax_amount) > 0.01, false) AS tax_discrepancy,
+    s.risk_score AS srisk, s.cluster_id AS scluster, s.component_id AS scomp,
+    b.risk_score AS brisk, b.cluster_id AS bcluster, b.component_id AS bcomp
+"""
+TRACE_BATCH_MAX = int(os.getenv("INVOICE_TRACE_BATCH_MAX", "1000"))
+# Keyset anchors: start from the most selective index and keep invoice_id order,
+# so ORDER BY is served by the index (or sorts one taxpayer's invoices) and LIMIT
+# stops the scan early. The cursor is (invoice_id, buyer): an invoice claimed by
+# several buyers has one row each and may span pages, so the anchor starts at
+# the cursor's invoice and the filters drop the buyers already returned.
+_ANCHORS = {
+    "invoice": "MATCH (i:Invoice) WHERE i.invoice_id >= $after\nMATCH (s:Taxpayer)-[:ISSUED]->(i)",
+    "seller": "MATCH (s:Taxpayer {gstin: $seller})-[:ISSUED]->(i:Invoice) WHERE i.invoice_id >= $after",
+    "buyer": "MATCH (:Taxpayer {gstin: $buyer})<-[:CLAIMED_BY]-(i:Invoice) WHERE i.invoice_id >= $after\nMATCH (s:Taxpayer)-[:ISSUED]->(i)",
+}
+_RECONCILE_FILTERS = """
+  AND (i.invoice_id > $after OR ($after_buyer IS NOT NULL AND COALESCE(b.gstin, '') > $after_buyer))
+  AND ($seller IS NULL OR s.gstin = $seller)
+  AND ($buyer IS NULL OR b.gstin = $buyer)
+  AND ($root_cause IS NULL OR CASE $root_cause
+        WHEN 'missing_return' THEN missing_return
+        WHEN 'missing_claim' THEN missing_claim
+        ELSE tax_discrepancy END)
+"""
+
+
+def reconcile_query(seller: Optional[str] = None, buyer: Optional[str] = None, paged: bool = True) -> str:
+    anchor = _ANCHORS["seller" if seller else "buyer" if buyer else "invoice"]
+    return join_query(anchor, RECONCILE_BODY, _RECONCILE_FILTERS, RECONCILE_RETURN, "ORDER BY invoice_id, buyer" + ("\nLIMIT $limit" if paged else ""))
+
+
+# Partition anchors: a half-open invoice_date range served by invoice_date_idx,
+# optionally narrowed to one seller state, or one seller state on its own
+# (taxpayer_state_idx). Invoices without a date, or sellers without a state,
+# fall outside every partition of that kind.
+_PARTITION_ANCHORS = {
+    "period": """MATCH (i:Invoice) WHERE i.invoice_date >= $date_from AND i.invoice_date < $date_to
+MATCH (s:Taxpayer)-[:ISSUED]->(i)
+WHERE ($state IS NULL OR s.state = $state) AND ($seller IS NULL OR s.gstin = $seller)""",
+    "state": """MATCH (s:Taxpayer {state: $state})-[:ISSUED]->(i:Invoice)
+WHERE $seller IS NULL OR s.gstin = $seller""",
+}
+STATES_QUERY = "MATCH (t:Taxpayer) WHERE t.state IS NOT NULL RETURN DISTINCT t.state AS state ORDER BY state"
+
+
+def partition_query(by_period: bool) -> str:
+    return join_query(_PARTITION_ANCHORS["period" if by_period else "state"], RECONCILE_BODY, RECONCILE_RETURN)
+
+
+def month_ranges(date_from: date, date_to: date) -> List[Tuple[date, date]]:
+    """Half-open calendar-month ranges covering date_from..date_to inclusive."""
+    end = date_to + timedelta(days=1)
+    ranges = []
+    start = date_from
+    while start < end:
+        next_month = (start.replace(day=1) + timedelta(days=32)).replace(day=1)
+        ranges.append((start, min(next_month, end)))
+        start = next_month
+    return ranges
+
+
+# Separates invoice_id from buyer in a page cursor; GSTINs never contain it
+CURSOR_SEP = "|"
+
+
+def page_cursor(row: Dict[str, Any]) -> str:
+    """Cursor resuming after `row`: its invoice_id and buyer (empty when unclaimed)."""
+    return f"{row['invoice_id']}{CURSOR_SEP}{row['buyer'] or ''}"
+
+
+def parse_cursor(after: Optional[str]) -> Tuple[str, Optional[str]]:
+    """(invoice_id, buyer) from a page cursor; a bare invoice_id resumes after all of that invoice's rows."""
+    if not after:
+        return "", None
+    if CURSOR_SEP not in after:
+        return after, None
+    invoice_id, buyer = after.rsplit(CURSOR_SEP, 1)
+    return invoice_id, buyer
+
+
+def _row_key(row: Dict[str, Any]) -> Tuple[str, str]:
+    # Unclaimed invoices have exactly one row, so None and '' never need telling apart
+    return row["invoice_id"], row["buyer"] or ""
+
+
+def _snapshot_query(version: int, after: str, after_buyer: Optional[str], seller: Optional[str], buyer: Optional[str],
+                    root_cause: Optional[str]) -> Dict[str, Any]:
+    query: Dict[str, Any] = {"version": version, "invoice_id": {"$gt": after}}
+    if after_buyer is not None:
+        # Rest of the cursor's invoice, then everything after it; stays one index range
+        query["invoice_id"] = {"$gte": after}
+        query["$nor"] = [{"invoice_id": after, "buyer": {"$lte": after_buyer}}, {"invoice_id": after, "buyer": None}]
+    if seller is not None:
+        query["seller"] = seller
+    if buyer is not None:
+        query["buyer"] = buyer
+    if root_cause is not None:
+        query["causes"] = root_cause
+    return query
+
+
+_snapshot_lock = asyncio.Lock()
+
+
+async def _snapshot_version() -> Optional[int]:
+    doc = await mongo_db[SNAPSHOT_STATE].find_one({"_id": SNAPSHOT_STATE_ID})
+    return doc["version"] if doc else None
+
+
+async def _insert_snapshot(coll, docs: List[Dict[str, Any]]):
+    try:
+        await coll.insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        if not duplicates_only(e):
+            raise
+
+
+async def ensure_snapshot() -> int:
+    """Version of a current reconcile snapshot, rebuilding it if the graph version moved.
+
+    The lock only serialises builds in this process; the pipeline and other
+    API workers may build at the same time, which SnapshotBuild.flip allows for.
+    """
+    state = await mongo_db["graph_state"].find_one({"_id": GRAPH_STATE_ID})
+    version = state["version"] if state else 0
+    current = await _snapshot_version()
+    if current is not None and current >= version:
+        return current
+    async with _snapshot_lock:
+        current = await _snapshot_version()
+        if current is not None and current >= version:
+            return current
+        # The async twin of pipeline.snapshot.build
+        coll = mongo_db[SNAPSHOTS]
+        for keys, unique in SNAPSHOT_INDEXES:
+            await coll.create_index(keys, unique=unique)
+        snapshot = SnapshotBuild(version)
+        async with neo4j_driver.session(database=NEO4J_DB, query_timeout=LONG_QUERY_TIMEOUT_S) as session:
+            res = await session.run(RECONCILE_QUERY)
+            async for row in res:
+                batch = snapshot.add(row)
+                if batch:
+                    await _insert_snapshot(coll, batch)
+        batch = snapshot.take()
+        if batch:
+            await _insert_snapshot(coll, batch)
+        # Flip readers to the new version before dropping older ones
+        try:
+            await mongo_db[SNAPSHOT_STATE].update_one(*snapshot.flip(), upsert=True)
+        except DuplicateKeyError:
+            logger.info(f"Reconcile snapshot already at or past graph version {version}")
+        current = await _snapshot_version()
+        await coll.delete_many(snapshot.stale(current))
+        logger.info(f"Built reconcile snapshot for graph version {version}: {snapshot.summary['mismatches']} mismatches")
+    return current
+
+
+async def _live_rows(limit: Optional[int] = None, **params) -> AsyncIterator[Dict[str, Any]]:
+    timeout = LONG_QUERY_TIMEOUT_S if limit is None else QUERY_TIMEOUT_S
+    async with neo4j_driver.session(database=NEO4J_DB, query_timeout=timeout) as session:
+        if limit is None:
+            res = await session.run(reconcile_query(params["seller"], params["buyer"], paged=False), **params)
+        else:
+            res = await session.run(reconcile_query(params["seller"], params["buyer"]), limit=limit, **params)
+        async for row in res:
+            yield reconcile_item(row)
+
+
+async def _snapshot_rows(limit: Optional[int] = None, **params) -> AsyncIterator[Dict[str, Any]]:
+    try:
+        version = await ensure_snapshot()
+    except Exception as e:
+        logger.warning(f"reconcile snapshot unavailable, querying Neo4j directly: {e}")
+        async for row in _live_rows(limit, **params):
+            yield row
+        return
+    cursor = mongo_db[SNAPSHOTS].find(_snapshot_query(version, **params), _SNAPSHOT_PROJECTION).sort(_SNAPSHOT_SORT)
+    if limit is not None:
+        cursor = cursor.limit(limit)
+    async for doc in cursor:
+        yield doc
+
+
+def _build_trace(rec, risk) -> Dict[str, Any]:
+    """Trace response from a TRACE_QUERY record and its COUNTERPART_RISK_QUERY record (or None)."""
+    root_cause = [text for cause, text in ROOT_CAUSE_TEXT.items() if rec[cause]]
+    indicators = {"seller_risk": None, "buyer_risk": None, "cluster_id": None, "component_id": None}
+    if risk:
+        indicators["seller_risk"] = risk["srisk"]
+        indicators["buyer_risk"] = risk["brisk"]
+        indicators["cluster_id"] = risk["scluster"] or risk["bcluster"]
+        indicators["component_id"] = risk["scomp"] or risk["bcomp"]
+
+    path = [
+        {"type": "seller", "gstin": rec["seller"], "name": rec["seller_name"]},
+        {"type": "invoice", "invoice_id": rec["invoice_id"], "tax_amount": rec["tax_amount"], "claimed_tax_amount": rec["claimed_tax_amount"]},
+    ]
+    if rec["buyer"]:
+        path.append({"type": "buyer", "gstin": rec["buyer"], "name": rec["buyer_name"]})
+    if rec["return_id"]:
+        path.append({"type": "return", "return_id": rec["return_id"], "status": rec["return_status"], "filing_date": rec["filing_date"]})
+
+    return {
+        "invoice_id": rec["invoice_id"],
+        "found": True,
+        "root_cause": root_cause or ["No mismatch detected"],
+        "path": path,
+        "risk_indicators": indicators,
+    }
 
 
 async def invoice_trace(invoice_id: str) -> Dict[str, Any]:
     try:
         async with neo4j_driver.session(database=NEO4J_DB) as session:
-            res = await session.run(
-                """
-                MATCH (s:Taxpayer)-[:ISSUED]->(i:Invoice {invoice_id: $invoice_id})
-                OPTIONAL MATCH (i)-[:CLAIMED_BY]->(b:Taxpayer)
-                OPTIONAL MATCH (i)-[:REPORTED_IN]->(r:Return)
-                WITH s, i, b, r,
-                    CASE WHEN r IS NULL THEN true ELSE false END AS missing_return,
-                    CASE WHEN b IS NULL THEN true ELSE false END AS missing_claim,
-                    CASE WHEN i.claimed_tax_amount IS NOT NULL AND abs(i.tax_amount - i.claimed_tax_amount) > 0.01 THEN true ELSE false END AS tax_discrepancy
-                RETURN s.gstin AS seller, s.name AS seller_name, b.gstin AS buyer, b.name AS buyer_name,
-                    i.invoice_id AS invoice_id, i.tax_amount AS tax_amount, i.claimed_tax_amount AS claimed_tax_amount,
-                    r.return_id AS return_id, r.status AS return_status, r.filing_date AS filing_date,
-                    missing_return, missing_claim, tax_discrepancy
-                """,
-                invoice_id=invoice_id,
-            )
+            res = await session.run(TRACE_QUERY, invoice_id=invoice_id)
             rec = await res.single()
             if not rec:
                 return {"invoice_id": invoice_id, "found": False}
-            root_cause = []
-            if rec["missing_return"]:
-                root_cause.append("Invoice not reported in return")
-            if rec["missing_claim"]:
-                root_cause.append("Missing claim edge to buyer")
-            if rec["tax_discrepancy"]:
-                root_cause.append("Tax amount discrepancy detected")
-            indicators = {"seller_risk": None, "buyer_risk": None, "cluster_id": None, "component_id": None}
-            res2 = await session.run(
-                """
-                MATCH (s:Taxpayer {gstin: $seller})
-                OPTIONAL MATCH (b:Taxpayer {gstin: $buyer})
-                RETURN s.risk_score AS srisk, s.cluster_id AS scluster, s.component_id AS scomp,
-                    b.risk_score AS brisk, b.cluster_id AS bcluster, b.component_id AS bcomp
-                """,
-                seller=rec["seller"],
-                buyer=rec["buyer"],
-            )
-            r2 = await res2.single()
-            if r2:
-                indicators["seller_risk"] = r2["srisk"]
-                indicators["buyer_risk"] = r2["brisk"]
-                indicators["cluster_id"] = r2["scluster"] or r2["bcluster"]
-                indicators["component_id"] = r2["scomp"] or r2["bcomp"]
-
-            path = [
-                {"type": "seller", "gstin": rec["seller"], "name": rec["seller_name"]},
-                {"type": "invoice", "invoice_id": rec["invoice_id"], "tax_amount": rec["tax_amount"], "claimed_tax_amount": rec["claimed_tax_amount"]},
-            ]
-            if rec["buyer"]:
-                path.append({"type": "buyer", "gstin": rec["buyer"], "name": rec["buyer_name"]})
-            if rec["return_id"]:
-                path.append({"type": "return", "return_id": rec["return_id"], "status": rec["return_status"], "filing_date": rec["filing_date"]})
-
-            return {
-                "invoice_id": invoice_id,
-                "found": True,
-                "root_cause": root_cause or ["No mismatch detected"],
-                "path": path,
-                "risk_indicators": indicators,
-            }
+            res2 = await session.run(COUNTERPART_RISK_QUERY, seller=rec["seller"], buyer=rec["buyer"])
+            return _build_trace(rec, await res2.single())
     except Exception:
         mock = _mock_invoice_trace(invoice_id)
         if mock:
@@ -74,38 +286,141 @@ async def invoice_trace(invoice_id: str) -> Dict[str, Any]:
         raise
 
 
-async def reconcile(depth: int = 3) -> List[Dict[str, Any]]:
+async def invoice_traces(invoice_ids: List[str]) -> List[Dict[str, Any]]:
+    """Traces for many invoices from one BATCH_TRACE_QUERY, in the order requested."""
+    unique = list(dict.fromkeys(invoice_ids))
     try:
         async with neo4j_driver.session(database=NEO4J_DB) as session:
-            res = await session.run(
-                """
-                MATCH (s:Taxpayer)-[:ISSUED]->(i:Invoice)
-                OPTIONAL MATCH (i)-[:CLAIMED_BY]->(b:Taxpayer)
-                OPTIONAL MATCH (i)-[:REPORTED_IN]->(r:Return)
-                WITH s, i, b, r,
-                     CASE WHEN r IS NULL THEN true ELSE false END AS missing_return,
-                     CASE WHEN b IS NULL THEN true ELSE false END AS missing_claim,
-                     CASE WHEN i.claimed_tax_amount IS NOT NULL AND abs(i.tax_amount - i.claimed_tax_amount) > 0.01 THEN true ELSE false END AS tax_discrepancy
-                WHERE missing_return OR missing_claim OR tax_discrepancy
-                RETURN s.gstin AS seller, i.invoice_id AS invoice_id, b.gstin AS buyer,
-                       missing_return, missing_claim, tax_discrepancy
-                """
-            )
-            rows = await res.data()
-            output = []
-            for row in rows:
-                rc = []
-                if row["missing_return"]:
-                    rc.append("Invoice not reported in return")
-                if row["missing_claim"]:
-                    rc.append("Missing claim edge to buyer")
-                if row["tax_discrepancy"]:
-                    rc.append("Tax amount discrepancy detected")
-                output.append({"seller": row["seller"], "invoice_id": row["invoice_id"], "buyer": row["buyer"], "root_cause": rc})
-            return output
+            res = await session.run(BATCH_TRACE_QUERY, invoice_ids=unique)
+            traces = {rec["invoice_id"]: _build_trace(rec, rec) async for rec in res}
+    except Exception as e:
+        logger.warning(f"batch invoice trace failed, using mock data: {e}")
+        traces = {iid: _mock_invoice_trace(iid) for iid in unique}
+        traces = {iid: t if t else {"invoice_id": iid, "found": False, "root_cause": ["Neo4j unavailable"]} for iid, t in traces.items()}
+    return [traces.get(iid) or {"invoice_id": iid, "found": False} for iid in invoice_ids]
+
+
+async def _annotate_carousels(rows: List[Dict[str, Any]], depth: int):
+    """Set carousel_length on rows whose seller->buyer trade is on a stored loop of at most `depth` hops."""
+    edges = {f"{r['seller']}>{r['buyer']}" for r in rows if r.get("buyer")}
+    shortest: Dict[str, int] = {}
+    if edges:
+        query = {"edges": {"$in": sorted(edges)}, "length": {"$lte": depth}}
+        async for doc in mongo_db[CAROUSELS].find(query, {"_id": 0, "edges": 1, "length": 1}):
+            for edge in edges.intersection(doc["edges"]):
+                shortest[edge] = min(doc["length"], shortest.get(edge, doc["length"]))
+    for r in rows:
+        r["carousel_length"] = shortest.get(f"{r['seller']}>{r['buyer']}")
+
+
+async def reconcile(depth: int = 3, after: Optional[str] = None, page_size: int = RECONCILE_PAGE_SIZE,
+                    root_cause: Optional[RootCause] = None, seller: Optional[str] = None,
+                    buyer: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """One page of mismatches in (invoice_id, buyer) order after the `after` cursor.
+
+    Served from the snapshot for the current graph version, built on first use.
+    Items whose trade lies on a carousel of at most `depth` hops found by
+    gds.cycle_detection carry its length. Returns (items, next cursor); the
+    cursor is None on the last page.
+    """
+    page_size = max(1, min(page_size, RECONCILE_MAX_PAGE_SIZE))
+    after_invoice, after_buyer = parse_cursor(after)
+    params = {"after": after_invoice, "after_buyer": after_buyer, "seller": seller, "buyer": buyer, "root_cause": root_cause}
+    try:
+        rows = [row async for row in _snapshot_rows(page_size + 1, **params)]
     except Exception:
         # Return comprehensive mock data for demo purposes
-        return _mock_reconcile_data()
+        rows = _filter_mock(_mock_reconcile_data(), **params)
+    rows, next_cursor = (rows[:page_size], page_cursor(rows[page_size - 1])) if len(rows) > page_size else (rows, None)
+    try:
+        await _annotate_carousels(rows, depth)
+    except Exception as e:
+        logger.warning(f"carousel lookup failed: {e}")
+    return rows, next_cursor
+
+
+async def reconcile_stream(after: Optional[str] = None, root_cause: Optional[RootCause] = None,
+                           seller: Optional[str] = None, buyer: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+    """Yield mismatched invoices as the snapshot (or Neo4j) cursor produces them."""
+    after_invoice, after_buyer = parse_cursor(after)
+    params = {"after": after_invoice, "after_buyer": after_buyer, "seller": seller, "buyer": buyer, "root_cause": root_cause}
+    streamed = False
+    try:
+        async for row in _snapshot_rows(**params):
+            streamed = True
+            yield row
+    except Exception as e:
+        if streamed:
+            # rows already went out; end the stream rather than mix in mock data
+            logger.warning(f"reconcile stream interrupted: {e}")
+            return
+        for row in _filter_mock(_mock_reconcile_data(), **params):
+            yield row
+
+
+def _partition_label(part: Dict[str, Any]) -> str:
+    period = None
+    if part["date_from"] is not None:
+        last = part["date_to"] - timedelta(days=1)
+        whole_month = part["date_from"].day == 1 and last.month != part["date_to"].month
+        period = part["date_from"].strftime("%Y-%m") if whole_month else f"{part['date_from']}..{last}"
+    return "/".join(p for p in (period, part["state"]) if p)
+
+
+async def _reconcile_partition(semaphore: asyncio.Semaphore, part: Dict[str, Any],
+                               seller: Optional[str]) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    async with semaphore:
+        started = time.perf_counter()
+        async with neo4j_driver.session(database=NEO4J_DB, query_timeout=LONG_QUERY_TIMEOUT_S) as session:
+            res = await session.run(partition_query(part["date_from"] is not None), seller=seller, **part)
+            rows = [reconcile_item(row) async for row in res]
+    return rows, {"partition": _partition_label(part), "mismatches": len(rows), "elapsed_s": round(time.perf_counter() - started, 3)}
+
+
+async def reconcile_partitioned(date_from: Optional[date] = None, date_to: Optional[date] = None, by_month: bool = True,
+                                by_state: bool = False, states: Optional[List[str]] = None, seller: Optional[str] = None,
+                                concurrency: int = RECONCILE_PARTITION_CONCURRENCY) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Reconcile invoice_date months and/or seller states as concurrent partitions.
+
+    date_from..date_to is inclusive and split into calendar months when
+    `by_month`; `states` (or every state when `by_state` without a list)
+    splits further by seller state. At most `concurrency` partitions query
+    at once. Returns (items in invoice_id order, per-partition summaries).
+    """
+    if (date_from is None) != (date_to is None):
+        raise ValueError("date_from and date_to go together")
+    if date_from is None and not (by_state or states):
+        raise ValueError("partition by a date range, seller states or both")
+    try:
+        if by_state and not states:
+            async with neo4j_driver.session(database=NEO4J_DB) as session:
+                res = await session.run(STATES_QUERY)
+                states = [row["state"] async for row in res]
+        periods: List[Tuple[Optional[date], Optional[date]]] = [(None, None)]
+        if date_from is not None:
+            periods = month_ranges(date_from, date_to) if by_month else [(date_from, date_to + timedelta(days=1))]
+        parts = [{"date_from": start, "date_to": end, "state": state} for start, end in periods for state in (states or [None])]
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        results = await asyncio.gather(*(_reconcile_partition(semaphore, part, seller) for part in parts))
+    except Exception as e:
+        logger.warning(f"partitioned reconcile failed, using mock data: {e}")
+        rows = _filter_mock(_mock_reconcile_data(), "", None, seller, None, None)
+        return rows, [{"partition": "mock", "mismatches": len(rows), "elapsed_s": 0.0}]
+    rows = sorted((row for part_rows, _ in results for row in part_rows), key=_row_key)
+    return rows, [summary for _, summary in results]
+
+
+def _filter_mock(rows: List[Dict[str, Any]], after: str, after_buyer: Optional[str], seller: Optional[str],
+                 buyer: Optional[str], root_cause: Optional[str]) -> List[Dict[str, Any]]:
+    text = ROOT_CAUSE_TEXT.get(root_cause)
+    return sorted(
+        (r for r in rows
+         if (r["invoice_id"] > after or (after_buyer is not None and r["invoice_id"] == after and (r["buyer"] or "") > after_buyer))
+         and (seller is None or r["seller"] == seller)
+         and (buyer is None or r["buyer"] == buyer)
+         and (text is None or text in r["root_cause"])),
+        key=_row_key,
+    )
 
 
 def _mock_reconcile_data() -> List[Dict[str, Any]]:
@@ -160,54 +475,4 @@ def _mock_reconcile_data() -> List[Dict[str, Any]]:
 
 
 def _mock_invoice_trace(invoice_id: str) -> Optional[Dict[str, Any]]:
-    base = os.path.dirname(os.path.dirname(__file__))
-    csv_path = os.path.join(base, "mock", "mock_data.csv")
-    if not os.path.exists(csv_path):
-        return None
-    risk_map = {
-        "27ABCDE1234F1Z5": 30.0,
-        "33QWERT5678U1Z1": 55.0,
-        "29LMNOP4321Q1Z3": 85.0,
-        "09PQRS5678T1Z2": 25.0,
-        "07XYZAB9876C1Z7": 45.0,
-    }
-    with open(csv_path, newline="") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            if row.get("invoice_id") == invoice_id:
-                seller = row.get("seller_gstin")
-                buyer = row.get("buyer_gstin")
-                ret = row.get("return_id") or ""
-                try:
-                    tax_amount = float(row.get("tax_amount") or 0.0)
-                    claimed = float(row.get("claimed_tax_amount")) if row.get("claimed_tax_amount") not in (None, "",) else None
-                except Exception:
-                    tax_amount = 0.0
-                    claimed = None
-                missing_return = ret == ""
-                missing_claim = buyer in (None, "",)
-                tax_discrepancy = (claimed is not None) and (abs(tax_amount - claimed) > 0.01)
-                root = []
-                if missing_return:
-                    root.append("Invoice not reported in return")
-                if missing_claim:
-                    root.append("Missing claim edge to buyer")
-                if tax_discrepancy:
-                    root.append("Tax amount discrepancy detected")
-                path = [
-                    {"type": "seller", "gstin": seller, "name": row.get("seller_name")},
-                    {"type": "invoice", "invoice_id": invoice_id, "tax_amount": tax_amount, "claimed_tax_amount": claimed},
-                ]
-                if buyer and not missing_claim:
-                    path.append({"type": "buyer", "gstin": buyer, "name": row.get("buyer_name")})
-                if not missing_return:
-                    path.append({"type": "return", "return_id": ret, "status": row.get("status"), "filing_date": row.get("filing_date")})
-                indicators = {"seller_risk": risk_map.get(seller), "buyer_risk": risk_map.get(buyer), "cluster_id": None, "component_id": None}
-                return {
-                    "invoice_id": invoice_id,
-                    "found": True,
-                    "root_cause": root or ["No mismatch detected"],
-                    "path": path,
-                    "risk_indicators": indicators,
-                }
-    return None
+    return get_fallback_store().trace(invoice_id)
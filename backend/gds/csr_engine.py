@@ -0,0 +1,226 @@
+import os
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+from neo4j import GraphDatabase
+from loguru import logger
+
+NEO4J_URI = os.getenv("NEO4J_URI", "bolt://localhost:7687")
+NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
+NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "neo4j")
+DB = os.getenv("NEO4J_DB", "neo4j")
+
+WRITE_CHUNK = int(os.getenv("CSR_WRITE_CHUNK", "10000"))
+
+# GDS defaults, so results are comparable with run_gds
+DAMPING = 0.85
+PAGERANK_ITERATIONS = 20
+PAGERANK_TOLERANCE = 1e-7
+LPA_ITERATIONS = 10
+
+
+class CSRGraph:
+    """Directed graph as compressed sparse rows over dense node indices 0..n-1.
+
+    `src`/`dst` keep the deduplicated edge list sorted by source, `indptr`
+    indexes each node's out-edges within it.
+    """
+
+    def __init__(self, n: int, src: np.ndarray, dst: np.ndarray):
+        self.n = n
+        if len(src):
+            keys = np.unique(src.astype(np.int64) * n + dst.astype(np.int64))
+            src, dst = keys // n, keys % n
+        self.src = src.astype(np.int64)
+        self.dst = dst.astype(np.int64)
+        self.out_degree = np.bincount(self.src, minlength=n)
+        self.indptr = np.concatenate(([0], np.cumsum(self.out_degree)))
+
+    @property
+    def edges(self) -> int:
+        return len(self.src)
+
+
+def pagerank(g: CSRGraph, damping: float = DAMPING, max_iter: int = PAGERANK_ITERATIONS,
+             tol: float = PAGERANK_TOLERANCE, init: Optional[np.ndarray] = None) -> Tuple[np.ndarray, int]:
+    """Unnormalised PageRank as GDS computes it: (1 - d) + d * sum(in-neighbour share).
+
+    `init` warm-starts the iteration from previous scores. Returns (scores, iterations run).
+    """
+    scores = np.full(g.n, 1.0 - damping) if init is None else init.astype(np.float64).copy()
+    inv_out = np.zeros(g.n)
+    has_out = g.out_degree > 0
+    inv_out[has_out] = 1.0 / g.out_degree[has_out]
+    for it in range(1, max_iter + 1):
+        share = scores * inv_out
+        updated = (1.0 - damping) + damping * np.bincount(g.dst, weights=share[g.src], minlength=g.n)
+        delta = np.max(np.abs(updated - scores)) if g.n else 0.0
+        scores = updated
+        if delta < tol:
+            return scores, it
+    return scores, max_iter
+
+
+def degree(g: CSRGraph) -> np.ndarray:
+    # GDS degree with NATURAL orientation counts outgoing relationships
+    return g.out_degree.astype(np.float64)
+
+
+def wcc(n: int, src: np.ndarray, dst: np.ndarray, parent: Optional[np.ndarray] = None) -> np.ndarray:
+    """Union-find over the edge list, vectorised as repeated hook-and-compress.
+
+    Each round hooks the larger root of every edge onto the smaller one and
+    then path-compresses until every node points at its root, so the result
+    labels each component with its smallest node index.
+    """
+    parent = np.arange(n, dtype=np.int64) if parent is None else parent.copy()
+    while True:
+        while True:
+            grand = parent[parent]
+            if np.array_equal(grand, parent):
+                break
+            parent = grand
+        pu, pv = parent[src], parent[dst]
+        mask = pu != pv
+        if not mask.any():
+            return parent
+        lo, hi = np.minimum(pu[mask], pv[mask]), np.maximum(pu[mask], pv[mask])
+        np.minimum.at(parent, hi, lo)
+
+
+def label_propagation(g: CSRGraph, max_iter: int = LPA_ITERATIONS, init: Optional[np.ndarray] = None) -> Tuple[np.ndarray, int]:
+    """Synchronous label propagation on the undirected view of the graph.
+
+    Every node adopts the most frequent label among its neighbours and itself,
+    ties going to the smallest label. Returns (dense community ids, iterations run).
+    """
+    n = g.n
+    labels = np.arange(n, dtype=np.int64) if init is None else np.unique(init, return_inverse=True)[1].astype(np.int64)
+    self_idx = np.arange(n, dtype=np.int64)
+    voters = np.concatenate((g.src, g.dst, self_idx))
+    neighbours = np.concatenate((g.dst, g.src, self_idx))
+    iterations = 0
+    for iterations in range(1, max_iter + 1):
+        # sorting (node, label) keys groups the votes; run lengths are the vote counts
+        keys = np.sort(voters * n + labels[neighbours])
+        starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+        counts = np.diff(np.append(starts, len(keys)))
+        node, label = keys[starts] // n, keys[starts] % n
+        node_starts = np.flatnonzero(np.concatenate(([True], node[1:] != node[:-1])))
+        group = np.cumsum(np.concatenate(([True], node[1:] != node[:-1]))) - 1
+        best = np.flatnonzero(counts == np.maximum.reduceat(counts, node_starts)[group])
+        # runs are label-ordered within a node, so the first best run has the smallest label
+        first = best[np.concatenate(([True], group[best][1:] != group[best][:-1]))]
+        updated = labels.copy()
+        updated[node[first]] = label[first]
+        changed = int(np.count_nonzero(updated != labels))
+        labels = updated
+        if changed == 0:
+            break
+    return np.unique(labels, return_inverse=True)[1], iterations
+
+
+def load_graph(session, node_query: str = "MATCH (t:Taxpayer) RETURN t.gstin AS gstin",
+               edge_query: str = "MATCH (a:Taxpayer)-[:SELLS_TO]->(b:Taxpayer) RETURN a.gstin AS src, b.gstin AS dst",
+               **params) -> Tuple[List[str], CSRGraph]:
+    """Export taxpayers and SELLS_TO edges once into index arrays."""
+    gstins = [rec["gstin"] for rec in session.run(node_query, **params)]
+    index = {g: n for n, g in enumerate(gstins)}
+    src, dst = [], []
+    for rec in session.run(edge_query, **params):
+        s, d = index.get(rec["src"]), index.get(rec["dst"])
+        if s is not None and d is not None:
+            src.append(s)
+            dst.append(d)
+    return gstins, CSRGraph(len(gstins), np.array(src, dtype=np.int64), np.array(dst, dtype=np.int64))
+
+
+def _write_rows(tx, rows: List[Dict[str, Any]], mark_dirty: bool = False):
+    tx.run(
+        """
+        UNWIND $rows AS row
+        MATCH (t:Taxpayer {gstin: row.gstin})
+        SET t.pagerank_score = row.pagerank_score,
+            t.degree_centrality = row.degree_centrality,
+            t.cluster_id = row.cluster_id,
+            t.component_id = row.component_id
+        FOREACH (_ IN CASE WHEN $mark_dirty THEN [1] ELSE [] END | SET t:RiskDirty)
+        """,
+        rows=rows,
+        mark_dirty=mark_dirty,
+    ).consume()
+
+
+def write_back(session, gstins: List[str], results: Dict[str, np.ndarray], chunk_size: int = WRITE_CHUNK,
+               mark_dirty: bool = False) -> int:
+    """Write results back in chunks; `mark_dirty` also labels the taxpayers :RiskDirty for rescoring."""
+    columns = {prop: values.tolist() for prop, values in results.items()}
+    for start in range(0, len(gstins), chunk_size):
+        rows = [
+            {"gstin": gstins[n], **{prop: values[n] for prop, values in columns.items()}}
+            for n in range(start, min(start + chunk_size, len(gstins)))
+        ]
+        session.execute_write(_write_rows, rows, mark_dirty)
+    return len(gstins)
+
+
+def compute(g: CSRGraph) -> Tuple[Dict[str, np.ndarray], Dict[str, float]]:
+    timings = {}
+    started = time.perf_counter()
+    pr, pr_iters = pagerank(g)
+    timings["pagerank"] = time.perf_counter() - started
+    started = time.perf_counter()
+    deg = degree(g)
+    timings["degree"] = time.perf_counter() - started
+    started = time.perf_counter()
+    clusters, lpa_iters = label_propagation(g)
+    timings["label_propagation"] = time.perf_counter() - started
+    started = time.perf_counter()
+    components = wcc(g.n, g.src, g.dst)
+    timings["wcc"] = time.perf_counter() - started
+    logger.info(f"PageRank converged in {pr_iters} iterations, label propagation in {lpa_iters}")
+    return {
+        "pagerank_score": pr,
+        "degree_centrality": deg,
+        "cluster_id": clusters,
+        "component_id": components,
+    }, timings
+
+
+def run(driver=None) -> Dict[str, Any]:
+    """PageRank, degree, label-propagation communities and WCC without the GDS plugin."""
+    own_driver = driver is None
+    if own_driver:
+        driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+    timings: Dict[str, float] = {}
+    started = time.perf_counter()
+    try:
+        with driver.session(database=DB) as session:
+            t0 = time.perf_counter()
+            gstins, g = load_graph(session)
+            timings["export"] = time.perf_counter() - t0
+            logger.info(f"Exported {g.n} taxpayers and {g.edges} SELLS_TO edges in {timings['export']:.2f}s")
+            results, compute_timings = compute(g)
+            timings.update(compute_timings)
+            t0 = time.perf_counter()
+            write_back(session, gstins, results)
+            timings["write"] = time.perf_counter() - t0
+    finally:
+        if own_driver:
+            driver.close()
+    summary = {
+        "engine": "csr",
+        "taxpayers": g.n,
+        "edges": g.edges,
+        "clusters": int(results["cluster_id"].max()) + 1 if g.n else 0,
+        "components": int(np.unique(results["component_id"]).size),
+        "timings": {k: round(v, 3) for k, v in timings.items()},
+        "elapsed_s": round(time.perf_counter() - started, 3),
+    }
+    logger.info(f"CSR analytics completed: {summary}")
+    return summary
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,347 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, Any, List, Tuple
+
+import numpy as np
+from neo4j import GraphDatabase
+from pymongo import MongoClient
+from loguru import logger
+
+from .csr_engine import wcc
+
+NEO4J_URI = os.getenv("NEO4J_URI", "bolt://localhost:7687")
+NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
+NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "neo4j")
+DB = os.getenv("NEO4J_DB", "neo4j")
+
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
+MONGO_DB = os.getenv("MONGO_DB", "gstkg")
+
+MAX_LENGTH = int(os.getenv("CYCLE_MAX_LENGTH", "6"))
+# Two-party back-and-forth trade is common and legitimate; carousels start at three
+MIN_LENGTH = int(os.getenv("CYCLE_MIN_LENGTH", "3"))
+# Taxpayers trading with more counterparties than this are hubs (distributors,
+# marketplaces); they multiply paths without being carousel members themselves.
+MAX_DEGREE = int(os.getenv("CYCLE_MAX_DEGREE", "200"))
+TIME_BUDGET_S = float(os.getenv("CYCLE_TIME_BUDGET_S", "60"))
+WORKERS = int(os.getenv("CYCLE_WORKERS", str(os.cpu_count() or 1)))
+# Cap on loops one search task reports before it stops early
+MAX_PER_TASK = int(os.getenv("CYCLE_MAX_PER_TASK", "10000"))
+# Small components are grouped so each worker task carries about this many
+# edges; larger ones are split across tasks
+TASK_EDGES = int(os.getenv("CYCLE_TASK_EDGES", "50000"))
+WRITE_CHUNK = int(os.getenv("CYCLE_WRITE_CHUNK", "1000"))
+# DFS steps between deadline checks inside one start's search
+CHECK_EVERY = 4096
+
+CAROUSELS = "carousels"
+CAROUSEL_RUNS = "carousel_runs"
+
+NODES_QUERY = "MATCH (t:Taxpayer) RETURN t.gstin AS gstin"
+# SELLS_TO carries the total_tax ingest keeps per trading pair
+EDGES_QUERY = """
+MATCH (a:Taxpayer)-[r:SELLS_TO]->(b:Taxpayer)
+WHERE a <> b
+RETURN a.gstin AS src, b.gstin AS dst, COALESCE(r.total_tax, 0.0) AS tax
+"""
+
+# (node indices, then edge sources, targets and tax with endpoints as positions in the node list)
+Component = Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+
+
+def load_edges(session) -> Tuple[List[str], np.ndarray, np.ndarray, np.ndarray]:
+    """Taxpayers and weighted SELLS_TO edges as index arrays."""
+    gstins = [rec["gstin"] for rec in session.run(NODES_QUERY)]
+    index = {g: n for n, g in enumerate(gstins)}
+    src, dst, tax = [], [], []
+    for rec in session.run(EDGES_QUERY):
+        s, d = index.get(rec["src"]), index.get(rec["dst"])
+        if s is not None and d is not None:
+            src.append(s)
+            dst.append(d)
+            tax.append(rec["tax"])
+    return gstins, np.array(src, dtype=np.int64), np.array(dst, dtype=np.int64), np.array(tax, dtype=np.float64)
+
+
+def prune(n: int, src: np.ndarray, dst: np.ndarray, max_degree: int = MAX_DEGREE) -> Tuple[np.ndarray, int]:
+    """Mask of edges that can lie on a cycle, and the number of hubs dropped.
+
+    Hubs above `max_degree` go first; then nodes without an in- or out-edge
+    are peeled off repeatedly, since no cycle passes through them.
+    """
+    total_degree = np.bincount(src, minlength=n) + np.bincount(dst, minlength=n)
+    hubs = total_degree > max_degree
+    keep = ~hubs[src] & ~hubs[dst]
+    while True:
+        out_deg = np.bincount(src[keep], minlength=n)
+        in_deg = np.bincount(dst[keep], minlength=n)
+        alive = (out_deg > 0) & (in_deg > 0)
+        still = keep & alive[src] & alive[dst]
+        if np.array_equal(still, keep):
+            return keep, int(hubs.sum())
+        keep = still
+
+
+# Components a worker searches, set once per process by _init_worker
+_components_in_worker: List[Component] = []
+_adjacency: Dict[int, Tuple[List[int], ...]] = {}
+
+
+def _init_worker(components: List[Component]):
+    global _components_in_worker
+    _components_in_worker = components
+    _adjacency.clear()
+
+
+def _csr(keys: np.ndarray, *values: np.ndarray) -> Tuple[List[int], ...]:
+    order = np.argsort(keys, kind="stable")
+    indptr = np.concatenate(([0], np.cumsum(np.bincount(keys, minlength=int(keys.max()) + 1))))
+    return (indptr.tolist(), *(v[order].tolist() for v in values))
+
+
+def _adjacency_of(ci: int) -> Tuple[List[int], ...]:
+    """(out_ptr, out_dst, out_tax, in_ptr, in_src, starts) over local node indices.
+
+    Built once per worker for each component its tasks touch. Python lists,
+    since the search walks them one element at a time.
+    """
+    if ci not in _adjacency:
+        nodes, local_src, local_dst, tax = _components_in_worker[ci]
+        # A node starts a loop only if it has both a larger successor and a larger predecessor
+        larger_out = np.zeros(len(nodes), dtype=bool)
+        larger_in = np.zeros(len(nodes), dtype=bool)
+        larger_out[local_src[local_dst > local_src]] = True
+        larger_in[local_dst[local_src > local_dst]] = True
+        _adjacency[ci] = (
+            *_csr(local_src, local_dst, tax),
+            *_csr(local_dst, local_src),
+            np.flatnonzero(larger_out & larger_in).tolist(),
+        )
+    return _adjacency[ci]
+
+
+def _component_cycles(ci: int, offset: int, stride: int, max_length: int, min_length: int, deadline: float,
+                      limit: int) -> Tuple[List[Tuple[List[int], List[float]]], bool]:
+    """Simple cycles of min_length..max_length edges from every `stride`-th candidate start; (cycles, truncated).
+
+    Each cycle is found once, from its smallest node, by a depth-first search
+    over larger nodes only. The deadline and `limit` are checked during the
+    search, not only between starts, so one dense start cannot overrun them.
+    A reverse BFS from the start bounds how far each node is from closing the
+    loop, so branches that cannot return within the remaining length are
+    never expanded.
+    """
+    nodes = _components_in_worker[ci][0]
+    out_ptr, out_dst, out_tax, in_ptr, in_src, starts = _adjacency_of(ci)
+    cycles: List[Tuple[List[int], List[float]]] = []
+    steps = 0
+    for start in starts[offset::stride]:
+        if time.time() > deadline or len(cycles) >= limit:
+            return cycles, True
+        # distance from each node (> start) back to start, up to max_length - 1 hops
+        dist = {start: 0}
+        frontier = [start]
+        for hops in range(1, max_length):
+            nxt = []
+            for v in frontier:
+                for u in in_src[in_ptr[v]:in_ptr[v + 1]]:
+                    if u > start and u not in dist:
+                        dist[u] = hops
+                        nxt.append(u)
+            frontier = nxt
+        if len(dist) < min_length:
+            continue
+        # Explicit DFS: path[k] is left through its out-edge at position nxt[k]
+        path, taxes, nxt, on_path = [start], [], [out_ptr[start]], {start}
+        while path:
+            steps += 1
+            if steps % CHECK_EVERY == 0 and time.time() > deadline:
+                return cycles, True
+            v, j = path[-1], nxt[-1]
+            if j == out_ptr[v + 1]:
+                on_path.discard(path.pop())
+                nxt.pop()
+                if taxes:
+                    taxes.pop()
+                continue
+            nxt[-1] = j + 1
+            w, t = out_dst[j], out_tax[j]
+            if w == start:
+                if len(path) >= min_length:
+                    cycles.append(([int(nodes[p]) for p in path], taxes + [t]))
+                    if len(cycles) >= limit:
+                        return cycles, True
+            elif w in dist and w not in on_path and len(path) + dist[w] <= max_length:
+                path.append(w)
+                taxes.append(t)
+                nxt.append(out_ptr[w])
+                on_path.add(w)
+    return cycles, False
+
+
+def _task_cycles(task: List[Tuple[int, int, int]], max_length: int, min_length: int, deadline: float,
+                 limit: int) -> Tuple[List[Tuple[List[int], List[float]]], int]:
+    found, truncated = [], 0
+    for ci, offset, stride in task:
+        cycles, cut = _component_cycles(ci, offset, stride, max_length, min_length, deadline, limit)
+        found.extend(cycles)
+        truncated += cut
+    return found, truncated
+
+
+def _components(n: int, src: np.ndarray, dst: np.ndarray, tax: np.ndarray, min_length: int) -> List[Component]:
+    """Edges grouped by weakly connected component, largest first, skipping ones too small for a cycle.
+
+    Edge endpoints are renumbered to positions in the component's node list.
+    """
+    parent = wcc(n, src, dst)
+    present = np.zeros(n, dtype=bool)
+    present[src] = True
+    present[dst] = True
+    nodes = np.flatnonzero(present)
+    nodes = nodes[np.argsort(parent[nodes], kind="stable")]
+    node_bounds = np.flatnonzero(np.concatenate(([True], parent[nodes][1:] != parent[nodes][:-1], [True])))
+    local = np.zeros(n, dtype=np.int64)
+    local[nodes] = np.arange(len(nodes)) - np.repeat(node_bounds[:-1], np.diff(node_bounds))
+
+    order = np.argsort(parent[src], kind="stable")
+    src, dst, tax = src[order], dst[order], tax[order]
+    edge_bounds = np.searchsorted(parent[src], parent[nodes[node_bounds[:-1]]])
+    edge_bounds = np.append(edge_bounds, len(src))
+    components = []
+    for ci in range(len(node_bounds) - 1):
+        a, b = edge_bounds[ci], edge_bounds[ci + 1]
+        if node_bounds[ci + 1] - node_bounds[ci] >= min_length:
+            components.append((nodes[node_bounds[ci]:node_bounds[ci + 1]], local[src[a:b]], local[dst[a:b]], tax[a:b]))
+    components.sort(key=lambda c: len(c[1]), reverse=True)
+    return components
+
+
+def _tasks(components: List[Component], task_edges: int, workers: int) -> List[List[Tuple[int, int, int]]]:
+    """(component, offset, stride) work items grouped into tasks of about `task_edges` edges.
+
+    A component larger than that is split across up to four tasks per worker
+    by interleaved start nodes, so low-numbered starts (the ones with the
+    most to search) spread evenly.
+    """
+    tasks, current, edges = [], [], 0
+    for ci, component in enumerate(components):
+        size = len(component[1])
+        if size >= task_edges:
+            stride = max(1, min(-(-size // task_edges), 4 * workers))
+            tasks.extend([[(ci, offset, stride)] for offset in range(stride)])
+            continue
+        current.append((ci, 0, 1))
+        edges += size
+        if edges >= task_edges:
+            tasks.append(current)
+            current, edges = [], 0
+    if current:
+        tasks.append(current)
+    return tasks
+
+
+def detect(n: int, src: np.ndarray, dst: np.ndarray, tax: np.ndarray, max_length: int = MAX_LENGTH,
+           min_length: int = MIN_LENGTH, max_degree: int = MAX_DEGREE, time_budget_s: float = TIME_BUDGET_S,
+           workers: int = WORKERS, limit: int = MAX_PER_TASK) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """Directed cycles up to `max_length` hops, ranked by tax flowing around the loop.
+
+    Returns (cycles, stats); each cycle has members (node indices in trade
+    order), length, total_tax (sum over its edges) and min_edge_tax (the most
+    that can have gone all the way round). Work stops at the time budget and
+    stats count the search tasks left truncated.
+    """
+    deadline = time.time() + time_budget_s
+    keep, hubs = prune(n, src, dst, max_degree)
+    components = _components(n, src[keep], dst[keep], tax[keep], min_length)
+    tasks = _tasks(components, TASK_EDGES, workers)
+    args = (max_length, min_length, deadline, limit)
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(components,)) as pool:
+            results = list(pool.map(_task_cycles, tasks, *([a] * len(tasks) for a in args)))
+    else:
+        _init_worker(components)
+        results = [_task_cycles(task, *args) for task in tasks]
+        _init_worker([])
+
+    cycles = []
+    for found, _ in results:
+        for members, taxes in found:
+            cycles.append({
+                "members": [int(m) for m in members],
+                "length": len(members),
+                "total_tax": float(sum(taxes)),
+                "min_edge_tax": float(min(taxes)),
+            })
+    cycles.sort(key=lambda c: (-c["total_tax"], c["members"]))
+    stats = {
+        "edges": int(len(src)),
+        "candidate_edges": int(keep.sum()),
+        "hubs_pruned": hubs,
+        "components": len(components),
+        "truncated": sum(t for _, t in results),
+    }
+    return cycles, stats
+
+
+def _store(db, gstins: List[str], cycles: List[Dict[str, Any]], summary: Dict[str, Any]):
+    run_id = db[CAROUSEL_RUNS].insert_one(dict(summary)).inserted_id
+    coll = db[CAROUSELS]
+    coll.create_index("edges")
+    coll.create_index("rank")
+    coll.create_index("members")
+    for start in range(0, len(cycles), WRITE_CHUNK):
+        docs = []
+        for rank, cycle in enumerate(cycles[start:start + WRITE_CHUNK], start=start + 1):
+            members = [gstins[m] for m in cycle["members"]]
+            loop = members + members[:1]
+            docs.append({
+                **cycle,
+                "run_id": run_id,
+                "rank": rank,
+                "members": members,
+                "edges": [f"{a}>{b}" for a, b in zip(loop, loop[1:])],
+            })
+        coll.insert_many(docs)
+    # Readers only look at the latest run
+    coll.delete_many({"run_id": {"$ne": run_id}})
+
+
+def run(driver=None, max_length: int = MAX_LENGTH, time_budget_s: float = TIME_BUDGET_S) -> Dict[str, Any]:
+    """Find SELLS_TO carousels up to `max_length` hops and store them ranked in Mongo `carousels`."""
+    own_driver = driver is None
+    if own_driver:
+        driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+    timings: Dict[str, float] = {}
+    started = time.perf_counter()
+    try:
+        with driver.session(database=DB) as session:
+            gstins, src, dst, tax = load_edges(session)
+    finally:
+        if own_driver:
+            driver.close()
+    timings["export"] = time.perf_counter() - started
+    t0 = time.perf_counter()
+    cycles, stats = detect(len(gstins), src, dst, tax, max_length=max_length, time_budget_s=time_budget_s)
+    timings["detect"] = time.perf_counter() - t0
+    summary = {
+        "timestamp": datetime.utcnow(),
+        "max_length": max_length,
+        "taxpayers": len(gstins),
+        "carousels": len(cycles),
+        **stats,
+    }
+    t0 = time.perf_counter()
+    _store(MongoClient(MONGO_URI)[MONGO_DB], gstins, cycles, summary)
+    timings["store"] = time.perf_counter() - t0
+    summary["timings"] = {k: round(v, 3) for k, v in timings.items()}
+    if stats["truncated"]:
+        logger.warning(f"Cycle detection hit its {time_budget_s}s budget or per-component cap in {stats['truncated']} search tasks")
+    logger.info(f"Cycle detection complete: {summary}")
+    return summary
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,208 @@
+import os
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+from neo4j import GraphDatabase
+from pymongo import MongoClient
+from loguru import logger
+
+from . import csr_engine, run_gds
+
+NEO4J_URI = os.getenv("NEO4J_URI", "bolt://localhost:7687")
+NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
+NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "neo4j")
+DB = os.getenv("NEO4J_DB", "neo4j")
+
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
+MONGO_DB = os.getenv("MONGO_DB", "gstkg")
+
+# Above this share of taxpayers in affected components a full recompute is cheaper.
+MAX_AFFECTED_FRACTION = float(os.getenv("GDS_INCREMENTAL_MAX_FRACTION", "0.25"))
+# Look back past the previous watermark so edges from transactions that were
+# still open when it was taken are not missed; re-reading them is harmless.
+WATERMARK_OVERLAP_MS = int(os.getenv("GDS_WATERMARK_OVERLAP_MS", str(15 * 60 * 1000)))
+
+NEW_EDGES_QUERY = """
+MATCH (a:Taxpayer)-[r:SELLS_TO]->(b:Taxpayer)
+WHERE r.created_at > $since
+RETURN a.gstin AS src, a.component_id AS src_component, b.gstin AS dst, b.component_id AS dst_component
+"""
+NEW_TAXPAYERS_QUERY = """
+MATCH (t:Taxpayer)
+WHERE t.created_at > $since AND t.component_id IS NULL
+RETURN t.gstin AS gstin
+"""
+AFFECTED_COUNT_QUERY = """
+UNWIND $components AS c
+MATCH (t:Taxpayer {component_id: c})
+RETURN count(t) AS affected
+"""
+SUBGRAPH_NODES_QUERY = """
+UNWIND $components AS c
+MATCH (t:Taxpayer {component_id: c})
+RETURN t.gstin AS gstin, t.pagerank_score AS pagerank_score, t.cluster_id AS cluster_id, t.component_id AS component_id
+UNION
+UNWIND $gstins AS g
+MATCH (t:Taxpayer {gstin: g})
+RETURN t.gstin AS gstin, t.pagerank_score AS pagerank_score, t.cluster_id AS cluster_id, t.component_id AS component_id
+"""
+SUBGRAPH_EDGES_QUERY = """
+UNWIND $components AS c
+MATCH (a:Taxpayer {component_id: c})-[:SELLS_TO]->(b:Taxpayer)
+RETURN a.gstin AS src, b.gstin AS dst
+UNION
+UNWIND $gstins AS g
+MATCH (a:Taxpayer {gstin: g})-[:SELLS_TO]->(b:Taxpayer)
+RETURN a.gstin AS src, b.gstin AS dst
+"""
+MAX_ID_QUERY = "MATCH (t:Taxpayer) WHERE t.{prop} IS NOT NULL RETURN t.{prop} AS v ORDER BY v DESC LIMIT 1"
+
+
+def _changes(session, since: int) -> Tuple[List[int], List[str], int]:
+    """Old component ids touched by new edges, and new taxpayers without a component."""
+    components, gstins, edges = set(), set(), 0
+    for rec in session.run(NEW_EDGES_QUERY, since=since):
+        edges += 1
+        for side in ("src", "dst"):
+            if rec[f"{side}_component"] is None:
+                gstins.add(rec[side])
+            else:
+                components.add(rec[f"{side}_component"])
+    for rec in session.run(NEW_TAXPAYERS_QUERY, since=since):
+        gstins.add(rec["gstin"])
+    return sorted(components), sorted(gstins), edges
+
+
+def _max_id(session, prop: str) -> int:
+    rec = session.run(MAX_ID_QUERY.format(prop=prop)).single()
+    return int(rec["v"]) if rec else -1
+
+
+def _load_subgraph(session, components: List[int], gstins: List[str]):
+    nodes = session.run(SUBGRAPH_NODES_QUERY, components=components, gstins=gstins).data()
+    index = {n["gstin"]: i for i, n in enumerate(nodes)}
+    src, dst = [], []
+    for rec in session.run(SUBGRAPH_EDGES_QUERY, components=components, gstins=gstins):
+        s, d = index.get(rec["src"]), index.get(rec["dst"])
+        if s is not None and d is not None:
+            src.append(s)
+            dst.append(d)
+    g = csr_engine.CSRGraph(len(nodes), np.array(src, dtype=np.int64), np.array(dst, dtype=np.int64))
+    return nodes, g
+
+
+def _stable_ids(groups: np.ndarray, previous: List[Optional[int]], next_id: int) -> np.ndarray:
+    """Map dense group labels back to stored ids.
+
+    A group keeps the most common previous id among its members unless a
+    larger group already claimed it; otherwise it gets a fresh id.
+    """
+    members: Dict[int, List[int]] = {}
+    for node, group in enumerate(groups.tolist()):
+        members.setdefault(group, []).append(node)
+    assigned: Dict[int, int] = {}
+    taken = set()
+    for group in sorted(members, key=lambda grp: -len(members[grp])):
+        votes = Counter(previous[n] for n in members[group] if previous[n] is not None)
+        choice = next((pid for pid, _ in votes.most_common() if pid not in taken), None)
+        if choice is None:
+            next_id += 1
+            choice = next_id
+        taken.add(choice)
+        assigned[group] = choice
+    return np.array([assigned[grp] for grp in groups.tolist()], dtype=np.int64)
+
+
+def _incremental(session, components: List[int], gstins: List[str]) -> Dict[str, Any]:
+    timings: Dict[str, float] = {}
+    t0 = time.perf_counter()
+    nodes, g = _load_subgraph(session, components, gstins)
+    timings["export"] = time.perf_counter() - t0
+    logger.info(f"Loaded affected subgraph: {g.n} taxpayers, {g.edges} edges from {len(components)} components")
+
+    # Components are closed under SELLS_TO, so PageRank, degree and WCC over
+    # their union are exact; only community detection is re-seeded locally.
+    t0 = time.perf_counter()
+    stored_pr = np.array([n["pagerank_score"] if n["pagerank_score"] is not None else 1.0 - csr_engine.DAMPING for n in nodes])
+    pr, pr_iters = csr_engine.pagerank(g, init=stored_pr)
+    timings["pagerank"] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    deg = csr_engine.degree(g)
+    timings["degree"] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    roots = csr_engine.wcc(g.n, g.src, g.dst)
+    comp_ids = _stable_ids(roots, [n["component_id"] for n in nodes], _max_id(session, "component_id"))
+    timings["wcc"] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    max_cluster = _max_id(session, "cluster_id")
+    seed = np.array([n["cluster_id"] if n["cluster_id"] is not None else max_cluster + 1 + i for i, n in enumerate(nodes)], dtype=np.int64)
+    groups, lpa_iters = csr_engine.label_propagation(g, init=seed)
+    cluster_ids = _stable_ids(groups, [n["cluster_id"] for n in nodes], max_cluster)
+    timings["label_propagation"] = time.perf_counter() - t0
+    logger.info(f"Warm-started PageRank converged in {pr_iters} iterations, label propagation in {lpa_iters}")
+
+    t0 = time.perf_counter()
+    csr_engine.write_back(session, [n["gstin"] for n in nodes], {
+        "pagerank_score": pr,
+        "degree_centrality": deg,
+        "cluster_id": cluster_ids,
+        "component_id": comp_ids,
+    }, mark_dirty=True)
+    timings["write"] = time.perf_counter() - t0
+    return {
+        "taxpayers": g.n,
+        "edges": g.edges,
+        "pagerank_iterations": pr_iters,
+        "timings": {k: round(v, 3) for k, v in timings.items()},
+    }
+
+
+def run(driver=None, full: bool = False, max_fraction: float = MAX_AFFECTED_FRACTION) -> Dict[str, Any]:
+    """Update analytics for taxpayers and SELLS_TO edges added since the last run.
+
+    Falls back to run_gds.run() when there is no previous run, when `full`
+    is set, or when the affected components exceed `max_fraction` of the graph.
+    """
+    own_driver = driver is None
+    if own_driver:
+        driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+    runs = MongoClient(MONGO_URI)[MONGO_DB]["analytics_runs"]
+    started = time.perf_counter()
+    try:
+        with driver.session(database=DB) as session:
+            watermark = session.run("RETURN timestamp() AS now").single()["now"]
+            last = runs.find_one(sort=[("watermark", -1)])
+            summary: Dict[str, Any] = {"mode": "full"}
+            if last and not full:
+                since = last["watermark"] - WATERMARK_OVERLAP_MS
+                components, gstins, edges = _changes(session, since)
+                logger.info(f"{edges} new SELLS_TO edges touching {len(components)} components, {len(gstins)} new taxpayers")
+                if not components and not gstins:
+                    summary = {"mode": "incremental", "taxpayers": 0, "edges": 0}
+                else:
+                    affected = session.run(AFFECTED_COUNT_QUERY, components=components).single()["affected"] + len(gstins)
+                    total = session.run("MATCH (t:Taxpayer) RETURN count(t) AS c").single()["c"]
+                    if total and affected / total > max_fraction:
+                        logger.info(f"{affected} of {total} taxpayers affected; falling back to a full recompute")
+                    else:
+                        summary = {"mode": "incremental", "components": len(components), "new_taxpayers": len(gstins),
+                                   "new_edges": edges, **_incremental(session, components, gstins)}
+        if summary["mode"] == "full":
+            summary.update(run_gds.run(driver))
+    finally:
+        if own_driver:
+            driver.close()
+    summary["elapsed_s"] = round(time.perf_counter() - started, 3)
+    runs.insert_one({"timestamp": datetime.utcnow(), "watermark": watermark, **summary})
+    logger.info(f"Analytics run complete: {summary}")
+    return summary
+
+
+if __name__ == "__main__":
+    run()
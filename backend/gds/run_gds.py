@@ -1,104 +1,130 @@
 import os
+import time
+from typing import Dict, Any, List
 from neo4j import GraphDatabase
 from loguru import logger
 
+from . import csr_engine
+
 NEO4J_URI = os.getenv("NEO4J_URI", "bolt://localhost:7687")
 NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
 NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "neo4j")
 DB = os.getenv("NEO4J_DB", "neo4j")
 
 GRAPH_NAME = "taxpayerGraph"
+# "gds", "csr" (in-process, no plugin needed) or "auto" (GDS when installed)
+ENGINE = os.getenv("GDS_ENGINE", "auto")
 
+# (log name, mutate procedure, Taxpayer property). Each result is mutated into
+# the in-memory projection and all of them are written back in one pass.
+ALGORITHMS = [
+    ("PageRank", "gds.pageRank.mutate", "pagerank_score"),
+    ("Degree Centrality", "gds.degree.mutate", "degree_centrality"),
+    ("Louvain clustering", "gds.louvain.mutate", "cluster_id"),
+    ("Weakly Connected Components", "gds.wcc.mutate", "component_id"),
+]
 
-def run():
-    driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
-    with driver.session(database=DB) as session:
-        logger.info("Dropping existing projection if exists")
-        session.run("CALL gds.graph.drop($name, false)", name=GRAPH_NAME)
-
-        logger.info("Projecting taxpayer graph with SELL_TO")
-        session.run(
-            """
-            CALL gds.graph.project(
-                $name,
-                'Taxpayer',
-                {
-                    SELL_TO: {type: 'SELLS_TO', orientation: 'NATURAL'}
-                },
-                {
-                    nodeProperties: ['risk_score', 'compliance_score']
-                }
-            )
-            """,
-            name=GRAPH_NAME,
-        )
 
-        logger.info("Running PageRank")
-        result = session.run(
-            """
-            CALL gds.pageRank.stream($name)
-            YIELD nodeId, score
-            RETURN gds.util.asNode(nodeId).gstin AS gstin, score
-            """
-            ,
-            name=GRAPH_NAME,
-        )
-        for record in result:
-            session.run(
-                "MATCH (t:Taxpayer {gstin: $gstin}) SET t.pagerank_score = $score",
-                gstin=record["gstin"],
-                score=record["score"],
-            )
-
-        logger.info("Running Degree Centrality")
-        result = session.run(
-            """
-            CALL gds.degree.stream($name)
-            YIELD nodeId, score
-            RETURN gds.util.asNode(nodeId).gstin AS gstin, score
-            """,
-            name=GRAPH_NAME,
-        )
-        for record in result:
-            session.run(
-                "MATCH (t:Taxpayer {gstin: $gstin}) SET t.degree_centrality = $score",
-                gstin=record["gstin"],
-                score=record["score"],
-            )
-
-        logger.info("Running Louvain clustering")
-        result = session.run(
-            """
-            CALL gds.louvain.stream($name)
-            YIELD nodeId, communityId
-            RETURN gds.util.asNode(nodeId).gstin AS gstin, communityId
-            """,
-            name=GRAPH_NAME,
-        )
-        for record in result:
-            session.run(
-                "MATCH (t:Taxpayer {gstin: $gstin}) SET t.cluster_id = $cluster",
-                gstin=record["gstin"],
-                cluster=int(record["communityId"]),
-            )
-
-        logger.info("Running Weakly Connected Components")
-        result = session.run(
-            """
-            CALL gds.wcc.stream($name)
-            YIELD nodeId, componentId
-            RETURN gds.util.asNode(nodeId).gstin AS gstin, componentId
-            """,
-            name=GRAPH_NAME,
+def _project(session) -> Dict[str, Any]:
+    logger.info("Dropping existing projection if exists")
+    session.run("CALL gds.graph.drop($name, false)", name=GRAPH_NAME).consume()
+
+    logger.info("Projecting taxpayer graph with SELL_TO")
+    rec = session.run(
+        """
+        CALL gds.graph.project(
+            $name,
+            'Taxpayer',
+            {
+                SELL_TO: {type: 'SELLS_TO', orientation: 'NATURAL'}
+            },
+            {
+                nodeProperties: ['risk_score', 'compliance_score']
+            }
         )
-        for record in result:
-            session.run(
-                "MATCH (t:Taxpayer {gstin: $gstin}) SET t.component_id = $component",
-                gstin=record["gstin"],
-                component=int(record["componentId"]),
-            )
-
-        logger.info("GDS computations completed")
+        YIELD nodeCount, relationshipCount, projectMillis
+        RETURN nodeCount, relationshipCount, projectMillis
+        """,
+        name=GRAPH_NAME,
+    ).single()
+    logger.info(f"Projected {rec['nodeCount']} taxpayers and {rec['relationshipCount']} SELLS_TO edges in {rec['projectMillis']} ms")
+    return dict(rec)
+
+
+def _mutate(session, label: str, procedure: str, prop: str) -> Dict[str, Any]:
+    logger.info(f"Running {label}")
+    started = time.perf_counter()
+    rec = session.run(
+        f"""
+        CALL {procedure}($name, {{mutateProperty: $prop}})
+        YIELD nodePropertiesWritten, computeMillis, mutateMillis
+        RETURN nodePropertiesWritten, computeMillis, mutateMillis
+        """,
+        name=GRAPH_NAME,
+        prop=prop,
+    ).single()
+    stats = {
+        "algorithm": label,
+        "property": prop,
+        "nodes": rec["nodePropertiesWritten"],
+        "compute_ms": rec["computeMillis"],
+        "mutate_ms": rec["mutateMillis"],
+        "elapsed_s": round(time.perf_counter() - started, 3),
+    }
+    logger.info(f"{label}: {stats['nodes']} nodes, compute {stats['compute_ms']} ms, mutate {stats['mutate_ms']} ms")
+    return stats
+
+
+def _write_back(session, props: List[str]) -> Dict[str, Any]:
+    logger.info(f"Writing {', '.join(props)} back to Taxpayer nodes")
+    rec = session.run(
+        """
+        CALL gds.graph.nodeProperties.write($name, $props)
+        YIELD propertiesWritten, writeMillis
+        RETURN propertiesWritten, writeMillis
+        """,
+        name=GRAPH_NAME,
+        props=props,
+    ).single()
+    logger.info(f"Wrote {rec['propertiesWritten']} properties in {rec['writeMillis']} ms")
+    return {"properties_written": rec["propertiesWritten"], "write_ms": rec["writeMillis"]}
+
+
+def gds_available(session) -> bool:
+    try:
+        session.run("RETURN gds.version() AS version").consume()
+        return True
+    except Exception:
+        return False
+
+
+def run(driver=None, engine: str = ENGINE) -> Dict[str, Any]:
+    own_driver = driver is None
+    if own_driver:
+        driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+    started = time.perf_counter()
+    try:
+        with driver.session(database=DB) as session:
+            if engine == "csr" or (engine == "auto" and not gds_available(session)):
+                logger.info("Using the in-process CSR engine")
+                return csr_engine.run(driver)
+            projection = _project(session)
+            algorithms = [_mutate(session, label, proc, prop) for label, proc, prop in ALGORITHMS]
+            write = _write_back(session, [prop for _, _, prop in ALGORITHMS])
+            session.run("CALL gds.graph.drop($name, false)", name=GRAPH_NAME).consume()
+    finally:
+        if own_driver:
+            driver.close()
+    summary = {
+        "engine": "gds",
+        "taxpayers": projection["nodeCount"],
+        "edges": projection["relationshipCount"],
+        "algorithms": algorithms,
+        "write": write,
+        "elapsed_s": round(time.perf_counter() - started, 3),
+    }
+    logger.info(f"GDS computations completed in {summary['elapsed_s']}s")
+    return summary
 
 
 if __name__ == "__main__":
@@ -0,0 +1,90 @@
+import os
+import time
+from typing import Dict, Any
+
+from neo4j import GraphDatabase
+from pymongo import MongoClient
+from loguru import logger
+
+from pipeline.state import aggregates_built, set_aggregates_built
+
+NEO4J_URI = os.getenv("NEO4J_URI", "bolt://localhost:7687")
+NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
+NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "neo4j")
+DB = os.getenv("NEO4J_DB", "neo4j")
+
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
+MONGO_DB = os.getenv("MONGO_DB", "gstkg")
+
+BATCH_SIZE = int(os.getenv("GST_AGGREGATE_BATCH_SIZE", "10000"))
+
+# Recompute the aggregates that ingest (invoice_count, total_tax, claimed_tax,
+# return_count) and reconciliation (mismatch_count) otherwise maintain
+# incrementally. Needed once for a graph loaded before ingest kept them (ingest
+# and risk scoring run it themselves then, see `ensure`), after a bulk import and
+# whenever the stored values are suspected to have drifted.
+REBUILD_SELLS_TO = """
+MATCH (s:Taxpayer)-[rel:SELLS_TO]->(b:Taxpayer)
+CALL {
+    WITH s, rel, b
+    OPTIONAL MATCH (s)-[:ISSUED]->(i:Invoice)-[:CLAIMED_BY]->(b)
+    WITH rel, count(i) AS invoices, sum(COALESCE(i.tax_amount, 0.0)) AS tax,
+         sum(COALESCE(i.claimed_tax_amount, 0.0)) AS claimed,
+         sum(CASE WHEN i.mismatch_flag THEN 1 ELSE 0 END) AS mismatches
+    SET rel.invoice_count = invoices, rel.total_tax = tax, rel.claimed_tax = claimed, rel.mismatch_count = mismatches
+} IN TRANSACTIONS OF $batch ROWS
+"""
+REBUILD_TAXPAYERS = """
+MATCH (t:Taxpayer)
+CALL {
+    WITH t
+    OPTIONAL MATCH (t)-[:ISSUED]->(:Invoice)-[:REPORTED_IN]->(r:Return)
+    WITH t, count(DISTINCT r) AS returns
+    OPTIONAL MATCH (t)-[:ISSUED]->(i:Invoice)
+    WITH t, returns, count(i) AS invoices, sum(COALESCE(i.tax_amount, 0.0)) AS tax,
+         sum(COALESCE(i.claimed_tax_amount, 0.0)) AS claimed,
+         sum(CASE WHEN i.mismatch_flag THEN 1 ELSE 0 END) AS mismatches
+    SET t.invoice_count = invoices, t.total_tax = tax, t.claimed_tax = claimed,
+        t.mismatch_count = mismatches, t.return_count = returns
+    REMOVE t.reported_count
+} IN TRANSACTIONS OF $batch ROWS
+"""
+
+
+def rebuild(driver=None, batch_size: int = BATCH_SIZE, db=None) -> Dict[str, Any]:
+    """Recompute SELLS_TO and Taxpayer aggregates from the invoices and record them as built."""
+    own_driver = driver is None
+    if own_driver:
+        driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+    timings: Dict[str, float] = {}
+    try:
+        with driver.session(database=DB) as session:
+            # CALL { } IN TRANSACTIONS needs an auto-commit transaction
+            for name, query in (("sells_to", REBUILD_SELLS_TO), ("taxpayers", REBUILD_TAXPAYERS)):
+                started = time.perf_counter()
+                session.run(query, batch=batch_size).consume()
+                timings[name] = round(time.perf_counter() - started, 3)
+                logger.info(f"Rebuilt {name} aggregates in {timings[name]}s")
+    finally:
+        if own_driver:
+            driver.close()
+    set_aggregates_built(MongoClient(MONGO_URI)[MONGO_DB] if db is None else db)
+    return {"timings": timings}
+
+
+def ensure(driver, db) -> bool:
+    """Rebuild the aggregates if they were never built for this graph; True if it did.
+
+    Risk scoring reads mismatch_count from them, so a graph loaded before
+    ingest maintained them would otherwise score every taxpayer's mismatch
+    term as zero.
+    """
+    if aggregates_built(db):
+        return False
+    logger.warning("Graph aggregates were never built for this graph; rebuilding them now")
+    rebuild(driver, db=db)
+    return True
+
+
+if __name__ == "__main__":
+    rebuild()
@@ -0,0 +1,190 @@
+import csv
+import heapq
+import os
+import pickle
+import tempfile
+import time
+from typing import Dict, Any, Callable, Iterator, List, Optional, Tuple
+
+from pymongo import MongoClient
+from loguru import logger
+
+from pipeline.state import set_aggregates_built
+from .ingest import DATA_PATH, MONGO_DB, MONGO_URI, _iter_rows, _prepare_row
+
+
+IMPORT_DIR = os.getenv("GST_IMPORT_DIR", os.path.join(os.path.dirname(__file__), "../import"))
+SPILL_THRESHOLD = int(os.getenv("GST_IMPORT_SPILL_THRESHOLD", "200000"))
+
+# file name -> (label or relationship type, header)
+NODE_FILES = {
+    "taxpayers.csv": ("Taxpayer", ["gstin:ID(Taxpayer)", "name", "state", "compliance_score:float", "risk_score:float"]),
+    "invoices.csv": ("Invoice", ["invoice_id:ID(Invoice)", "tax_amount:float", "claimed_tax_amount:float", "invoice_date:date", "mismatch_flag:boolean", "risk_score:float"]),
+    "returns.csv": ("Return", ["return_id:ID(Return)", "filing_date:date", "status"]),
+}
+RELATIONSHIP_FILES = {
+    "issued.csv": ("ISSUED", [":START_ID(Taxpayer)", ":END_ID(Invoice)"]),
+    "claimed_by.csv": ("CLAIMED_BY", [":START_ID(Invoice)", ":END_ID(Taxpayer)"]),
+    "reported_in.csv": ("REPORTED_IN", [":START_ID(Invoice)", ":END_ID(Return)"]),
+    "sells_to.csv": ("SELLS_TO", [":START_ID(Taxpayer)", ":END_ID(Taxpayer)"]),
+}
+
+
+def _coalesce(older: Optional[List[Any]], newer: Optional[List[Any]]) -> Optional[List[Any]]:
+    """Later non-empty values win, matching the ON MATCH SET COALESCE(...) in ingest."""
+    if older is None or newer is None:
+        return newer if older is None else older
+    return [n if n is not None else o for o, n in zip(older, newer)]
+
+
+class SpillingDeduper:
+    """Deduplicate (key, record) pairs with at most `threshold` keys held in memory.
+
+    When the buffer fills it is sorted and written to a temporary run file; the
+    runs are k-way merged on output, combining records that share a key with
+    `combine` in insertion order.
+    """
+
+    def __init__(self, name: str, workdir: str, combine: Callable = _coalesce, threshold: int = SPILL_THRESHOLD):
+        self.name = name
+        self.workdir = workdir
+        self.combine = combine
+        self.threshold = threshold
+        self.buffer: Dict[Any, Any] = {}
+        self.runs: List[str] = []
+
+    def add(self, key: Any, record: Any = None):
+        if key in self.buffer:
+            self.buffer[key] = self.combine(self.buffer[key], record)
+        else:
+            self.buffer[key] = record
+            if len(self.buffer) >= self.threshold:
+                self._spill()
+
+    def _spill(self):
+        fd, path = tempfile.mkstemp(prefix=f"{self.name}-", suffix=".run", dir=self.workdir)
+        with os.fdopen(fd, "wb") as f:
+            for key in sorted(self.buffer):
+                pickle.dump((key, self.buffer[key]), f, protocol=pickle.HIGHEST_PROTOCOL)
+        self.runs.append(path)
+        self.buffer = {}
+
+    @staticmethod
+    def _read_run(path: str, order: int) -> Iterator[Tuple[Any, int, Any]]:
+        with open(path, "rb") as f:
+            while True:
+                try:
+                    key, record = pickle.load(f)
+                except EOFError:
+                    return
+                yield key, order, record
+
+    def items(self) -> Iterator[Tuple[Any, Any]]:
+        if not self.runs:
+            for key in sorted(self.buffer):
+                yield key, self.buffer[key]
+            return
+        if self.buffer:
+            self._spill()
+        # equal keys come out in run order, so combine sees older records first
+        merged = heapq.merge(*(self._read_run(p, n) for n, p in enumerate(self.runs)), key=lambda item: (item[0], item[1]))
+        current_key, current = None, None
+        first = True
+        for key, _, record in merged:
+            if not first and key == current_key:
+                current = self.combine(current, record)
+                continue
+            if not first:
+                yield current_key, current
+            current_key, current, first = key, record, False
+        if not first:
+            yield current_key, current
+        for path in self.runs:
+            os.remove(path)
+        self.runs = []
+
+
+def _csv_value(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return value
+
+
+def _write_file(path: str, header: List[str], rows: Iterator[List[Any]]) -> int:
+    count = 0
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        for row in rows:
+            writer.writerow([_csv_value(v) for v in row])
+            count += 1
+    return count
+
+
+def generate(path: str = DATA_PATH, out_dir: str = IMPORT_DIR, threshold: int = SPILL_THRESHOLD) -> Dict[str, Any]:
+    """Turn an ingest source into deduplicated node/relationship files for neo4j-admin import.
+
+    The source is read once; duplicates are folded with the same precedence as
+    the transactional MERGE path, spilling sorted runs to disk so memory stays
+    bounded by `threshold` keys per file.
+    """
+    started = time.perf_counter()
+    os.makedirs(out_dir, exist_ok=True)
+    logger.info(f"Generating bulk import files from {path} into {out_dir}")
+
+    with tempfile.TemporaryDirectory(dir=out_dir, prefix=".spill-") as workdir:
+        dedupers = {name: SpillingDeduper(name, workdir, threshold=threshold) for name in list(NODE_FILES) + list(RELATIONSHIP_FILES)}
+        rows_read = 0
+        for raw in _iter_rows(path):
+            row = _prepare_row(raw)
+            rows_read += 1
+            for side in ("seller", "buyer"):
+                dedupers["taxpayers.csv"].add(row[f"{side}_gstin"], [row[f"{side}_name"], row[f"{side}_state"]])
+            dedupers["invoices.csv"].add(row["invoice_id"], [row["tax_amount"], row["claimed_tax_amount"], row["invoice_date"]])
+            dedupers["issued.csv"].add((row["seller_gstin"], row["invoice_id"]))
+            dedupers["claimed_by.csv"].add((row["invoice_id"], row["buyer_gstin"]))
+            dedupers["sells_to.csv"].add((row["seller_gstin"], row["buyer_gstin"]))
+            if row["return_id"]:
+                dedupers["returns.csv"].add(row["return_id"], [row["filing_date"], row["status"]])
+                dedupers["reported_in.csv"].add((row["invoice_id"], row["return_id"]))
+        logger.info(f"Read {rows_read} rows in {time.perf_counter() - started:.2f}s")
+
+        counts: Dict[str, int] = {}
+        counts["taxpayers.csv"] = _write_file(
+            os.path.join(out_dir, "taxpayers.csv"), NODE_FILES["taxpayers.csv"][1],
+            ([gstin, name, state, 0.0, 0.0] for gstin, (name, state) in dedupers["taxpayers.csv"].items()),
+        )
+        counts["invoices.csv"] = _write_file(
+            os.path.join(out_dir, "invoices.csv"), NODE_FILES["invoices.csv"][1],
+            ([iid, tax, claimed, inv_date, False, 0.0] for iid, (tax, claimed, inv_date) in dedupers["invoices.csv"].items()),
+        )
+        counts["returns.csv"] = _write_file(
+            os.path.join(out_dir, "returns.csv"), NODE_FILES["returns.csv"][1],
+            ([rid, filing_date, status] for rid, (filing_date, status) in dedupers["returns.csv"].items()),
+        )
+        for name, (_, header) in RELATIONSHIP_FILES.items():
+            counts[name] = _write_file(os.path.join(out_dir, name), header, (list(key) for key, _ in dedupers[name].items()))
+
+    command = import_command(out_dir)
+    elapsed = time.perf_counter() - started
+    logger.info(f"Bulk import files written in {elapsed:.2f}s: {counts}")
+    logger.info(f"Load into an empty database with: {command}")
+    # The imported graph has no aggregates; the next ingest or risk run rebuilds them
+    set_aggregates_built(MongoClient(MONGO_URI)[MONGO_DB], False)
+    logger.info("Apply neo4j/schema.cypher once the database is started; aggregates are backfilled by the next ingest "
+                "or risk run, or at once with python -m ingest.aggregates")
+    return {"source": os.path.basename(path), "rows": rows_read, "files": counts, "elapsed_seconds": round(elapsed, 3), "command": command}
+
+
+def import_command(out_dir: str = IMPORT_DIR, database: str = os.getenv("NEO4J_DB", "neo4j")) -> str:
+    parts = ["neo4j-admin database import full"]
+    parts += [f"--nodes={label}={os.path.join(out_dir, name)}" for name, (label, _) in NODE_FILES.items()]
+    parts += [f"--relationships={rel}={os.path.join(out_dir, name)}" for name, (rel, _) in RELATIONSHIP_FILES.items()]
+    parts.append(database)
+    return " ".join(parts)
+
+
+if __name__ == "__main__":
+    generate()
@@ -0,0 +1,41 @@
+import hashlib
+import math
+
+
+class HyperLogLog:
+    """Fixed-size distinct counter (2**precision one-byte registers).
+
+    Standard error is about 1.04 / sqrt(2**precision), i.e. ~0.8% at the default
+    precision of 14, for 16 KiB of memory regardless of how many values are added.
+    """
+
+    def __init__(self, precision: int = 14):
+        if not 4 <= precision <= 18:
+            raise ValueError("precision must be between 4 and 18")
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = bytearray(self.m)
+        self._suffix_bits = 64 - precision
+        self._suffix_mask = (1 << self._suffix_bits) - 1
+
+    def add(self, value: str):
+        h = int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+        idx = h >> self._suffix_bits
+        rank = self._suffix_bits - (h & self._suffix_mask).bit_length() + 1
+        if rank > self.registers[idx]:
+            self.registers[idx] = rank
+
+    def __len__(self) -> int:
+        return self.count()
+
+    def count(self) -> int:
+        m = self.m
+        if m >= 128:
+            alpha = 0.7213 / (1 + 1.079 / m)
+        else:
+            alpha = {16: 0.673, 32: 0.697, 64: 0.709}[m]
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
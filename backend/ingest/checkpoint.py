@@ -0,0 +1,110 @@
+import hashlib
+import os
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+from pymongo import UpdateOne
+from loguru import logger
+
+
+FINGERPRINT_BLOCK = 1 << 20
+
+
+def fingerprint(path: str, limit: Optional[int] = None) -> str:
+    """sha256 of the file, or of its first `limit` bytes."""
+    digest = hashlib.sha256()
+    remaining = limit
+    with open(path, "rb") as f:
+        while remaining is None or remaining > 0:
+            block = f.read(FINGERPRINT_BLOCK if remaining is None else min(FINGERPRINT_BLOCK, remaining))
+            if not block:
+                break
+            digest.update(block)
+            if remaining is not None:
+                remaining -= len(block)
+    return digest.hexdigest()
+
+
+def row_hash(row: Dict[str, Any]) -> str:
+    payload = "\x1f".join("" if v is None else str(v) for v in row.values())
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+
+class IngestCheckpoint:
+    """Progress of one source file, kept in Mongo next to ingestion_audit.
+
+    ``ingestion_checkpoints`` holds one document per source (fingerprint, size,
+    rows committed so far, status); ``ingestion_row_hashes`` maps each
+    invoice_id to the hash of the row last written for it, so re-delivered
+    files only write rows whose content changed.
+    """
+
+    def __init__(self, mdb, path: str):
+        self.checkpoints = mdb["ingestion_checkpoints"]
+        self.row_hashes = mdb["ingestion_row_hashes"]
+        self.path = path
+        self.source = os.path.basename(path)
+        self.size = os.path.getsize(path)
+        self.fingerprint = fingerprint(path)
+        self.offset = 0
+        self.chunk = 0
+
+    def start_offset(self) -> Optional[int]:
+        """Rows that can be skipped without reading their hashes; None if the file is already fully ingested."""
+        previous = self.checkpoints.find_one({"_id": self.source})
+        if not previous:
+            return 0
+        if previous["fingerprint"] == self.fingerprint:
+            if previous.get("status") == "complete":
+                return None
+            logger.info(f"Resuming {self.source} after row {previous['offset']} (chunk {previous['chunk']})")
+            self.offset, self.chunk = previous["offset"], previous["chunk"]
+            return self.offset
+        if self.size > previous["size"] and fingerprint(self.path, previous["size"]) == previous["fingerprint"]:
+            # same bytes up to the previous size: the file was appended to
+            logger.info(f"{self.source} was appended to; continuing after row {previous['offset']}")
+            self.offset, self.chunk = previous["offset"], previous["chunk"]
+            return self.offset
+        logger.info(f"{self.source} changed since the last run; skipping unchanged rows by content hash")
+        return 0
+
+    def changed(self, rows: List[Dict[str, Any]], force: bool = False) -> Tuple[List[Dict[str, Any]], Dict[str, str]]:
+        """Rows whose content differs from what was last written, with their new hashes."""
+        hashes = {row["invoice_id"]: row_hash(row) for row in rows}
+        if force:
+            return rows, hashes
+        stored = {
+            doc["_id"]: doc["hash"]
+            for doc in self.row_hashes.find({"_id": {"$in": list(hashes)}}, {"hash": 1})
+        }
+        changed = [row for row in rows if stored.get(row["invoice_id"]) != hashes[row["invoice_id"]]]
+        return changed, {row["invoice_id"]: hashes[row["invoice_id"]] for row in changed}
+
+    def commit_hashes(self, hashes: Dict[str, str]):
+        if hashes:
+            self.row_hashes.bulk_write(
+                [UpdateOne({"_id": iid}, {"$set": {"hash": h, "source": self.source}}, upsert=True) for iid, h in hashes.items()],
+                ordered=False,
+            )
+
+    def advance(self, scanned: int):
+        self.offset += scanned
+        self.chunk += 1
+        self._save("running")
+
+    def complete(self):
+        self._save("complete")
+
+    def _save(self, status: str):
+        self.checkpoints.update_one(
+            {"_id": self.source},
+            {"$set": {
+                "fingerprint": self.fingerprint,
+                "size": self.size,
+                "offset": self.offset,
+                "chunk": self.chunk,
+                "status": status,
+                "updated_at": datetime.utcnow(),
+            }},
+            upsert=True,
+        )
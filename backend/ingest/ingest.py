@@ -1,127 +1,491 @@
 import csv
 import os
-from datetime import datetime
-from typing import Dict, Any
+import queue
+import resource
+import threading
+import time
+import zlib
+from datetime import date, datetime
+from typing import Dict, Any, Iterator, List, Optional
 
 from neo4j import GraphDatabase, Transaction
 from pymongo import MongoClient
 from loguru import logger
 
+from pipeline.state import bump_graph_version
+from schema.schema_manager import ensure_schema
+from . import aggregates
+from .cardinality import HyperLogLog
+from .checkpoint import IngestCheckpoint, row_hash
+
 
 NEO4J_URI = os.getenv("NEO4J_URI", "bolt://localhost:7687")
 NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
 NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "neo4j")
+NEO4J_DB = os.getenv("NEO4J_DB", "neo4j")
 
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
 MONGO_DB = os.getenv("MONGO_DB", "gstkg")
 
 DATA_PATH = os.getenv("GST_DATA_PATH", os.path.join(os.path.dirname(__file__), "../mock/mock_data.csv"))
+CHUNK_SIZE = int(os.getenv("GST_INGEST_CHUNK_SIZE", "5000"))
+WORKERS = int(os.getenv("GST_INGEST_WORKERS", "1"))
+INCREMENTAL = os.getenv("GST_INGEST_INCREMENTAL", "1") == "1"
+
+STAGES = ("taxpayers", "invoices", "returns")
+
+
+def _blank_to_none(value: Optional[str]) -> Optional[str]:
+    if value is None:
+        return None
+    value = value.strip()
+    return value or None
+
+
+def _prepare_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    claimed = _blank_to_none(row.get("claimed_tax_amount"))
+    return {
+        "seller_gstin": row["seller_gstin"],
+        "seller_name": _blank_to_none(row.get("seller_name")),
+        "seller_state": _blank_to_none(row.get("seller_state")),
+        "buyer_gstin": row["buyer_gstin"],
+        "buyer_name": _blank_to_none(row.get("buyer_name")),
+        "buyer_state": _blank_to_none(row.get("buyer_state")),
+        "invoice_id": row["invoice_id"],
+        "invoice_date": _blank_to_none(row.get("invoice_date")),
+        "tax_amount": float(row["tax_amount"]),
+        "claimed_tax_amount": float(claimed) if claimed else None,
+        "return_id": _blank_to_none(row.get("return_id")),
+        "filing_date": _blank_to_none(row.get("filing_date")),
+        "status": _blank_to_none(row.get("status")),
+    }
+
 
+def _taxpayer_records(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Distinct taxpayers in rows; later non-empty name/state win, as with ON MATCH."""
+    records: Dict[str, Dict[str, Any]] = {}
+    for row in rows:
+        for side in ("seller", "buyer"):
+            gstin = row[f"{side}_gstin"]
+            rec = records.setdefault(gstin, {"gstin": gstin, "name": None, "state": None})
+            rec["name"] = row[f"{side}_name"] or rec["name"]
+            rec["state"] = row[f"{side}_state"] or rec["state"]
+    return list(records.values())
 
-def _merge_taxpayer(tx: Transaction, row: Dict[str, Any]):
-    tx.run(
+
+def _merge_taxpayers(tx: Transaction, taxpayers: List[Dict[str, Any]]):
+    return tx.run(
         """
-        MERGE (s:Taxpayer {gstin: $seller_gstin})
-        ON CREATE SET s.name = $seller_name, s.state = $seller_state, s.compliance_score = 0.0, s.risk_score = 0.0
-        ON MATCH SET s.name = COALESCE($seller_name, s.name), s.state = COALESCE($seller_state, s.state)
-        MERGE (b:Taxpayer {gstin: $buyer_gstin})
-        ON CREATE SET b.name = $buyer_name, b.state = $buyer_state, b.compliance_score = 0.0, b.risk_score = 0.0
-        ON MATCH SET b.name = COALESCE($buyer_name, b.name), b.state = COALESCE($buyer_state, b.state)
-        MERGE (s)-[:SELLS_TO]->(b)
+        UNWIND $taxpayers AS tp
+        MERGE (t:Taxpayer {gstin: tp.gstin})
+        ON CREATE SET t.name = tp.name, t.state = tp.state, t.compliance_score = 0.0, t.risk_score = 0.0, t.created_at = timestamp(), t:RiskDirty
+        ON MATCH SET t.name = COALESCE(tp.name, t.name), t.state = COALESCE(tp.state, t.state)
         """,
-        seller_gstin=row["seller_gstin"],
-        seller_name=row.get("seller_name"),
-        seller_state=row.get("seller_state"),
-        buyer_gstin=row["buyer_gstin"],
-        buyer_name=row.get("buyer_name"),
-        buyer_state=row.get("buyer_state"),
-    )
+        taxpayers=taxpayers,
+    ).consume().counters
+
+
+def _invoice_records(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """One row per invoice_id; later non-empty values win, as with ON MATCH.
+
+    The aggregate deltas in _merge_invoices compare each row with the invoice
+    as it was before the statement, so an invoice may only appear once.
+    """
+    records: Dict[str, Dict[str, Any]] = {}
+    for row in rows:
+        rec = records.get(row["invoice_id"])
+        if rec is None:
+            records[row["invoice_id"]] = dict(row)
+        else:
+            rec.update({k: v for k, v in row.items() if v is not None})
+    return list(records.values())
+
+
+# Invoices already in the graph under another seller or buyer than a row gives
+REASSIGNED_QUERY = """
+UNWIND $rows AS row
+MATCH (s:Taxpayer)-[:ISSUED]->(i:Invoice {invoice_id: row.invoice_id})
+WHERE s.gstin <> row.seller_gstin OR NOT EXISTS { (i)-[:CLAIMED_BY]->(:Taxpayer {gstin: row.buyer_gstin}) }
+RETURN DISTINCT row.invoice_id AS invoice_id
+"""
+
 
+def _drop_reassigned(tx: Transaction, rows: List[Dict[str, Any]], result: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Rows except those that would move an existing invoice to another seller or buyer.
 
-def _merge_invoice(tx: Transaction, row: Dict[str, Any]):
-    tx.run(
+    The aggregate deltas in _merge_invoices assume an invoice keeps its
+    counterparties; merging a moved one would add a second SELLS_TO/CLAIMED_BY
+    edge that never gets the invoice's totals. Reassigning an invoice is not
+    supported: such rows are skipped and counted as rows_rejected.
+    """
+    pairs = {(r["invoice_id"], r["seller_gstin"], r["buyer_gstin"]) for r in rows}
+    moved = {rec["invoice_id"] for rec in tx.run(
+        REASSIGNED_QUERY, rows=[{"invoice_id": i, "seller_gstin": s, "buyer_gstin": b} for i, s, b in pairs],
+    )}
+    if not moved:
+        return rows
+    kept = [r for r in rows if r["invoice_id"] not in moved]
+    result["rows_rejected"] += len(rows) - len(kept)
+    logger.warning(f"Skipped {len(rows) - len(kept)} rows that change the seller or buyer of {len(moved)} existing invoices, e.g. {sorted(moved)[:5]}")
+    return kept
+
+
+def _merge_invoices(tx: Transaction, rows: List[Dict[str, Any]]):
+    """Merge invoices and fold their deltas into the SELLS_TO and seller aggregates.
+
+    invoice_count, total_tax and claimed_tax on SELLS_TO and on the seller
+    Taxpayer change by the difference between each invoice before and after
+    the merge, so re-ingesting an unchanged invoice leaves them as they were.
+    Rows must not move an invoice to new counterparties (see _drop_reassigned).
+    Written invoices are marked :RiskDirty for risk.incremental.
+    """
+    return tx.run(
         """
-        MATCH (s:Taxpayer {gstin: $seller_gstin})
-        MATCH (b:Taxpayer {gstin: $buyer_gstin})
-        MERGE (i:Invoice {invoice_id: $invoice_id})
-        ON CREATE SET i.tax_amount = $tax_amount, i.claimed_tax_amount = $claimed_tax_amount, i.invoice_date = date($invoice_date), i.mismatch_flag = false, i.risk_score = 0.0
-        ON MATCH SET i.tax_amount = COALESCE($tax_amount, i.tax_amount), i.claimed_tax_amount = COALESCE($claimed_tax_amount, i.claimed_tax_amount), i.invoice_date = COALESCE(date($invoice_date), i.invoice_date)
+        UNWIND $rows AS row
+        MATCH (s:Taxpayer {gstin: row.seller_gstin})
+        MATCH (b:Taxpayer {gstin: row.buyer_gstin})
+        OPTIONAL MATCH (old:Invoice {invoice_id: row.invoice_id})
+        WITH s, b, row, old IS NULL AS is_new,
+             COALESCE(old.tax_amount, 0.0) AS old_tax, COALESCE(old.claimed_tax_amount, 0.0) AS old_claimed
+        MERGE (i:Invoice {invoice_id: row.invoice_id})
+        ON CREATE SET i.tax_amount = row.tax_amount, i.claimed_tax_amount = row.claimed_tax_amount, i.invoice_date = date(row.invoice_date), i.mismatch_flag = false, i.risk_score = 0.0
+        ON MATCH SET i.tax_amount = COALESCE(row.tax_amount, i.tax_amount), i.claimed_tax_amount = COALESCE(row.claimed_tax_amount, i.claimed_tax_amount), i.invoice_date = COALESCE(date(row.invoice_date), i.invoice_date)
+        MERGE (s)-[rel:SELLS_TO]->(b)
+        ON CREATE SET rel.created_at = timestamp(), rel.invoice_count = 0, rel.total_tax = 0.0, rel.claimed_tax = 0.0, rel.mismatch_count = 0
         MERGE (s)-[:ISSUED]->(i)
         MERGE (i)-[:CLAIMED_BY]->(b)
+        SET i:RiskDirty
+        WITH s, rel,
+             sum(CASE WHEN is_new THEN 1 ELSE 0 END) AS new_invoices,
+             sum(COALESCE(i.tax_amount, 0.0) - old_tax) AS tax_delta,
+             sum(COALESCE(i.claimed_tax_amount, 0.0) - old_claimed) AS claimed_delta
+        SET rel.invoice_count = COALESCE(rel.invoice_count, 0) + new_invoices,
+            rel.total_tax = COALESCE(rel.total_tax, 0.0) + tax_delta,
+            rel.claimed_tax = COALESCE(rel.claimed_tax, 0.0) + claimed_delta
+        WITH s, sum(new_invoices) AS new_invoices, sum(tax_delta) AS tax_delta, sum(claimed_delta) AS claimed_delta
+        SET s.invoice_count = COALESCE(s.invoice_count, 0) + new_invoices,
+            s.total_tax = COALESCE(s.total_tax, 0.0) + tax_delta,
+            s.claimed_tax = COALESCE(s.claimed_tax, 0.0) + claimed_delta,
+            s.mismatch_count = COALESCE(s.mismatch_count, 0)
         """,
-        seller_gstin=row["seller_gstin"],
-        buyer_gstin=row["buyer_gstin"],
-        invoice_id=row["invoice_id"],
-        tax_amount=float(row["tax_amount"]),
-        claimed_tax_amount=float(row["claimed_tax_amount"]) if row.get("claimed_tax_amount") else None,
-        invoice_date=row["invoice_date"],
-    )
+        rows=_invoice_records(rows),
+    ).consume().counters
 
 
-def _merge_return(tx: Transaction, row: Dict[str, Any]):
-    if not row.get("return_id"):
-        return
-    tx.run(
+def _merge_returns(tx: Transaction, rows: List[Dict[str, Any]]):
+    """Merge returns and keep the seller's return_count: distinct returns its invoices are reported in.
+
+    Whether a return is new to the seller is read per (seller, return) before
+    any edge of the statement is merged.
+
+    A filed return can clear the invoice's mismatch flag and a DEFAULT status
+    feeds the seller's risk, so both are marked :RiskDirty.
+    """
+    links = {(r["invoice_id"], r["return_id"]): r for r in rows if r["return_id"]}
+    if not links:
+        return None
+    return tx.run(
         """
-        MERGE (r:Return {return_id: $return_id})
-        ON CREATE SET r.filing_date = date($filing_date), r.status = $status
-        ON MATCH SET r.filing_date = COALESCE(date($filing_date), r.filing_date), r.status = COALESCE($status, r.status)
-        WITH r
-        MATCH (i:Invoice {invoice_id: $invoice_id})
-        MERGE (i)-[:REPORTED_IN]->(r)
+        UNWIND $rows AS row
+        MERGE (r:Return {return_id: row.return_id})
+        ON CREATE SET r.filing_date = date(row.filing_date), r.status = row.status
+        ON MATCH SET r.filing_date = COALESCE(date(row.filing_date), r.filing_date), r.status = COALESCE(row.status, r.status)
+        WITH r, row
+        MATCH (s:Taxpayer)-[:ISSUED]->(i:Invoice {invoice_id: row.invoice_id})
+        WITH s, r, collect(i) AS invoices
+        WITH s, r, invoices, NOT EXISTS { (s)-[:ISSUED]->(:Invoice)-[:REPORTED_IN]->(r) } AS new_return
+        FOREACH (i IN invoices | MERGE (i)-[:REPORTED_IN]->(r) SET i:RiskDirty)
+        SET s:RiskDirty
+        WITH s, sum(CASE WHEN new_return THEN 1 ELSE 0 END) AS new_returns
+        SET s.return_count = COALESCE(s.return_count, 0) + new_returns
         """,
-        return_id=row["return_id"],
-        filing_date=row.get("filing_date"),
-        status=row.get("status"),
-        invoice_id=row["invoice_id"],
-    )
+        rows=list(links.values()),
+    ).consume().counters
+
+
+def _timed(stage: str, writer, tx: Transaction, rows, result: Dict[str, Any]):
+    started = time.perf_counter()
+    counters = writer(tx, rows)
+    result["timings"][stage] = time.perf_counter() - started
+    if counters is not None:
+        result["nodes_created"] += counters.nodes_created
+        result["relationships_created"] += counters.relationships_created
+
+
+def _write_chunk(tx: Transaction, rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Write one chunk in a single transaction; returns per-stage seconds and created counts."""
+    result = {"timings": {}, "nodes_created": 0, "relationships_created": 0, "rows_rejected": 0}
+    _timed("taxpayers", _merge_taxpayers, tx, _taxpayer_records(rows), result)
+    rows = _drop_reassigned(tx, rows, result)
+    _timed("invoices", _merge_invoices, tx, rows, result)
+    _timed("returns", _merge_returns, tx, rows, result)
+    return result
+
+
+def _partition(gstin: str, workers: int) -> int:
+    return zlib.crc32(gstin.encode()) % workers
+
+
+def _throughput(rows: int, timings: Dict[str, float], elapsed: float) -> Dict[str, Any]:
+    report = {stage: round(rows / secs, 1) if secs > 0 else None for stage, secs in timings.items()}
+    report["overall"] = round(rows / elapsed, 1) if elapsed > 0 else None
+    return report
+
 
+def _new_counters() -> Dict[str, Any]:
+    return {
+        "taxpayers": HyperLogLog(),
+        "invoices": HyperLogLog(),
+        "returns": HyperLogLog(),
+        "relationships": 0,
+        "rows_scanned": 0,
+        "rows_unchanged": 0,
+        "nodes_created": 0,
+        "relationships_created": 0,
+        "rows_rejected": 0,
+    }
+
+
+def _record(counters: Dict[str, Any], rows: List[Dict[str, Any]], written: Dict[str, Any], timings: Dict[str, float]):
+    for row in rows:
+        counters["taxpayers"].add(row["seller_gstin"])
+        counters["taxpayers"].add(row["buyer_gstin"])
+        counters["invoices"].add(row["invoice_id"])
+        if row["return_id"]:
+            counters["returns"].add(row["return_id"])
+        counters["relationships"] += 3 if row["return_id"] else 2
+    counters["nodes_created"] += written["nodes_created"]
+    counters["relationships_created"] += written["relationships_created"]
+    counters["rows_rejected"] += written["rows_rejected"]
+    for stage, secs in written["timings"].items():
+        timings[stage] += secs
+
+
+def _cell(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value).strip()
+
+
+def _iter_xlsx(path: str) -> Iterator[Dict[str, str]]:
+    from openpyxl import load_workbook
+
+    # read_only mode streams rows from the sheet XML instead of building the whole workbook
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = [_cell(h) for h in next(rows, ())]
+        for values in rows:
+            if values is None or all(v is None for v in values):
+                continue
+            yield {h: _cell(v) for h, v in zip(header, values) if h}
+    finally:
+        wb.close()
+
+
+def _iter_rows(path: str) -> Iterator[Dict[str, str]]:
+    if path.lower().endswith(".xlsx"):
+        yield from _iter_xlsx(path)
+        return
+    with open(path, newline="") as f:
+        yield from csv.DictReader(f)
+
+
+def _read_chunks(path: str, chunk_size: int, skip_rows: int = 0):
+    chunk: List[Dict[str, Any]] = []
+    for n, row in enumerate(_iter_rows(path)):
+        if n < skip_rows:
+            continue
+        chunk.append(_prepare_row(row))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _delta_chunks(path: str, chunk_size: int, checkpoint: IngestCheckpoint, skip_rows: int, incremental: bool, counters: Dict[str, Any]):
+    """Yield (rows to write, their hashes, rows scanned) per chunk, dropping unchanged rows."""
+    for chunk in _read_chunks(path, chunk_size, skip_rows):
+        rows, hashes = checkpoint.changed(chunk, force=not incremental)
+        counters["rows_scanned"] += len(chunk)
+        counters["rows_unchanged"] += len(chunk) - len(rows)
+        yield rows, hashes, len(chunk)
 
-def ingest(csv_path: str = DATA_PATH):
-    logger.info(f"Starting ingestion from {csv_path}")
-    driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1)
+
+
+def _ingest_sequential(driver, path: str, chunk_size: int, counters: Dict[str, Any], timings: Dict[str, float],
+                       checkpoint: IngestCheckpoint, skip_rows: int, incremental: bool) -> int:
+    rows_written = 0
+    with driver.session(database=NEO4J_DB) as session:
+        for rows, hashes, scanned in _delta_chunks(path, chunk_size, checkpoint, skip_rows, incremental, counters):
+            if rows:
+                written = session.execute_write(_write_chunk, rows)
+                _record(counters, rows, written, timings)
+                rows_written += len(rows)
+            checkpoint.commit_hashes(hashes)
+            checkpoint.advance(scanned)
+            logger.debug(f"Committed chunk {checkpoint.chunk}: {len(rows)} of {scanned} rows changed ({rows_written} written)")
+    return rows_written
+
+
+def _ingest_parallel(driver, path: str, chunk_size: int, workers: int, counters: Dict[str, Any], timings: Dict[str, float],
+                     checkpoint: IngestCheckpoint, skip_rows: int, incremental: bool) -> int:
+    """Read the source once and write seller-partitioned chunks from one session per worker.
+
+    Each worker chunk is a full _write_chunk, so it MERGEs its own taxpayers
+    before its invoices; the MERGE is idempotent, so a taxpayer two workers
+    share is created once. Partitioning on seller_gstin keeps each seller's
+    SELLS_TO and ISSUED edges inside a single worker, so the remaining
+    contention is on shared buyers and is absorbed by execute_write's
+    transient-error retries. Chunks commit out of order here, so a restart
+    relies on the row hashes each worker commits rather than on the row offset.
+    """
+    queues = [queue.Queue(maxsize=2) for _ in range(workers)]
+    lock = threading.Lock()
+    worker_stats = [{"worker": n, "rows": 0, "chunks": 0, "seconds": 0.0} for n in range(workers)]
+    errors: List[BaseException] = []
+
+    def work(n: int):
+        stats = worker_stats[n]
+        with driver.session(database=NEO4J_DB) as session:
+            while True:
+                chunk = queues[n].get()
+                if chunk is None:
+                    return
+                if errors:
+                    continue
+                try:
+                    t0 = time.perf_counter()
+                    written = session.execute_write(_write_chunk, chunk)
+                    stats["seconds"] += time.perf_counter() - t0
+                    stats["rows"] += len(chunk)
+                    stats["chunks"] += 1
+                    checkpoint.commit_hashes({row["invoice_id"]: row_hash(row) for row in chunk})
+                    with lock:
+                        _record(counters, chunk, written, timings)
+                except BaseException as e:
+                    errors.append(e)
+
+    threads = [threading.Thread(target=work, args=(n,), name=f"ingest-worker-{n}", daemon=True) for n in range(workers)]
+    for t in threads:
+        t.start()
+    buffers: List[List[Dict[str, Any]]] = [[] for _ in range(workers)]
+    try:
+        for rows, _, _ in _delta_chunks(path, chunk_size, checkpoint, skip_rows, incremental, counters):
+            if errors:
+                break
+            for row in rows:
+                n = _partition(row["seller_gstin"], workers)
+                buffers[n].append(row)
+                if len(buffers[n]) >= chunk_size:
+                    queues[n].put(buffers[n])
+                    buffers[n] = []
+        for n, buf in enumerate(buffers):
+            if buf and not errors:
+                queues[n].put(buf)
+    finally:
+        for q in queues:
+            q.put(None)
+        for t in threads:
+            t.join()
+    if errors:
+        raise errors[0]
+
+    for stats in worker_stats:
+        stats["rows_per_sec"] = round(stats["rows"] / stats["seconds"], 1) if stats["seconds"] > 0 else None
+        stats["seconds"] = round(stats["seconds"], 3)
+        logger.info(f"Worker {stats['worker']}: {stats['rows']} rows in {stats['chunks']} chunks, {stats['rows_per_sec']} rows/sec")
+    counters["workers"] = worker_stats
+    checkpoint.offset = skip_rows + counters["rows_scanned"]
+    return sum(stats["rows"] for stats in worker_stats)
+
+
+def ingest(path: str = DATA_PATH, chunk_size: int = CHUNK_SIZE, workers: int = WORKERS, incremental: bool = INCREMENTAL,
+           driver=None) -> Dict[str, Any]:
+    """Stream a CSV or .xlsx source into the graph.
+
+    Memory stays bounded by chunk_size: rows are read lazily and the audit
+    totals are HyperLogLog estimates rather than sets of every identifier.
+    With incremental=True a checkpoint in Mongo lets an interrupted or
+    appended file resume after its last committed chunk, and rows whose
+    content hash is unchanged are not written again. A run that writes rows
+    bumps the graph version. Returns the audit summary.
+    """
+    logger.info(f"Starting ingestion from {path} (chunk_size={chunk_size}, workers={workers}, incremental={incremental})")
     mongo = MongoClient(MONGO_URI)
     mdb = mongo[MONGO_DB]
     audit_collection = mdb["ingestion_audit"]
+    checkpoint = IngestCheckpoint(mdb, path)
+
+    skip_rows = checkpoint.start_offset() if incremental else 0
+    if skip_rows is None:
+        logger.info(f"{checkpoint.source} is unchanged since its last complete ingestion; nothing to do")
+        summary = {"timestamp": datetime.utcnow(), "source": checkpoint.source, "rows": 0, "unchanged": True}
+        audit_collection.insert_one(dict(summary))
+        return summary
+
+    own_driver = driver is None
+    if own_driver:
+        driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+    counters = _new_counters()
+    timings = {stage: 0.0 for stage in STAGES}
+
+    try:
+        with driver.session(database=NEO4J_DB) as session:
+            ensure_schema(session)
+        # Deltas below assume aggregates that are already right
+        aggregates.ensure(driver, mdb)
+        started = time.perf_counter()
+        if workers > 1:
+            rows_written = _ingest_parallel(driver, path, chunk_size, workers, counters, timings, checkpoint, skip_rows, incremental)
+        else:
+            rows_written = _ingest_sequential(driver, path, chunk_size, counters, timings, checkpoint, skip_rows, incremental)
+    finally:
+        if own_driver:
+            driver.close()
+    checkpoint.complete()
+    # a resumed run may find every row already written by the interrupted one
+    if rows_written or skip_rows:
+        bump_graph_version(mdb, source=checkpoint.source, data=True)
 
-    counters = {"taxpayers": set(), "invoices": set(), "returns": set(), "relationships": 0}
-
-    with driver.session(database=os.getenv("NEO4J_DB", "neo4j")) as session, open(csv_path, newline="") as f:
-        reader = csv.DictReader(f)
-        batch = []
-        batch_size = 500
-
-        def process_row(row):
-            session.execute_write(_merge_taxpayer, row)
-            session.execute_write(_merge_invoice, row)
-            session.execute_write(_merge_return, row)
-            counters["taxpayers"].add(row["seller_gstin"])
-            counters["taxpayers"].add(row["buyer_gstin"])
-            counters["invoices"].add(row["invoice_id"])
-            if row.get("return_id"):
-                counters["returns"].add(row["return_id"])
-            counters["relationships"] += 3 if row.get("return_id") else 2
-
-        for row in reader:
-            batch.append(row)
-            if len(batch) >= batch_size:
-                for r in batch:
-                    process_row(r)
-                batch.clear()
-        if batch:
-            for r in batch:
-                process_row(r)
+    elapsed = time.perf_counter() - started
+    throughput = _throughput(rows_written, timings, elapsed)
+    logger.info(f"Throughput (rows/sec): {throughput}")
 
     summary = {
         "timestamp": datetime.utcnow(),
-        "taxpayers": len(counters["taxpayers"]),
-        "invoices": len(counters["invoices"]),
-        "returns": len(counters["returns"]),
+        "taxpayers": counters["taxpayers"].count(),
+        "invoices": counters["invoices"].count(),
+        "returns": counters["returns"].count(),
         "relationships": counters["relationships"],
-        "source": os.path.basename(csv_path),
+        "counts_approximate": True,
+        "nodes_created": counters["nodes_created"],
+        "relationships_created": counters["relationships_created"],
+        "source": checkpoint.source,
+        "fingerprint": checkpoint.fingerprint,
+        "rows": rows_written,
+        "rows_scanned": counters["rows_scanned"],
+        "rows_unchanged": counters["rows_unchanged"],
+        "rows_rejected": counters["rows_rejected"],
+        "resumed_from_row": skip_rows,
+        "chunk_size": chunk_size,
+        "workers": counters.get("workers", workers),
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput": throughput,
+        "peak_rss_mb": _peak_rss_mb(),
     }
-    audit_collection.insert_one(summary)
+    audit_collection.insert_one(dict(summary))
     logger.info(f"Ingestion complete: {summary}")
+    return summary
 
 
 if __name__ == "__main__":
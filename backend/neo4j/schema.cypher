@@ -6,6 +6,14 @@ CREATE CONSTRAINT invoice_id_unique IF NOT EXISTS
 FOR (i:Invoice)
 REQUIRE i.invoice_id IS UNIQUE;
 
+// _merge_returns MERGEs on return_id, so it needs a uniqueness constraint rather
+// than the plain index it used to have (the two cannot coexist on one property).
+DROP INDEX return_id_idx IF EXISTS;
+
+CREATE CONSTRAINT return_id_unique IF NOT EXISTS
+FOR (r:Return)
+REQUIRE r.return_id IS UNIQUE;
+
 CREATE INDEX taxpayer_state_idx IF NOT EXISTS
 FOR (t:Taxpayer)
 ON (t.state);
@@ -14,6 +22,18 @@ CREATE INDEX taxpayer_risk_idx IF NOT EXISTS
 FOR (t:Taxpayer)
 ON (t.risk_score);
 
+CREATE INDEX taxpayer_risk_band_idx IF NOT EXISTS
+FOR (t:Taxpayer)
+ON (t.risk_band);
+
+CREATE INDEX taxpayer_cluster_idx IF NOT EXISTS
+FOR (t:Taxpayer)
+ON (t.cluster_id);
+
+CREATE INDEX taxpayer_component_idx IF NOT EXISTS
+FOR (t:Taxpayer)
+ON (t.component_id);
+
 CREATE INDEX invoice_date_idx IF NOT EXISTS
 FOR (i:Invoice)
 ON (i.invoice_date);
@@ -22,6 +42,28 @@ CREATE INDEX invoice_risk_idx IF NOT EXISTS
 FOR (i:Invoice)
 ON (i.risk_score);
 
-CREATE INDEX return_id_idx IF NOT EXISTS
-FOR (r:Return)
-ON (r.return_id);
+CREATE INDEX invoice_risk_band_idx IF NOT EXISTS
+FOR (i:Invoice)
+ON (i.risk_band);
+
+// created_at marks taxpayers and trade edges added since the last analytics run
+CREATE INDEX taxpayer_created_idx IF NOT EXISTS
+FOR (t:Taxpayer)
+ON (t.created_at);
+
+CREATE INDEX sells_to_created_idx IF NOT EXISTS
+FOR ()-[r:SELLS_TO]-()
+ON (r.created_at);
+
+// Incremental risk rescoring checks normalisation bounds with ORDER BY ... LIMIT 1
+CREATE INDEX taxpayer_pagerank_idx IF NOT EXISTS
+FOR (t:Taxpayer)
+ON (t.pagerank_score);
+
+CREATE INDEX taxpayer_degree_idx IF NOT EXISTS
+FOR (t:Taxpayer)
+ON (t.degree_centrality);
+
+CREATE INDEX taxpayer_mismatch_idx IF NOT EXISTS
+FOR (t:Taxpayer)
+ON (t.mismatch_count);
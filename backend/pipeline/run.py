@@ -0,0 +1,159 @@
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Any, Callable, List, Optional, Tuple
+
+from neo4j import GraphDatabase
+from pymongo import MongoClient
+from loguru import logger
+
+from gds import cycle_detection, incremental as analytics
+from ingest.ingest import ingest
+from risk import incremental as risk
+from . import snapshot
+from .state import get_data_version, get_graph_version, get_stage_version, set_stage_version
+
+NEO4J_URI = os.getenv("NEO4J_URI", "bolt://localhost:7687")
+NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
+NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "neo4j")
+DB = os.getenv("NEO4J_DB", "neo4j")
+
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
+MONGO_DB = os.getenv("MONGO_DB", "gstkg")
+
+# How often a running stage's resident set size is sampled
+RSS_SAMPLE_S = float(os.getenv("PIPELINE_RSS_SAMPLE_S", "0.1"))
+
+
+def _reconcile(driver) -> Dict[str, Any]:
+    """Materialise the reconcile snapshot the API serves, at the current graph version."""
+    db = MongoClient(MONGO_URI)[MONGO_DB]
+    return snapshot.build(driver, db, DB, get_graph_version(db))
+
+
+# (stage, callable taking the shared driver and the run's `force` flag, summary
+# key counted as rows touched) in dependency order; each stage consumes what the
+# previous ones wrote. Risk goes through risk.incremental so the :RiskDirty
+# labels ingest sets are consumed and the stored normalisation bounds kept
+# current; it falls back to a full rescore itself when it has to.
+STAGES: List[Tuple[str, Callable[[Any, bool], Dict[str, Any]], str]] = [
+    ("ingest", lambda driver, force: ingest(driver=driver), "rows"),
+    ("analytics", lambda driver, force: analytics.run(driver), "taxpayers"),
+    ("carousels", lambda driver, force: cycle_detection.run(driver), "carousels"),
+    ("risk", lambda driver, force: risk.run(driver, full=force), "taxpayers"),
+    ("reconcile", lambda driver, force: _reconcile(driver), "mismatches"),
+]
+
+
+def _rss_mb() -> Optional[float]:
+    # Current resident set (second field of statm, in pages); None where /proc is unavailable
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE") / (1024.0 * 1024.0)
+
+
+class RssSampler:
+    """Samples RSS on a background thread while a stage runs, for that stage's own peak.
+
+    ru_maxrss is the process-lifetime high-water mark, so after the heaviest
+    stage it would report that stage's peak for every later one.
+    """
+
+    def __init__(self, interval: float = RSS_SAMPLE_S):
+        self.interval = interval
+        self.start = _rss_mb()
+        self.peak = self.start
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, name="pipeline-rss", daemon=True)
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self._record()
+
+    def _record(self):
+        rss = _rss_mb()
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._record()
+        return False
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        if self.peak is None:
+            return {"peak_rss_mb": None, "rss_growth_mb": None}
+        return {"peak_rss_mb": round(self.peak, 1), "rss_growth_mb": round(self.peak - self.start, 1)}
+
+
+def run(driver=None, force: bool = False, stages: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Run ingest -> analytics -> carousels -> risk -> reconcile on one driver.
+
+    Ingest always runs (it skips an unchanged source itself). A later stage is
+    skipped when the data version equals the one it last completed at and no
+    stage before it ran in this pipeline run. `stages` restricts the run to
+    the named stages; `force` runs them regardless of version, and the risk
+    stage as a full rescore.
+    """
+    own_driver = driver is None
+    if own_driver:
+        driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+    db = MongoClient(MONGO_URI)[MONGO_DB]
+    record: Dict[str, Any] = {"started_at": datetime.utcnow(), "stages": [], "status": "running"}
+    run_id = db["pipeline_runs"].insert_one(dict(record)).inserted_id
+    started = time.perf_counter()
+    upstream_ran = False
+    try:
+        for name, stage, rows_key in STAGES:
+            if stages and name not in stages:
+                continue
+            version = get_data_version(db)
+            if name != "ingest" and not (force or upstream_ran) and get_stage_version(db, name) == version:
+                logger.info(f"Skipping {name}: inputs unchanged at data version {version}")
+                record["stages"].append({"stage": name, "skipped": True, "data_version": version})
+                continue
+
+            logger.info(f"Running {name} at data version {version}")
+            t0 = time.perf_counter()
+            with RssSampler() as rss:
+                summary = stage(driver, force) or {}
+            wall = time.perf_counter() - t0
+            version = get_data_version(db)
+            set_stage_version(db, name, version)
+            upstream_ran = upstream_ran or name != "ingest"
+            record["stages"].append({
+                "stage": name,
+                "skipped": False,
+                "data_version": version,
+                "wall_s": round(wall, 3),
+                "rows": summary.get(rows_key),
+                **rss.stats(),
+                "summary": {k: v for k, v in summary.items() if k not in ("_id", "timestamp")},
+            })
+            logger.info(f"{name} finished in {wall:.2f}s")
+        record["status"] = "succeeded"
+    except Exception as e:
+        record["status"] = "failed"
+        record["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        if own_driver:
+            driver.close()
+        record["elapsed_s"] = round(time.perf_counter() - started, 3)
+        record["finished_at"] = datetime.utcnow()
+        db["pipeline_runs"].replace_one({"_id": run_id}, record)
+        logger.info(f"Pipeline {record['status']} in {record['elapsed_s']}s")
+    return record
+
+
+if __name__ == "__main__":
+    run()
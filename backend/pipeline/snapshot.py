@@ -0,0 +1,140 @@
+import os
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+# Reconcile results are materialised in Mongo, one document per mismatch, under
+# the graph version they were computed at (bumped by ingest and risk scoring).
+# The pipeline's reconcile stage builds the snapshot with a sync driver and the
+# API rebuilds it on demand with the async one; both go through SnapshotBuild,
+# and nothing here imports app, so the batch process opens no API clients.
+# Builds in different processes can overlap, so the state document only ever
+# moves forward and a build deletes only versions older than the current one.
+SNAPSHOTS = "reconcile_snapshots"
+SNAPSHOT_STATE = "reconcile_snapshot_state"
+SNAPSHOT_STATE_ID = "current"
+SNAPSHOT_BATCH = int(os.getenv("RECONCILE_SNAPSHOT_BATCH", "1000"))
+# (keys, unique); every filtered page is a range scan ending in (invoice_id, buyer) order
+SNAPSHOT_INDEXES = [
+    ([("version", 1), ("invoice_id", 1), ("buyer", 1), ("seller", 1)], True),
+    ([("version", 1), ("seller", 1), ("invoice_id", 1), ("buyer", 1)], False),
+    ([("version", 1), ("buyer", 1), ("invoice_id", 1)], False),
+    ([("version", 1), ("causes", 1), ("invoice_id", 1), ("buyer", 1)], False),
+]
+
+ROOT_CAUSE_TEXT = {
+    "missing_return": "Invoice not reported in return",
+    "missing_claim": "Missing claim edge to buyer",
+    "tax_discrepancy": "Tax amount discrepancy detected",
+}
+
+# One row per mismatched (seller, invoice, buyer); the anchor MATCH binds s and i.
+RECONCILE_BODY = """
+OPTIONAL MATCH (i)-[:CLAIMED_BY]->(b:Taxpayer)
+WITH s, i, b,
+     NOT EXISTS { (i)-[:REPORTED_IN]->(:Return) } AS missing_return,
+     b IS NULL AS missing_claim,
+     COALESCE(i.claimed_tax_amount IS NOT NULL AND abs(i.tax_amount - i.claimed_tax_amount) > 0.01, false) AS tax_discrepancy
+WHERE (missing_return OR missing_claim OR tax_discrepancy)
+"""
+RECONCILE_RETURN = """
+RETURN s.gstin AS seller, i.invoice_id AS invoice_id, b.gstin AS buyer,
+       i.risk_score AS risk_score, i.risk_band AS risk_band,
+       missing_return, missing_claim, tax_discrepancy
+"""
+
+
+def join_query(*parts: str) -> str:
+    return "\n".join(part.strip("\n") for part in parts)
+
+
+RECONCILE_QUERY = join_query("MATCH (s:Taxpayer)-[:ISSUED]->(i:Invoice)", RECONCILE_BODY, RECONCILE_RETURN)
+
+
+def reconcile_item(row: Dict[str, Any]) -> Dict[str, Any]:
+    rc = [text for cause, text in ROOT_CAUSE_TEXT.items() if row[cause]]
+    return {"seller": row["seller"], "invoice_id": row["invoice_id"], "buyer": row["buyer"], "root_cause": rc,
+            "risk_score": row.get("risk_score"), "risk_band": row.get("risk_band"),
+            "match_confidence": row.get("match_confidence")}
+
+
+def snapshot_doc(row: Dict[str, Any], version: int) -> Dict[str, Any]:
+    """Snapshot document for one RECONCILE_QUERY row; `causes` holds the filterable codes."""
+    return {"version": version, **reconcile_item(row), "causes": [cause for cause in ROOT_CAUSE_TEXT if row[cause]]}
+
+
+def duplicates_only(e: BulkWriteError) -> bool:
+    """True when an unordered insert failed only on rows another builder already wrote."""
+    return all(err.get("code") == 11000 for err in e.details.get("writeErrors", []))
+
+
+class SnapshotBuild:
+    """One snapshot build: RECONCILE_QUERY rows in, insert batches and the final state document out.
+
+    The caller does the I/O: create SNAPSHOT_INDEXES, insert every batch
+    `add` and `take` hand back, upsert the SNAPSHOT_STATE document with
+    `flip()` (flipping readers to the new version unless a build at this or a
+    later version already has; the upsert then raises DuplicateKeyError), read
+    back the current version and delete `stale(current)`.
+    """
+
+    def __init__(self, version: int):
+        self.version = version
+        self.batch: List[Dict[str, Any]] = []
+        self.summary: Dict[str, Any] = {"graph_version": version, "mismatches": 0, **{cause: 0 for cause in ROOT_CAUSE_TEXT}}
+
+    def add(self, row: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+        """Queue a row's document; returns a full batch to insert, if any."""
+        doc = snapshot_doc(row, self.version)
+        for cause in doc["causes"]:
+            self.summary[cause] += 1
+        self.batch.append(doc)
+        return self.take() if len(self.batch) >= SNAPSHOT_BATCH else None
+
+    def take(self) -> List[Dict[str, Any]]:
+        batch, self.batch = self.batch, []
+        self.summary["mismatches"] += len(batch)
+        return batch
+
+    def state(self) -> Dict[str, Any]:
+        return {"version": self.version, "count": self.summary["mismatches"], "built_at": datetime.utcnow()}
+
+    def flip(self) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """(filter, update) for an upsert that moves the state document forward to this build only."""
+        return {"_id": SNAPSHOT_STATE_ID, "version": {"$lt": self.version}}, {"$set": self.state()}
+
+    def stale(self, current: int) -> Dict[str, Any]:
+        # A newer build may still be inserting; only what no reader can reach goes
+        return {"version": {"$lt": current}}
+
+
+def _insert(coll, docs: List[Dict[str, Any]]):
+    try:
+        coll.insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        if not duplicates_only(e):
+            raise
+
+
+def build(driver, db, database: str, version: int) -> Dict[str, Any]:
+    """Materialise the snapshot at `version` with a sync driver and pymongo database; returns its summary."""
+    coll = db[SNAPSHOTS]
+    for keys, unique in SNAPSHOT_INDEXES:
+        coll.create_index(keys, unique=unique)
+    snapshot = SnapshotBuild(version)
+    with driver.session(database=database) as session:
+        for row in session.run(RECONCILE_QUERY):
+            batch = snapshot.add(row)
+            if batch:
+                _insert(coll, batch)
+    batch = snapshot.take()
+    if batch:
+        _insert(coll, batch)
+    try:
+        db[SNAPSHOT_STATE].update_one(*snapshot.flip(), upsert=True)
+    except DuplicateKeyError:
+        pass  # a build at this or a later version flipped first
+    current = db[SNAPSHOT_STATE].find_one({"_id": SNAPSHOT_STATE_ID})["version"]
+    coll.delete_many(snapshot.stale(current))
+    return snapshot.summary
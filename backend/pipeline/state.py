@@ -0,0 +1,53 @@
+from datetime import datetime
+from typing import Optional
+
+from pymongo import ReturnDocument
+
+# `version` moves on every write that changes what the API serves: ingest and
+# risk scoring. `data_version` moves only when source data (invoices, returns,
+# taxpayers) is written; derived pipeline stages compare it with the version
+# they last completed at to decide whether their inputs changed.
+GRAPH_STATE_ID = "graph"
+
+
+def get_graph_version(db) -> int:
+    doc = db["graph_state"].find_one({"_id": GRAPH_STATE_ID})
+    return doc["version"] if doc else 0
+
+
+def get_data_version(db) -> int:
+    doc = db["graph_state"].find_one({"_id": GRAPH_STATE_ID})
+    return doc.get("data_version", 0) if doc else 0
+
+
+def bump_graph_version(db, source: Optional[str] = None, data: bool = False) -> int:
+    """Increment the graph version, and the data version too for source data writes."""
+    inc = {"version": 1, "data_version": 1} if data else {"version": 1}
+    doc = db["graph_state"].find_one_and_update(
+        {"_id": GRAPH_STATE_ID},
+        {"$inc": inc, "$set": {"updated_at": datetime.utcnow(), "source": source}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return doc["version"]
+
+
+def aggregates_built(db) -> bool:
+    """Whether ingest.aggregates has rebuilt this graph's aggregates, so the deltas ingest folds in are on a true base."""
+    doc = db["graph_state"].find_one({"_id": GRAPH_STATE_ID})
+    return bool(doc and doc.get("aggregates_built"))
+
+
+def set_aggregates_built(db, built: bool = True):
+    db["graph_state"].update_one({"_id": GRAPH_STATE_ID}, {"$set": {"aggregates_built": built}}, upsert=True)
+
+
+def get_stage_version(db, stage: str) -> Optional[int]:
+    doc = db["pipeline_state"].find_one({"_id": stage})
+    return doc["version"] if doc else None
+
+
+def set_stage_version(db, stage: str, version: int):
+    db["pipeline_state"].replace_one(
+        {"_id": stage}, {"_id": stage, "version": version, "completed_at": datetime.utcnow()}, upsert=True
+    )
@@ -0,0 +1,202 @@
+import argparse
+import os
+import time
+from typing import Dict, Any, Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from . import fuzzy
+
+DATA_PATH = os.getenv("GST_DATA_PATH", os.path.join(os.path.dirname(__file__), "../mock/mock_data.csv"))
+# Files the API may reconcile; request paths are resolved inside this directory
+DATA_DIR = os.getenv("RECON_DATA_DIR", os.path.dirname(os.path.abspath(DATA_PATH)))
+TAX_TOLERANCE = 0.01
+# Pair unclaimed invoices with unmatched claims whose numbers are formatted differently
+FUZZY = os.getenv("RECON_FUZZY", "1") == "1"
+
+CAUSES = ("missing_return", "missing_claim", "tax_discrepancy")
+ID_COLUMNS = ("seller_gstin", "buyer_gstin", "invoice_id", "return_id")
+# Supplier side (GSTR-1 style); claimed_tax_amount/return_id are read too so the
+# combined ingest CSV reconciles on its own.
+SUPPLY_COLUMNS = ("seller_gstin", "buyer_gstin", "invoice_id", "invoice_date", "tax_amount", "claimed_tax_amount", "return_id")
+# Recipient side: one row per claimed invoice; invoice_date is optional and
+# only used by fuzzy matching
+CLAIM_COLUMNS = ("seller_gstin", "buyer_gstin", "invoice_id", "invoice_date", "claimed_tax_amount")
+# Return filings: invoices the supplier reported in a return
+RETURN_COLUMNS = ("seller_gstin", "invoice_id", "return_id")
+
+INVOICE_KEY = ["invoice_id", "seller_gstin"]
+CLAIM_KEY = ["invoice_id", "seller_gstin", "buyer_gstin"]
+
+
+def resolve_path(name: str) -> str:
+    """Absolute path of `name` under DATA_DIR; ValueError if it escapes it or does not exist."""
+    root = os.path.realpath(DATA_DIR)
+    path = os.path.realpath(os.path.join(root, name))
+    if os.path.commonpath([root, path]) != root or not os.path.isfile(path):
+        raise ValueError(f"{name} is not a file in {DATA_DIR}")
+    return path
+
+
+def read_frame(path: str, columns: Iterable[str]) -> pd.DataFrame:
+    """Load the named columns of a CSV or Excel file; ids as strings, blanks as NaN."""
+    wanted = set(columns)
+    dtype = {c: str for c in ID_COLUMNS if c in wanted}
+    if path.lower().endswith((".xlsx", ".xls")):
+        df = pd.read_excel(path, usecols=lambda c: c in wanted, dtype=dtype)
+    else:
+        df = pd.read_csv(path, usecols=lambda c: c in wanted, dtype=dtype)
+    for col in ("tax_amount", "claimed_tax_amount"):
+        if col in df:
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+    return df
+
+
+def _claims_from_supply(supply: pd.DataFrame) -> pd.DataFrame:
+    # In the combined layout a row with a buyer is the buyer's claim (ingest's CLAIMED_BY)
+    claims = supply.loc[supply["buyer_gstin"].notna(), CLAIM_KEY]
+    amounts = supply["claimed_tax_amount"] if "claimed_tax_amount" in supply else np.nan
+    return claims.assign(claimed_tax_amount=amounts)
+
+
+def _matches(invoices: pd.DataFrame, row_of: np.ndarray, other: pd.DataFrame, codes: np.ndarray, key) -> Tuple[np.ndarray, np.ndarray]:
+    """Invoice row for each row of `other`, and whether every `key` column agrees."""
+    pos = np.where(codes >= 0, row_of[codes], -1)
+    hit = pos >= 0
+    for col in key[1:]:
+        hit &= invoices[col].to_numpy()[pos] == other[col].to_numpy()
+    return pos, hit
+
+
+def reconcile_frames(supply: pd.DataFrame, claims: Optional[pd.DataFrame] = None,
+                     returns: Optional[pd.DataFrame] = None, fuzzy_match: bool = FUZZY) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """Hash-join supplier invoices with claims and returns; (mismatches, summary).
+
+    invoice_id is hashed once across all three frames into integer codes;
+    deduplication and the joins then run on those codes, with seller (and
+    buyer) compared positionally. With `fuzzy_match`, invoices still
+    unclaimed are then paired with leftover claims by recon.fuzzy.
+
+    Mismatches have one row per invoice with seller, invoice_id, buyer, the
+    amounts, a boolean column per root cause, match_confidence (1.0 for an
+    exact match, the fuzzy score otherwise, NaN when unclaimed) and the
+    claim's own invoice number for fuzzy matches, in invoice_id order.
+    Without `claims`/`returns` they are taken from the supply frame's own
+    columns.
+    """
+    invoices = supply[[c for c in SUPPLY_COLUMNS if c in supply]].dropna(subset=["invoice_id"]).reset_index(drop=True)
+    if claims is None:
+        claims = _claims_from_supply(invoices)
+    claims = claims.reset_index(drop=True)
+    if returns is None:
+        returns = invoices.loc[invoices["return_id"].notna(), INVOICE_KEY] if "return_id" in invoices else invoices.iloc[:0][INVOICE_KEY]
+    if "return_id" in returns:
+        returns = returns[returns["return_id"].notna()]
+
+    sizes = np.cumsum([len(invoices), len(claims)])
+    codes, uniques = pd.factorize(np.concatenate([
+        frame["invoice_id"].to_numpy(dtype=object) for frame in (invoices, claims, returns)
+    ]))
+    invoice_codes, claim_codes, return_codes = np.split(codes, sizes)
+    if np.bincount(invoice_codes[invoice_codes >= 0], minlength=len(uniques)).max(initial=0) > 1:
+        # Later non-empty values win per column, as ingest's ON MATCH does
+        invoices = invoices.groupby(invoice_codes, sort=False).last()
+        invoice_codes = invoices.index.to_numpy()
+        invoices = invoices.reset_index(drop=True)
+    n = len(invoices)
+    row_of = np.full(len(uniques), -1)
+    row_of[invoice_codes[invoice_codes >= 0]] = np.flatnonzero(invoice_codes >= 0)
+
+    pos, hit = _matches(invoices, row_of, claims, claim_codes, CLAIM_KEY)
+    claimed = np.zeros(n, dtype=bool)
+    claimed[pos[hit]] = True
+    amounts = claims["claimed_tax_amount"].to_numpy(dtype=np.float64)
+    has_amount = hit & ~np.isnan(amounts)
+    # Last non-empty claimed amount per invoice wins, as with ingest
+    latest = pd.Series(amounts[has_amount], index=pos[has_amount])
+    latest = latest[~latest.index.duplicated(keep="last")]
+    claimed_tax = np.full(n, np.nan)
+    claimed_tax[latest.index.to_numpy()] = latest.to_numpy()
+
+    confidence = np.where(claimed, 1.0, np.nan)
+    claim_invoice = np.full(n, None, dtype=object)
+    pairs = fuzzy.match(invoices[~claimed], claims[~hit]) if fuzzy_match and (~claimed).any() and (~hit).any() else None
+    if pairs is not None and len(pairs):
+        rows, claim_rows = pairs["row_inv"].to_numpy(dtype=np.int64), pairs["row_claim"].to_numpy(dtype=np.int64)
+        claimed[rows] = True
+        hit[claim_rows] = True
+        confidence[rows] = pairs["confidence"].to_numpy()
+        claimed_tax[rows] = amounts[claim_rows]
+        claim_invoice[rows] = claims["invoice_id"].to_numpy()[claim_rows]
+
+    rpos, rhit = _matches(invoices, row_of, returns, return_codes, INVOICE_KEY)
+    reported = np.zeros(n, dtype=bool)
+    reported[rpos[rhit]] = True
+
+    tax = invoices["tax_amount"].to_numpy(dtype=np.float64)
+    with np.errstate(invalid="ignore"):
+        discrepancy = ~np.isnan(claimed_tax) & (np.abs(tax - claimed_tax) > TAX_TOLERANCE)
+    causes = {"missing_return": ~reported, "missing_claim": ~claimed, "tax_discrepancy": discrepancy}
+    flagged = causes["missing_return"] | causes["missing_claim"] | discrepancy
+
+    mismatches = pd.DataFrame({
+        "seller": invoices["seller_gstin"].to_numpy()[flagged],
+        "invoice_id": invoices["invoice_id"].to_numpy()[flagged],
+        "buyer": invoices["buyer_gstin"].to_numpy()[flagged],
+        "tax_amount": tax[flagged],
+        "claimed_tax_amount": claimed_tax[flagged],
+        **{cause: mask[flagged] for cause, mask in causes.items()},
+        "match_confidence": confidence[flagged],
+        "claim_invoice_id": claim_invoice[flagged],
+    }).sort_values("invoice_id", kind="stable", ignore_index=True)
+    # Claims the supplier never declared have no graph counterpart; reported as a count
+    unmatched = claims.loc[~hit, CLAIM_KEY].drop_duplicates()
+    summary = {
+        "invoices": n,
+        "mismatches": len(mismatches),
+        **{cause: int(mask.sum()) for cause, mask in causes.items()},
+        "unmatched_claims": len(unmatched),
+        "fuzzy_matches": 0 if pairs is None else len(pairs),
+    }
+    return mismatches, summary
+
+
+def reconcile_files(supply_path: str = DATA_PATH, claims_path: Optional[str] = None,
+                    returns_path: Optional[str] = None, fuzzy_match: bool = FUZZY) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """Reconcile supplier, recipient and return files without loading the graph."""
+    started = time.perf_counter()
+    supply = read_frame(supply_path, SUPPLY_COLUMNS)
+    claims = read_frame(claims_path, CLAIM_COLUMNS) if claims_path else None
+    returns = read_frame(returns_path, RETURN_COLUMNS) if returns_path else None
+    loaded = time.perf_counter()
+    mismatches, summary = reconcile_frames(supply, claims, returns, fuzzy_match)
+    summary["timings"] = {"load": round(loaded - started, 3), "reconcile": round(time.perf_counter() - loaded, 3)}
+    logger.info(f"File reconciliation complete: {summary}")
+    return mismatches, summary
+
+
+def records(mismatches: pd.DataFrame) -> Iterable[Dict[str, Any]]:
+    """Mismatch rows as dicts with None for missing values."""
+    return mismatches.astype(object).where(mismatches.notna(), None).to_dict("records")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconcile GST invoice files without Neo4j")
+    parser.add_argument("supply", nargs="?", default=DATA_PATH, help="supplier invoices (GSTR-1 style) or the combined ingest CSV")
+    parser.add_argument("--claims", help="recipient claims: seller_gstin, buyer_gstin, invoice_id, claimed_tax_amount")
+    parser.add_argument("--returns", help="return filings: seller_gstin, invoice_id, return_id")
+    parser.add_argument("--out", help="write mismatches to this CSV")
+    parser.add_argument("--exact", action="store_true", help="skip fuzzy matching of invoice numbers")
+    args = parser.parse_args()
+    mismatches, _ = reconcile_files(args.supply, args.claims, args.returns, fuzzy_match=FUZZY and not args.exact)
+    if args.out:
+        mismatches.to_csv(args.out, index=False)
+        logger.info(f"Wrote {len(mismatches)} mismatches to {args.out}")
+    else:
+        print(mismatches.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import os
+from difflib import SequenceMatcher
+
+import numpy as np
+import pandas as pd
+
+# Relative amount drift and date distance within which a pair still scores
+AMOUNT_TOLERANCE = float(os.getenv("RECON_FUZZY_AMOUNT_TOLERANCE", "0.02"))
+DATE_WINDOW_DAYS = int(os.getenv("RECON_FUZZY_DATE_WINDOW_DAYS", "15"))
+MIN_CONFIDENCE = float(os.getenv("RECON_FUZZY_MIN_CONFIDENCE", "0.7"))
+WEIGHTS = {"number": 0.6, "amount": 0.25, "date": 0.15}
+
+BLOCK = ["seller_gstin", "buyer_gstin"]
+
+
+def normalize_numbers(numbers: pd.Series) -> pd.Series:
+    """Invoice numbers without case, a leading alphabetic prefix or zero padding, groups joined by "-".
+
+    "INV/2024/0012", "inv-2024-12" and "2024/12" all become "2024-12". Digit
+    groups stay apart, so "INV/1/23" ("1-23") and "INV/12/3" ("12-3") differ.
+    """
+    return (
+        numbers.astype("string").str.upper()
+        .str.replace(r"^[A-Z]+[^0-9A-Z]*(?=[0-9])", "", regex=True)
+        .str.replace(r"(?<![0-9])0+(?=[0-9])", "", regex=True)
+        .str.replace(r"[^0-9A-Z]+", "-", regex=True)
+        .str.strip("-")
+    )
+
+
+def _prepare(frame: pd.DataFrame, amount: str) -> pd.DataFrame:
+    dates = pd.to_datetime(frame["invoice_date"], errors="coerce") if "invoice_date" in frame else pd.Series(pd.NaT, index=frame.index)
+    return pd.DataFrame({
+        "row": frame.index.to_numpy(),
+        "seller_gstin": frame["seller_gstin"].to_numpy(),
+        "buyer_gstin": frame["buyer_gstin"].to_numpy(),
+        "number": normalize_numbers(frame["invoice_id"]).to_numpy(dtype=object),
+        "amount": frame[amount].to_numpy(dtype=np.float64),
+        "date": dates.to_numpy(),
+        # Month index; invoices without a date share period 0
+        "period": (dates.dt.year * 12 + dates.dt.month).fillna(0).astype(np.int64).to_numpy(),
+    })
+
+
+def _score(pairs: pd.DataFrame) -> pd.Series:
+    same = (pairs["number_inv"] == pairs["number_claim"]).to_numpy()
+    number = np.array([
+        1.0 if eq else SequenceMatcher(None, a, b).ratio() if isinstance(a, str) and isinstance(b, str) else 0.0
+        for eq, a, b in zip(same, pairs["number_inv"], pairs["number_claim"])
+    ])
+    inv, claim = pairs["amount_inv"].to_numpy(), pairs["amount_claim"].to_numpy()
+    with np.errstate(invalid="ignore", divide="ignore"):
+        drift = np.abs(inv - claim) / np.maximum(np.abs(inv), 1.0)
+    # A missing amount or date neither confirms nor contradicts the match
+    amount = np.where(np.isnan(drift), 0.5, np.clip(1.0 - drift / AMOUNT_TOLERANCE, 0.0, 1.0))
+    days = np.abs((pairs["date_inv"] - pairs["date_claim"]).dt.days.to_numpy(dtype=np.float64))
+    date = np.where(np.isnan(days), 0.5, np.clip(1.0 - days / DATE_WINDOW_DAYS, 0.0, 1.0))
+    return pd.Series(WEIGHTS["number"] * number + WEIGHTS["amount"] * amount + WEIGHTS["date"] * date, index=pairs.index)
+
+
+def _by_number(invoices: pd.DataFrame, claims: pd.DataFrame) -> pd.DataFrame:
+    # Same normalised number within (seller, buyer); a block holds only colliding formats
+    return invoices.dropna(subset=["number"]).merge(
+        claims.dropna(subset=["number"]), on=[*BLOCK, "number"], suffixes=("_inv", "_claim"),
+    ).assign(number_inv=lambda df: df["number"], number_claim=lambda df: df["number"])
+
+
+def _nearest(claims: pd.DataFrame, invoices: pd.DataFrame, by: list) -> pd.DataFrame:
+    # Nearest invoice amount per claim within `by`, on log amounts so the
+    # tolerance is relative; sorted search, never all pairs in a block.
+    left = claims[claims["amount"] > 0].assign(key=lambda df: np.log(df["amount"])).sort_values("key")
+    right = invoices[invoices["amount"] > 0].assign(key=lambda df: np.log(df["amount"])).sort_values("key")
+    if left.empty or right.empty:
+        return pd.DataFrame()
+    pairs = pd.merge_asof(
+        left, right, on="key", by=by, direction="nearest",
+        tolerance=float(np.log1p(AMOUNT_TOLERANCE)), suffixes=("_claim", "_inv"),
+    )
+    return pairs.dropna(subset=["row_inv"]).astype({"row_inv": np.int64})
+
+
+def _by_amount(invoices: pd.DataFrame, claims: pd.DataFrame) -> pd.DataFrame:
+    # Dated pairs block on (seller, buyer, month). A side without a date (period
+    # 0) has no month to block on, so it is matched within (seller, buyer).
+    dated_inv, dated_claims = invoices["period"] > 0, claims["period"] > 0
+    passes = [
+        _nearest(claims[dated_claims], invoices[dated_inv], [*BLOCK, "period"]),
+        _nearest(claims[~dated_claims], invoices, BLOCK),
+        _nearest(claims[dated_claims], invoices[~dated_inv], BLOCK),
+    ]
+    passes = [pairs for pairs in passes if not pairs.empty]
+    return pd.concat(passes, ignore_index=True) if passes else pd.DataFrame()
+
+
+def _one_to_one(pairs: pd.DataFrame) -> pd.DataFrame:
+    """Greedy 1:1 assignment: repeatedly accept pairs that are best for both their invoice and claim."""
+    pairs = pairs.sort_values("confidence", ascending=False, kind="stable")
+    accepted = []
+    while not pairs.empty:
+        best = pairs[~pairs["row_inv"].duplicated() & ~pairs["row_claim"].duplicated()]
+        accepted.append(best)
+        pairs = pairs[~pairs["row_inv"].isin(best["row_inv"]) & ~pairs["row_claim"].isin(best["row_claim"])]
+    return pd.concat(accepted) if accepted else pairs
+
+
+def match(invoices: pd.DataFrame, claims: pd.DataFrame) -> pd.DataFrame:
+    """Pair unclaimed invoices with unmatched claims whose numbers, amounts and dates nearly agree.
+
+    `invoices` needs seller_gstin, buyer_gstin, invoice_id, tax_amount and
+    `claims` the same with claimed_tax_amount; invoice_date is used when
+    present. Candidates come from two blocked joins: the same normalised
+    number within (seller, buyer), then the nearest amount within
+    (seller, buyer, month), or (seller, buyer) when either side is undated.
+    Returns row_inv, row_claim (index labels of the inputs) and confidence
+    for pairs at or above MIN_CONFIDENCE, each invoice and claim used at
+    most once.
+    """
+    columns = ["row_inv", "row_claim", "confidence"]
+    if invoices.empty or claims.empty:
+        return pd.DataFrame(columns=columns)
+    inv = _prepare(invoices, "tax_amount")
+    clm = _prepare(claims, "claimed_tax_amount")
+    candidates = []
+    for pairs in (_by_number(inv, clm), _by_amount(inv, clm)):
+        if not pairs.empty:
+            candidates.append(pairs.assign(confidence=_score(pairs))[columns])
+    if not candidates:
+        return pd.DataFrame(columns=columns)
+    pairs = pd.concat(candidates).drop_duplicates(["row_inv", "row_claim"])
+    return _one_to_one(pairs[pairs["confidence"] >= MIN_CONFIDENCE]).reset_index(drop=True)
+
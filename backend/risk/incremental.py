@@ -0,0 +1,236 @@
+import os
+import time
+from datetime import datetime
+from typing import Dict, Any, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from neo4j import GraphDatabase
+from pymongo import MongoClient
+from loguru import logger
+
+from pipeline.state import bump_graph_version
+from . import risk_scoring as scoring
+
+NEO4J_URI = os.getenv("NEO4J_URI", "bolt://localhost:7687")
+NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
+NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "neo4j")
+DB = os.getenv("NEO4J_DB", "neo4j")
+
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
+MONGO_DB = os.getenv("MONGO_DB", "gstkg")
+
+STATS_ID = "taxpayer"
+
+# Ingest, reconciliation and incremental analytics label what they touch with
+# :RiskDirty. A run first claims the set by swapping it to :RiskScoring, rescores
+# the claimed entities and then clears :RiskScoring, so anything marked again
+# during the rescore keeps :RiskDirty for the next run. Claims left by a failed
+# run are picked up again by the next one.
+CLAIM_QUERY = "MATCH (n:{label}:RiskDirty) WITH n LIMIT $limit REMOVE n:RiskDirty SET n:RiskScoring RETURN count(n) AS c"
+DIRTY_TAXPAYERS_QUERY = "MATCH (t:Taxpayer:RiskScoring) RETURN t.gstin AS gstin, t.cluster_id AS cluster, t.risk_cluster AS previous_cluster"
+DIRTY_INVOICES_QUERY = "MATCH (i:Invoice:RiskScoring) RETURN i.invoice_id AS iid"
+# Index-backed: reads one entry from the start or end of the property index
+BOUND_QUERY = "MATCH (t:Taxpayer) WHERE t.{prop} IS NOT NULL RETURN t.{prop} AS v ORDER BY v {order} LIMIT 1"
+CLUSTER_TOTALS_QUERY = """
+UNWIND $clusters AS c
+MATCH (t:Taxpayer {cluster_id: c})
+RETURN c AS cluster, sum(COALESCE(t.mismatch_count, 0)) AS total
+"""
+ALL_CLUSTER_TOTALS_QUERY = """
+MATCH (t:Taxpayer)
+WHERE t.cluster_id IS NOT NULL AND t.mismatch_count > 0
+RETURN t.cluster_id AS cluster, sum(t.mismatch_count) AS total
+"""
+CLUSTER_MEMBERS_QUERY = "UNWIND $clusters AS c MATCH (t:Taxpayer {cluster_id: c}) RETURN t.gstin AS gstin"
+SUBSET_FEATURES_QUERY = "UNWIND $gstins AS g MATCH (t:Taxpayer {gstin: g})" + scoring.TAXPAYER_FEATURES_RETURN
+COUNTERPART_INVOICES_QUERY = """
+UNWIND $gstins AS g
+MATCH (:Taxpayer {gstin: g})-[:ISSUED]->(i:Invoice)
+RETURN i.invoice_id AS iid
+UNION
+UNWIND $gstins AS g
+MATCH (i:Invoice)-[:CLAIMED_BY]->(:Taxpayer {gstin: g})
+RETURN i.invoice_id AS iid
+"""
+CLEAR_ALL_QUERY = "MATCH (n:{label}) WITH n LIMIT $limit REMOVE n:{label} RETURN count(n) AS c"
+
+
+def _chunks(items: List[Any], size: int) -> Iterable[List[Any]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _bound(session, prop: str, order: str) -> Optional[float]:
+    rec = session.run(BOUND_QUERY.format(prop=prop, order=order)).single()
+    return float(rec["v"]) if rec else None
+
+
+def _current_bounds(session) -> Dict[str, float]:
+    """PageRank/degree ranges and the largest mismatch count, matching taxpayer_bounds()."""
+    bounds: Dict[str, float] = {}
+    for prop, key in (("pagerank_score", "pr"), ("degree_centrality", "deg")):
+        lo, hi = _bound(session, prop, "ASC"), _bound(session, prop, "DESC")
+        bounds[f"{key}_min"], bounds[f"{key}_max"] = (lo, hi) if lo is not None else (0.0, 1.0)
+    bounds["max_mismatch"] = _bound(session, "mismatch_count", "DESC") or 0.0
+    return bounds
+
+
+def _max_cluster_total(cluster_stats) -> float:
+    top = cluster_stats.find_one(sort=[("total", -1)])
+    return float(top["total"]) if top else 0.0
+
+
+def _store_cluster_totals(cluster_stats, totals: Dict[Any, float]):
+    for cluster, total in totals.items():
+        if total:
+            cluster_stats.replace_one({"_id": cluster}, {"_id": cluster, "total": total}, upsert=True)
+        else:
+            cluster_stats.delete_one({"_id": cluster})
+
+
+def _batched(session, query: str):
+    while session.execute_write(lambda tx: tx.run(query, limit=scoring.PAGE_SIZE).single()["c"]):
+        pass
+
+
+def _claim(session, label: str):
+    _batched(session, CLAIM_QUERY.format(label=label))
+
+
+def _clear_all(session, label: str):
+    _batched(session, CLEAR_ALL_QUERY.format(label=label))
+
+
+def _full(session, db, driver) -> Dict[str, Any]:
+    # Clear first so entities marked during the rescore stay marked for the next run
+    _clear_all(session, "RiskDirty")
+    _clear_all(session, "RiskScoring")
+    taxpayers = scoring.compute_taxpayer_risk(driver)
+    invoices = scoring.compute_invoice_risk(driver)
+    totals = {rec["cluster"]: rec["total"] for rec in session.run(ALL_CLUSTER_TOTALS_QUERY)}
+    db["risk_cluster_stats"].delete_many({})
+    if totals:
+        db["risk_cluster_stats"].insert_many([{"_id": c, "total": t} for c, t in totals.items()])
+    bounds = {**_current_bounds(session), "max_cluster": float(max(totals.values(), default=0))}
+    db["risk_stats"].replace_one({"_id": STATS_ID}, {"_id": STATS_ID, "bounds": bounds, "updated_at": datetime.utcnow()}, upsert=True)
+    return {"taxpayers": taxpayers["taxpayers"], "invoices": invoices["invoices"], "flags_changed": invoices["flags_changed"]}
+
+
+def _rescore_invoices(session, ids: List[str]) -> int:
+    scored = 0
+    for chunk in _chunks(ids, scoring.PAGE_SIZE):
+        records = session.execute_read(lambda tx: tx.run(scoring.INVOICE_FEATURES_QUERY, ids=chunk).data())
+        if not records:
+            continue
+        scores = scoring.score_invoices(
+            np.array([r["mismatch"] for r in records], dtype=bool),
+            np.array([r["srisk"] for r in records], dtype=np.float64),
+            np.array([r["brisk"] for r in records], dtype=np.float64),
+        )
+        scored += scoring._write_scores(session, scoring._write_invoice_scores, "iid", [r["iid"] for r in records], scores, chunk_size=len(records))
+    return scored
+
+
+def _dirty(session, db, stats: Dict[str, Any]) -> Tuple[Optional[str], Dict[str, Any]]:
+    """Rescore dirty entities; returns (reason, summary) with a reason when a full rescore is needed."""
+    timings: Dict[str, float] = {}
+    t0 = time.perf_counter()
+    _claim(session, "Invoice")
+    dirty_invoices = [rec["iid"] for rec in session.run(DIRTY_INVOICES_QUERY)]
+    flipped = sum(session.execute_write(scoring._update_flags, chunk) for chunk in _chunks(dirty_invoices, scoring.PAGE_SIZE))
+    timings["flags"] = time.perf_counter() - t0
+
+    # After the flag update, which marks the sellers whose mismatch counts it moved
+    t0 = time.perf_counter()
+    _claim(session, "Taxpayer")
+    dirty = session.run(DIRTY_TAXPAYERS_QUERY).data()
+    clusters = {rec[key] for rec in dirty for key in ("cluster", "previous_cluster") if rec[key] is not None}
+    totals = {c: 0 for c in clusters}
+    totals.update({rec["cluster"]: rec["total"] for rec in session.run(CLUSTER_TOTALS_QUERY, clusters=sorted(clusters))})
+    stored = {doc["_id"]: doc["total"] for doc in db["risk_cluster_stats"].find({"_id": {"$in": sorted(clusters)}})}
+    changed_clusters = sorted(c for c, total in totals.items() if total != stored.get(c, 0))
+    _store_cluster_totals(db["risk_cluster_stats"], {c: totals[c] for c in changed_clusters})
+
+    bounds = {**_current_bounds(session), "max_cluster": _max_cluster_total(db["risk_cluster_stats"])}
+    timings["stats"] = time.perf_counter() - t0
+    moved = [k for k, v in bounds.items() if stats["bounds"].get(k) != v]
+    if moved:
+        return f"normalisation bounds moved: {', '.join(moved)}", {}
+
+    t0 = time.perf_counter()
+    gstins: Set[str] = {rec["gstin"] for rec in dirty}
+    if changed_clusters:
+        gstins.update(rec["gstin"] for rec in session.run(CLUSTER_MEMBERS_QUERY, clusters=changed_clusters))
+    ids, features = scoring._load_taxpayer_features(session, SUBSET_FEATURES_QUERY, gstins=sorted(gstins))
+    member_clusters = sorted({int(c) for c in features["cluster"][~np.isnan(features["cluster"])]} - set(totals))
+    if member_clusters:
+        totals.update({doc["_id"]: doc["total"] for doc in db["risk_cluster_stats"].find({"_id": {"$in": member_clusters}})})
+    features["cl_count"] = np.array([0.0 if np.isnan(c) else float(totals.get(int(c), 0)) for c in features["cluster"]])
+    scores = scoring.score_taxpayers(features, bounds=bounds)
+    scoring._write_scores(session, scoring._write_taxpayer_scores, "gstin", ids, scores)
+    timings["taxpayers"] = time.perf_counter() - t0
+
+    # Invoice risk averages seller and buyer risk, so a changed taxpayer score reaches its invoices
+    t0 = time.perf_counter()
+    moved_scores = [g for g, new, old in zip(ids, scores.tolist(), features["previous"].tolist()) if new != old]
+    invoices = set(dirty_invoices)
+    if moved_scores:
+        invoices.update(rec["iid"] for rec in session.run(COUNTERPART_INVOICES_QUERY, gstins=moved_scores))
+    rescored_invoices = _rescore_invoices(session, sorted(invoices))
+    timings["invoices"] = time.perf_counter() - t0
+
+    if ids or rescored_invoices:
+        bump_graph_version(db, source="risk_incremental")
+    _clear_all(session, "RiskScoring")
+    return None, {
+        "dirty_taxpayers": len(dirty),
+        "dirty_invoices": len(dirty_invoices),
+        "flags_changed": flipped,
+        "clusters_changed": len(changed_clusters),
+        "taxpayers": len(ids),
+        "invoices": rescored_invoices,
+        "timings": {k: round(v, 3) for k, v in timings.items()},
+    }
+
+
+def run(driver=None, full: bool = False) -> Dict[str, Any]:
+    """Rescore taxpayers and invoices marked :RiskDirty, plus the ones their changes reach.
+
+    Falls back to a full rescore when there are no stored normalisation
+    statistics, when `full` is set, after a full analytics run, or when a
+    normalisation bound has moved since the statistics were taken.
+    """
+    own_driver = driver is None
+    if own_driver:
+        driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+    db = MongoClient(MONGO_URI)[MONGO_DB]
+    started = time.perf_counter()
+    try:
+        stats = db["risk_stats"].find_one({"_id": STATS_ID})
+        last_full_analytics = db["analytics_runs"].find_one({"mode": "full"}, sort=[("timestamp", -1)])
+        reason = None
+        if full:
+            reason = "full rescore requested"
+        elif stats is None:
+            reason = "no stored normalisation statistics"
+        elif last_full_analytics and last_full_analytics["timestamp"] > stats["updated_at"]:
+            reason = "full analytics run since the last rescore"
+        with driver.session(database=DB) as session:
+            summary: Dict[str, Any] = {}
+            if reason is None:
+                reason, summary = _dirty(session, db, stats)
+            if reason is not None:
+                logger.info(f"Full risk rescore: {reason}")
+                summary = {"reason": reason, **_full(session, db, driver)}
+            summary = {"mode": "incremental" if "reason" not in summary else "full", **summary}
+    finally:
+        if own_driver:
+            driver.close()
+    summary["elapsed_s"] = round(time.perf_counter() - started, 3)
+    db["risk_runs"].insert_one({"timestamp": datetime.utcnow(), **summary})
+    logger.info(f"Risk rescore complete: {summary}")
+    return summary
+
+
+if __name__ == "__main__":
+    run()
@@ -1,144 +1,294 @@
 import os
-from typing import Tuple
+import time
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+import numpy as np
 from neo4j import GraphDatabase
+from pymongo import MongoClient
 from loguru import logger
 
+from ingest import aggregates
+from pipeline.state import bump_graph_version
+
 NEO4J_URI = os.getenv("NEO4J_URI", "bolt://localhost:7687")
 NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
 NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "neo4j")
 DB = os.getenv("NEO4J_DB", "neo4j")
 
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
+MONGO_DB = os.getenv("MONGO_DB", "gstkg")
+
+WRITE_CHUNK = int(os.getenv("RISK_WRITE_CHUNK", "10000"))
+# Invoices per transaction for the flag update and per page for invoice scoring
+PAGE_SIZE = int(os.getenv("RISK_PAGE_SIZE", "10000"))
+
+# Taxpayer risk = weighted sum of normalised components; RISK_WEIGHT_<NAME> overrides a weight.
+DEFAULT_WEIGHTS = {"mismatch": 0.35, "pagerank": 0.25, "degree": 0.15, "cluster": 0.15, "default": 0.10}
+WEIGHTS = {name: float(os.getenv(f"RISK_WEIGHT_{name.upper()}", str(w))) for name, w in DEFAULT_WEIGHTS.items()}
+
+TAXPAYER_FEATURES_RETURN = """
+RETURN t.gstin AS gstin, t.risk_score AS previous, t.pagerank_score AS pr, t.degree_centrality AS deg, t.cluster_id AS cluster,
+       COALESCE(t.mismatch_count, 0) AS mc,
+       EXISTS { (t)-[:ISSUED]->(:Invoice)-[:REPORTED_IN]->(:Return {status: 'DEFAULT'}) } AS defaulted
+"""
+TAXPAYER_FEATURES_QUERY = "MATCH (t:Taxpayer)" + TAXPAYER_FEATURES_RETURN
+
+# Keyset page over the invoice_id uniqueness index
+INVOICE_PAGE_QUERY = """
+MATCH (i:Invoice) WHERE i.invoice_id > $after
+RETURN i.invoice_id AS iid ORDER BY iid LIMIT $limit
+"""
+# Mismatch: missing REPORTED_IN edge, tax amount discrepancy, missing CLAIMED_BY.
+# Only flags that flip are written, and each flip moves mismatch_count on the
+# seller and on the SELLS_TO edge to the buyer by one and marks the seller for
+# rescoring.
+UPDATE_FLAGS_QUERY = """
+UNWIND $ids AS iid
+MATCH (s:Taxpayer)-[:ISSUED]->(i:Invoice {invoice_id: iid})
+OPTIONAL MATCH (i)-[:CLAIMED_BY]->(b:Taxpayer)
+WITH s, i, b, COALESCE(i.mismatch_flag, false) AS was_flagged,
+     (b IS NULL OR NOT EXISTS { (i)-[:REPORTED_IN]->(:Return) }) AS flagged
+WHERE was_flagged <> flagged
+SET i.mismatch_flag = flagged
+WITH s, b, sum(CASE WHEN flagged THEN 1 ELSE -1 END) AS delta
+SET s.mismatch_count = COALESCE(s.mismatch_count, 0) + delta, s:RiskDirty
+WITH s, b, delta
+OPTIONAL MATCH (s)-[rel:SELLS_TO]->(b)
+FOREACH (_ IN CASE WHEN rel IS NULL THEN [] ELSE [1] END |
+    SET rel.mismatch_count = COALESCE(rel.mismatch_count, 0) + delta)
+RETURN sum(abs(delta)) AS flipped
+"""
+INVOICE_FEATURES_QUERY = """
+UNWIND $ids AS iid
+MATCH (s:Taxpayer)-[:ISSUED]->(i:Invoice {invoice_id: iid})
+OPTIONAL MATCH (i)-[:CLAIMED_BY]->(b:Taxpayer)
+RETURN i.invoice_id AS iid, COALESCE(i.mismatch_flag, false) AS mismatch,
+       COALESCE(s.risk_score, 0) AS srisk, COALESCE(b.risk_score, 0) AS brisk
+"""
 
-def _normalize(value: float, min_v: float, max_v: float) -> float:
+
+def _normalize_array(values: np.ndarray, min_v: float, max_v: float) -> np.ndarray:
     if max_v == min_v:
-        return 0.0
-    return max(0.0, min(1.0, (value - min_v) / (max_v - min_v)))
-
-
-def _bounded100(v: float) -> float:
-    return round(max(0.0, min(100.0, v * 100.0)), 2)
-
-
-def compute_taxpayer_risk():
-    driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
-    with driver.session(database=DB) as session:
-        logger.info("Computing mismatch counts per taxpayer")
-        mismatch_counts = {
-            rec["gstin"]: rec["mc"]
-            for rec in session.run(
-                """
-                MATCH (t:Taxpayer)-[:ISSUED]->(i:Invoice)
-                WHERE COALESCE(i.mismatch_flag,false) = true
-                RETURN t.gstin AS gstin, count(i) AS mc
-                """
-            )
-        }
-        min_m = 0
-        max_m = max(mismatch_counts.values()) if mismatch_counts else 1
-
-        logger.info("Computing cluster mismatch counts")
-        cluster_counts = {
-            rec["cluster"]: rec["mc"]
-            for rec in session.run(
-                """
-                MATCH (t:Taxpayer)-[:ISSUED]->(i:Invoice)
-                WHERE COALESCE(i.mismatch_flag,false) = true AND exists(t.cluster_id)
-                RETURN t.cluster_id AS cluster, count(i) AS mc
-                """
-            )
-        }
-        min_c = 0
-        max_c = max(cluster_counts.values()) if cluster_counts else 1
-
-        logger.info("Computing tax default flag")
-        defaults = {
-            rec["gstin"]: rec["df"]
-            for rec in session.run(
-                """
-                MATCH (t:Taxpayer)
-                OPTIONAL MATCH (t)-[:ISSUED]->(:Invoice)-[:REPORTED_IN]->(r:Return)
-                WITH t, collect(DISTINCT r.status) AS statuses
-                RETURN t.gstin AS gstin, CASE WHEN any(s IN statuses WHERE s='DEFAULT') THEN 1 ELSE 0 END AS df
-                """
-            )
-        }
-
-        logger.info("Fetch pagerank and degree ranges")
-        pr_values = [rec["score"] for rec in session.run("MATCH (t:Taxpayer) WHERE exists(t.pagerank_score) RETURN t.pagerank_score AS score")]
-        deg_values = [rec["score"] for rec in session.run("MATCH (t:Taxpayer) WHERE exists(t.degree_centrality) RETURN t.degree_centrality AS score")]
-        pr_min, pr_max = (min(pr_values), max(pr_values)) if pr_values else (0.0, 1.0)
-        deg_min, deg_max = (min(deg_values), max(deg_values)) if deg_values else (0.0, 1.0)
-
-        logger.info("Compute and store taxpayer risk_score")
-        result = session.run("MATCH (t:Taxpayer) RETURN t.gstin AS gstin, t.pagerank_score AS pr, t.degree_centrality AS deg, t.cluster_id AS cluster")
-        for rec in result:
-            gstin = rec["gstin"]
-            pr_n = _normalize(rec.get("pr", 0.0) or 0.0, pr_min, pr_max)
-            deg_n = _normalize(rec.get("deg", 0.0) or 0.0, deg_min, deg_max)
-            mm_n = _normalize(mismatch_counts.get(gstin, 0), min_m, max_m)
-            cl_count = cluster_counts.get(rec.get("cluster", -1), 0)
-            cl_n = _normalize(cl_count, min_c, max_c)
-            df_flag = defaults.get(gstin, 0)
-
-            risk = (
-                0.35 * mm_n +
-                0.25 * pr_n +
-                0.15 * deg_n +
-                0.15 * cl_n +
-                0.10 * (1.0 if df_flag else 0.0)
-            )
-            session.run(
-                "MATCH (t:Taxpayer {gstin: $gstin}) SET t.risk_score = $score, t.risk_band = CASE WHEN $score < 40 THEN 'LOW' WHEN $score < 71 THEN 'MEDIUM' ELSE 'HIGH' END",
-                gstin=gstin,
-                score=_bounded100(risk),
-            )
-        logger.info("Taxpayer risk_score updated")
-
-
-def compute_invoice_risk():
-    driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
-    with driver.session(database=DB) as session:
-        logger.info("Compute mismatch normalization range")
-        mm_values = [rec["mc"] for rec in session.run("MATCH (i:Invoice) WHERE COALESCE(i.mismatch_flag,false)=true RETURN count(i) AS mc")]
-        mm_min, mm_max = (0, max(mm_values) if mm_values else 1)
-
-        logger.info("Set invoice mismatch flags based on reconciliation")
-        # Mismatch: missing REPORTED_IN edge, tax amount discrepancy, missing CLAIMED_BY
-        session.run(
-            """
-            MATCH (s:Taxpayer)-[:ISSUED]->(i:Invoice)
-            OPTIONAL MATCH (i)-[:CLAIMED_BY]->(b:Taxpayer)
-            OPTIONAL MATCH (i)-[:REPORTED_IN]->(r:Return)
-            WITH s, i, b, r,
-                 CASE WHEN r IS NULL THEN true ELSE false END AS missing_return,
-                 CASE WHEN b IS NULL THEN true ELSE false END AS missing_claim,
-                 i.tax_amount AS tax_amt
-            SET i.mismatch_flag = (missing_return OR missing_claim)
-            """
-        )
-
-        logger.info("Compute invoice risk by combining mismatch and counterpart risk")
-        result = session.run(
-            """
-            MATCH (s:Taxpayer)-[:ISSUED]->(i:Invoice)
-            OPTIONAL MATCH (i)-[:CLAIMED_BY]->(b:Taxpayer)
-            RETURN i.invoice_id AS iid, COALESCE(i.mismatch_flag,false) AS mismatch,
-                   COALESCE(s.risk_score,0) AS srisk, COALESCE(b.risk_score,0) AS brisk
-            """
-        )
-        for rec in result:
-            mm_n = 1.0 if rec["mismatch"] else 0.0
-            prisk = _normalize((rec["srisk"] + rec["brisk"]) / 2.0, 0.0, 100.0)
-            risk = 0.6 * mm_n + 0.4 * prisk
-            score = _bounded100(risk)
-            band = "LOW" if score < 40 else ("MEDIUM" if score < 71 else "HIGH")
-            session.run(
-                "MATCH (i:Invoice {invoice_id: $iid}) SET i.risk_score = $score, i.risk_band = $band",
-                iid=rec["iid"],
-                score=score,
-                band=band,
-            )
-        logger.info("Invoice risk_score updated")
+        return np.zeros(len(values))
+    return np.clip((values - min_v) / (max_v - min_v), 0.0, 1.0)
+
+
+def _bounded100_array(v: np.ndarray) -> np.ndarray:
+    return np.round(np.clip(v * 100.0, 0.0, 100.0), 2)
+
+
+def _bands(scores: np.ndarray) -> List[str]:
+    return np.where(scores < 40, "LOW", np.where(scores < 71, "MEDIUM", "HIGH")).tolist()
+
+
+def _column(records: List[Dict[str, Any]], key: str) -> np.ndarray:
+    """Float column with NaN for missing values."""
+    return np.array([np.nan if r[key] is None else r[key] for r in records], dtype=np.float64)
+
+
+def _score_range(values: np.ndarray) -> Tuple[float, float]:
+    present = values[~np.isnan(values)]
+    return (float(present.min()), float(present.max())) if present.size else (0.0, 1.0)
+
+
+def _cluster_counts(cluster: np.ndarray, mc: np.ndarray) -> np.ndarray:
+    """Mismatch total of each taxpayer's cluster, 0 for unclustered taxpayers."""
+    cl_count = np.zeros(len(mc))
+    clustered = ~np.isnan(cluster)
+    if clustered.any():
+        ids, inverse = np.unique(cluster[clustered], return_inverse=True)
+        totals = np.bincount(inverse, weights=mc[clustered], minlength=len(ids))
+        cl_count[clustered] = totals[inverse]
+    return cl_count
+
+
+def taxpayer_bounds(features: Dict[str, np.ndarray]) -> Dict[str, float]:
+    """Normalisation bounds of a full feature set."""
+    pr_min, pr_max = _score_range(features["pr"])
+    deg_min, deg_max = _score_range(features["deg"])
+    cl_count = features["cl_count"] if "cl_count" in features else _cluster_counts(features["cluster"], features["mc"].astype(np.float64))
+    return {
+        "pr_min": pr_min, "pr_max": pr_max,
+        "deg_min": deg_min, "deg_max": deg_max,
+        "max_mismatch": float(features["mc"].max(initial=0)),
+        "max_cluster": float(cl_count.max(initial=0)),
+    }
+
+
+def score_taxpayers(features: Dict[str, np.ndarray], weights: Optional[Dict[str, float]] = None,
+                    bounds: Optional[Dict[str, float]] = None) -> np.ndarray:
+    """Vectorised taxpayer risk score (0-100) from feature columns.
+
+    `features` holds equal-length arrays: pr and deg (NaN when not computed),
+    mc (mismatched invoices issued), cluster (NaN when unclustered) and
+    defaulted (bool), plus optionally cl_count (the cluster's mismatch total)
+    when the arrays do not cover whole clusters. PageRank and degree are
+    min-max normalised over the taxpayers that have them; mismatch and
+    cluster totals are scaled against their maximum. `bounds` supplies those
+    ranges when scoring a subset of the graph.
+    """
+    w = {**WEIGHTS, **(weights or {})}
+    mc = features["mc"].astype(np.float64)
+    cl_count = features["cl_count"] if "cl_count" in features else _cluster_counts(features["cluster"], mc)
+    b = bounds or taxpayer_bounds({**features, "cl_count": cl_count})
+
+    pr_n = _normalize_array(np.nan_to_num(features["pr"]), b["pr_min"], b["pr_max"])
+    deg_n = _normalize_array(np.nan_to_num(features["deg"]), b["deg_min"], b["deg_max"])
+    mm_n = _normalize_array(mc, 0.0, b["max_mismatch"] or 1.0)
+    cl_n = _normalize_array(cl_count, 0.0, b["max_cluster"] or 1.0)
+
+    risk = (
+        w["mismatch"] * mm_n +
+        w["pagerank"] * pr_n +
+        w["degree"] * deg_n +
+        w["cluster"] * cl_n +
+        w["default"] * features["defaulted"].astype(np.float64)
+    )
+    return _bounded100_array(risk)
+
+
+def _load_taxpayer_features(session, query: str = TAXPAYER_FEATURES_QUERY, **params) -> Tuple[List[str], Dict[str, np.ndarray]]:
+    records = session.run(query, **params).data()
+    return [r["gstin"] for r in records], {
+        "pr": _column(records, "pr"),
+        "deg": _column(records, "deg"),
+        "cluster": _column(records, "cluster"),
+        "mc": np.array([r["mc"] for r in records], dtype=np.int64),
+        "defaulted": np.array([bool(r["defaulted"]) for r in records], dtype=bool),
+        "previous": _column(records, "previous"),
+    }
+
+
+def _write_taxpayer_scores(tx, rows: List[Dict[str, Any]]):
+    tx.run(
+        """
+        UNWIND $rows AS row
+        MATCH (t:Taxpayer {gstin: row.gstin})
+        SET t.risk_score = row.score, t.risk_band = row.band, t.risk_cluster = t.cluster_id
+        """,
+        rows=rows,
+    ).consume()
+
+
+def _write_scores(session, writer, key: str, ids: List[str], scores: np.ndarray, chunk_size: int = WRITE_CHUNK) -> int:
+    values, bands = scores.tolist(), _bands(scores)
+    for start in range(0, len(ids), chunk_size):
+        end = min(start + chunk_size, len(ids))
+        rows = [{key: ids[n], "score": values[n], "band": bands[n]} for n in range(start, end)]
+        session.execute_write(writer, rows)
+    return len(ids)
+
+
+def compute_taxpayer_risk(driver=None, weights: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+    own_driver = driver is None
+    if own_driver:
+        driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+    timings: Dict[str, float] = {}
+    try:
+        # The mismatch term reads mismatch_count from the ingest aggregates
+        aggregates.ensure(driver, MongoClient(MONGO_URI)[MONGO_DB])
+        with driver.session(database=DB) as session:
+            logger.info("Reading taxpayer risk features")
+            t0 = time.perf_counter()
+            gstins, features = _load_taxpayer_features(session)
+            timings["read"] = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            scores = score_taxpayers(features, weights)
+            timings["score"] = time.perf_counter() - t0
+
+            logger.info(f"Writing risk_score for {len(gstins)} taxpayers")
+            t0 = time.perf_counter()
+            _write_scores(session, _write_taxpayer_scores, "gstin", gstins, scores)
+            timings["write"] = time.perf_counter() - t0
+    finally:
+        if own_driver:
+            driver.close()
+    bump_graph_version(MongoClient(MONGO_URI)[MONGO_DB], source="taxpayer_risk")
+    summary = {"taxpayers": len(gstins), "timings": {k: round(v, 3) for k, v in timings.items()}}
+    logger.info(f"Taxpayer risk_score updated: {summary}")
+    return summary
+
+
+def _invoice_pages(session, page_size: int) -> Iterator[List[str]]:
+    after = ""
+    while True:
+        ids = [rec["iid"] for rec in session.execute_read(lambda tx: tx.run(INVOICE_PAGE_QUERY, after=after, limit=page_size).data())]
+        if not ids:
+            return
+        yield ids
+        after = ids[-1]
+
+
+def _update_flags(tx, ids: List[str]) -> int:
+    rec = tx.run(UPDATE_FLAGS_QUERY, ids=ids).single()
+    return rec["flipped"] if rec and rec["flipped"] else 0
+
+
+def score_invoices(mismatch: np.ndarray, srisk: np.ndarray, brisk: np.ndarray) -> np.ndarray:
+    """Invoice risk (0-100): 60% mismatch flag, 40% mean counterpart risk."""
+    prisk = _normalize_array((srisk + brisk) / 2.0, 0.0, 100.0)
+    return _bounded100_array(0.6 * mismatch.astype(np.float64) + 0.4 * prisk)
+
+
+def _write_invoice_scores(tx, rows: List[Dict[str, Any]]):
+    tx.run(
+        """
+        UNWIND $rows AS row
+        MATCH (i:Invoice {invoice_id: row.iid})
+        SET i.risk_score = row.score, i.risk_band = row.band
+        """,
+        rows=rows,
+    ).consume()
+
+
+def compute_invoice_risk(driver=None, page_size: int = PAGE_SIZE) -> Dict[str, Any]:
+    """Refresh mismatch flags, then score invoices page by page.
+
+    Both passes walk invoices in invoice_id order, `page_size` at a time, and
+    each page is one transaction, so memory stays flat however many invoices
+    there are.
+    """
+    own_driver = driver is None
+    if own_driver:
+        driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+    timings = {"flags": 0.0, "read": 0.0, "score": 0.0, "write": 0.0}
+    flipped = invoices = 0
+    try:
+        with driver.session(database=DB) as session:
+            logger.info("Set invoice mismatch flags based on reconciliation")
+            t0 = time.perf_counter()
+            for ids in _invoice_pages(session, page_size):
+                flipped += session.execute_write(_update_flags, ids)
+            timings["flags"] = time.perf_counter() - t0
+            logger.info(f"{flipped} mismatch flags changed in {timings['flags']:.2f}s")
+
+            logger.info("Compute invoice risk by combining mismatch and counterpart risk")
+            for ids in _invoice_pages(session, page_size):
+                t0 = time.perf_counter()
+                records = session.execute_read(lambda tx: tx.run(INVOICE_FEATURES_QUERY, ids=ids).data())
+                timings["read"] += time.perf_counter() - t0
+                if not records:
+                    continue
+
+                t0 = time.perf_counter()
+                scores = score_invoices(
+                    np.array([r["mismatch"] for r in records], dtype=bool),
+                    np.array([r["srisk"] for r in records], dtype=np.float64),
+                    np.array([r["brisk"] for r in records], dtype=np.float64),
+                )
+                timings["score"] += time.perf_counter() - t0
+
+                t0 = time.perf_counter()
+                invoices += _write_scores(session, _write_invoice_scores, "iid", [r["iid"] for r in records], scores, chunk_size=len(records))
+                timings["write"] += time.perf_counter() - t0
+    finally:
+        if own_driver:
+            driver.close()
+    bump_graph_version(MongoClient(MONGO_URI)[MONGO_DB], source="invoice_risk")
+    summary = {"invoices": invoices, "flags_changed": flipped, "timings": {k: round(v, 3) for k, v in timings.items()}}
+    logger.info(f"Invoice risk_score updated: {summary}")
+    return summary
 
 
 if __name__ == "__main__":
@@ -0,0 +1,122 @@
+import os
+from typing import Dict, Any, List, Optional, Tuple
+
+from neo4j import GraphDatabase
+from loguru import logger
+
+
+NEO4J_URI = os.getenv("NEO4J_URI", "bolt://localhost:7687")
+NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
+NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "neo4j")
+DB = os.getenv("NEO4J_DB", "neo4j")
+
+SCHEMA_PATH = os.path.join(os.path.dirname(__file__), "../neo4j/schema.cypher")
+INDEX_WAIT_SECONDS = int(os.getenv("NEO4J_INDEX_WAIT_SECONDS", "300"))
+
+# Plan operators that read every node of a label, or every node in the graph.
+LABEL_SCAN_OPERATORS = ("NodeByLabelScan",)
+FULL_SCAN_OPERATORS = ("AllNodesScan", "CartesianProduct")
+
+PENDING_INDEXES = "SHOW INDEXES YIELD name, state, populationPercent WHERE state <> 'ONLINE' RETURN name, state, populationPercent"
+
+# name -> (cypher, example parameters) for the statements EXPLAIN should cover
+Statements = Dict[str, Tuple[str, Dict[str, Any]]]
+
+
+def load_statements(path: str = SCHEMA_PATH) -> List[str]:
+    with open(path) as f:
+        lines = [line for line in f if not line.strip().startswith("//")]
+    return [stmt.strip() for stmt in "".join(lines).split(";") if stmt.strip()]
+
+
+def _operators(plan: Optional[Dict[str, Any]]) -> List[str]:
+    if not plan:
+        return []
+    ops = [plan.get("operatorType", "").split("@")[0]]
+    for child in plan.get("children", []):
+        ops.extend(_operators(child))
+    return ops
+
+
+def _plan_finding(name: str, plan: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    ops = _operators(plan)
+    full = sorted({op for op in ops if op in FULL_SCAN_OPERATORS})
+    label = sorted({op for op in ops if op in LABEL_SCAN_OPERATORS})
+    return {"statement": name, "full_scans": full, "label_scans": label, "operators": ops}
+
+
+def _log_findings(findings: List[Dict[str, Any]]):
+    for f in findings:
+        if f.get("error"):
+            logger.warning(f"EXPLAIN {f['statement']} failed: {f['error']}")
+        elif f["full_scans"]:
+            logger.warning(f"{f['statement']} plans a full graph scan: {', '.join(f['full_scans'])}")
+        elif f["label_scans"]:
+            logger.warning(f"{f['statement']} falls back to a label scan: {', '.join(f['label_scans'])}")
+        else:
+            logger.debug(f"{f['statement']} is index-backed")
+
+
+def ensure_schema(session, wait_seconds: int = INDEX_WAIT_SECONDS) -> List[Dict[str, Any]]:
+    """Apply neo4j/schema.cypher and block until every index is ONLINE.
+
+    Returns the indexes still populating if the wait timed out.
+    """
+    for stmt in load_statements():
+        session.run(stmt).consume()
+    try:
+        session.run("CALL db.awaitIndexes($timeout)", timeout=wait_seconds).consume()
+    except Exception as e:
+        logger.warning(f"Indexes not online after {wait_seconds}s: {e}")
+    pending = session.run(PENDING_INDEXES).data()
+    if pending:
+        logger.warning(f"Indexes still populating: {pending}")
+    else:
+        logger.info("Schema constraints and indexes are online")
+    return pending
+
+
+def explain(session, statements: Statements) -> List[Dict[str, Any]]:
+    findings = []
+    for name, (query, params) in statements.items():
+        try:
+            plan = session.run("EXPLAIN " + query, **params).consume().plan
+            findings.append(_plan_finding(name, plan))
+        except Exception as e:
+            findings.append({"statement": name, "error": str(e), "full_scans": [], "label_scans": [], "operators": []})
+    _log_findings(findings)
+    return findings
+
+
+async def ensure_schema_async(session, wait_seconds: int = INDEX_WAIT_SECONDS) -> List[Dict[str, Any]]:
+    for stmt in load_statements():
+        await (await session.run(stmt)).consume()
+    try:
+        await (await session.run("CALL db.awaitIndexes($timeout)", timeout=wait_seconds)).consume()
+    except Exception as e:
+        logger.warning(f"Indexes not online after {wait_seconds}s: {e}")
+    pending = await (await session.run(PENDING_INDEXES)).data()
+    if pending:
+        logger.warning(f"Indexes still populating: {pending}")
+    else:
+        logger.info("Schema constraints and indexes are online")
+    return pending
+
+
+async def explain_async(session, statements: Statements) -> List[Dict[str, Any]]:
+    findings = []
+    for name, (query, params) in statements.items():
+        try:
+            summary = await (await session.run("EXPLAIN " + query, **params)).consume()
+            findings.append(_plan_finding(name, summary.plan))
+        except Exception as e:
+            findings.append({"statement": name, "error": str(e), "full_scans": [], "label_scans": [], "operators": []})
+    _log_findings(findings)
+    return findings
+
+
+if __name__ == "__main__":
+    driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+    with driver.session(database=DB) as session:
+        ensure_schema(session)
+    driver.close()
@@ -0,0 +1,32 @@
+import numpy as np
+
+from gds.csr_engine import CSRGraph, label_propagation, pagerank, wcc
+
+
+def graph(n, edges):
+    src, dst = np.array(edges, dtype=np.int64).T
+    return CSRGraph(n, src, dst)
+
+
+def test_duplicate_edges_are_merged():
+    g = graph(3, [(0, 1), (0, 1), (1, 2), (2, 0)])
+    assert g.edges == 3
+    assert g.indptr.tolist() == [0, 1, 2, 3]
+
+
+def test_pagerank_on_a_cycle_is_uniform():
+    scores, iterations = pagerank(graph(3, [(0, 1), (1, 2), (2, 0)]), max_iter=200)
+    assert np.allclose(scores, 1.0)
+    assert iterations < 200
+
+
+def test_wcc_labels_each_component_by_its_smallest_node():
+    src, dst = np.array([1, 2, 4]), np.array([0, 1, 3])
+    assert wcc(5, src, dst).tolist() == [0, 0, 0, 3, 3]
+
+
+def test_label_propagation_splits_disjoint_triangles():
+    communities, _ = label_propagation(graph(6, [(0, 1), (1, 2), (2, 0), (3, 4), (4, 5), (5, 3)]))
+    assert len(set(communities[:3])) == 1
+    assert len(set(communities[3:])) == 1
+    assert communities[0] != communities[3]
@@ -0,0 +1,32 @@
+import numpy as np
+
+from gds.cycle_detection import detect, prune
+
+
+def edges(pairs, tax=None):
+    src, dst = np.array(pairs, dtype=np.int64).T
+    return src, dst, np.array(tax or [1.0] * len(pairs), dtype=np.float64)
+
+
+def test_prune_drops_edges_that_cannot_close_a_loop():
+    src, dst, _ = edges([(0, 1), (1, 2), (2, 0), (2, 3)])
+    keep, hubs = prune(4, src, dst)
+    assert keep.tolist() == [True, True, True, False]
+    assert hubs == 0
+
+
+def test_three_cycle_found_once_and_two_cycle_skipped():
+    src, dst, tax = edges([(0, 1), (1, 2), (2, 0), (3, 4), (4, 3), (2, 5)], [10.0, 20.0, 30.0, 5.0, 5.0, 1.0])
+    cycles, stats = detect(6, src, dst, tax, workers=1)
+    assert [c["members"] for c in cycles] == [[0, 1, 2]]
+    assert cycles[0]["total_tax"] == 60.0
+    assert cycles[0]["min_edge_tax"] == 10.0
+    assert stats["truncated"] == 0
+
+
+def test_limit_truncates_the_search():
+    n = 6
+    src, dst, tax = edges([(a, b) for a in range(n) for b in range(n) if a != b])
+    cycles, stats = detect(n, src, dst, tax, workers=1, limit=1)
+    assert len(cycles) == 1
+    assert stats["truncated"] >= 1
@@ -0,0 +1,41 @@
+import pandas as pd
+
+from recon import fuzzy
+
+
+def test_equivalent_formats_normalise_alike():
+    numbers = pd.Series(["INV/2024/0012", "inv-2024-12", "2024/12", "INV 2024 12"])
+    assert fuzzy.normalize_numbers(numbers).tolist() == ["2024-12"] * 4
+
+
+def test_digit_groups_stay_apart():
+    first, second = fuzzy.normalize_numbers(pd.Series(["INV/1/23", "INV/12/3"])).tolist()
+    assert (first, second) == ("1-23", "12-3")
+
+
+def invoices(rows):
+    return pd.DataFrame(rows, columns=["seller_gstin", "buyer_gstin", "invoice_id", "invoice_date", "tax_amount"])
+
+
+def claims(rows):
+    return pd.DataFrame(rows, columns=["seller_gstin", "buyer_gstin", "invoice_id", "invoice_date", "claimed_tax_amount"])
+
+
+def test_reformatted_number_matches():
+    pairs = fuzzy.match(invoices([("S1", "B1", "INV/2024/0012", "2024-01-05", 100.0)]),
+                        claims([("S1", "B1", "2024-12", "2024-01-05", 100.0)]))
+    assert pairs[["row_inv", "row_claim"]].values.tolist() == [[0, 0]]
+    assert pairs["confidence"].iloc[0] == 1.0
+
+
+def test_undated_claim_pairs_by_amount():
+    pairs = fuzzy.match(invoices([("S1", "B1", "INV/1/23", "2024-01-05", 100.0)]),
+                        claims([("S1", "B1", "INV/1/24", None, 100.0)]))
+    assert pairs[["row_inv", "row_claim"]].values.tolist() == [[0, 0]]
+    assert fuzzy.MIN_CONFIDENCE <= pairs["confidence"].iloc[0] < 1.0
+
+
+def test_other_buyer_is_never_paired():
+    pairs = fuzzy.match(invoices([("S1", "B1", "INV/2024/0012", "2024-01-05", 100.0)]),
+                        claims([("S1", "B2", "2024-12", "2024-01-05", 100.0)]))
+    assert pairs.empty
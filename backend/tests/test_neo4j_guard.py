@@ -0,0 +1,152 @@
+import asyncio
+
+import pytest
+from neo4j.exceptions import ClientError, ResultConsumedError, ServiceUnavailable
+
+from app import neo4j_guard
+from app.neo4j_guard import CircuitOpenError, GuardedDriver
+
+
+class FakeResult:
+    def __init__(self, mode):
+        self.mode = mode
+
+    async def single(self):
+        if self.mode == "consumed":
+            raise ResultConsumedError(self, "result already consumed")
+        return {"ok": 1}
+
+    async def consume(self):
+        return None
+
+
+class FakeSession:
+    def __init__(self, driver):
+        self.driver = driver
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def run(self, query, **params):
+        self.driver.calls += 1
+        if self.driver.mode == "down":
+            raise ServiceUnavailable("connection refused")
+        if self.driver.mode == "stall":
+            await asyncio.sleep(1)
+        if self.driver.mode == "bad":
+            raise ClientError("syntax error")
+        return FakeResult(self.driver.mode)
+
+
+class FakeDriver:
+    """Async driver stand-in whose queries succeed, fail, stall, are rejected or misread per `mode`."""
+
+    def __init__(self):
+        self.mode = "up"
+        self.calls = 0
+
+    def session(self, **kwargs):
+        return FakeSession(self)
+
+
+async def query(guard, timeout=1.0):
+    async with guard.session(query_timeout=timeout) as session:
+        result = await session.run("RETURN 1 AS ok")
+        return await result.single()
+
+
+@pytest.fixture
+def fast_breaker(monkeypatch):
+    monkeypatch.setattr(neo4j_guard, "BREAKER_THRESHOLD", 3)
+    monkeypatch.setattr(neo4j_guard, "BREAKER_PROBE_S", 0.01)
+
+
+def test_breaker_opens_after_threshold_and_probe_closes_it(fast_breaker):
+    async def scenario():
+        driver = FakeDriver()
+        guard = GuardedDriver(driver, "neo4j")
+        driver.mode = "down"
+        for _ in range(3):
+            with pytest.raises(ServiceUnavailable):
+                await query(guard)
+        assert guard.breaker.state == "open"
+        calls = driver.calls
+        with pytest.raises(CircuitOpenError):
+            await query(guard)
+        assert driver.calls == calls
+
+        await asyncio.sleep(0.05)
+        assert guard.breaker.state == "open"
+        driver.mode = "up"
+        for _ in range(100):
+            if guard.breaker.state == "closed":
+                break
+            await asyncio.sleep(0.01)
+        assert guard.breaker.state == "closed"
+        assert await query(guard) == {"ok": 1}
+        assert guard.breaker.counts["trips"] == 1
+        assert guard.breaker.counts["rejected"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_timeouts_count_towards_the_breaker(fast_breaker):
+    async def scenario():
+        driver = FakeDriver()
+        guard = GuardedDriver(driver, "neo4j")
+        driver.mode = "stall"
+        for _ in range(3):
+            with pytest.raises(asyncio.TimeoutError):
+                await query(guard, timeout=0.01)
+        assert guard.breaker.counts["timeouts"] == 3
+        assert guard.breaker.state == "open"
+        guard._probe.cancel()
+
+    asyncio.run(scenario())
+
+
+def test_query_errors_do_not_count(fast_breaker):
+    async def scenario():
+        driver = FakeDriver()
+        guard = GuardedDriver(driver, "neo4j")
+        driver.mode = "bad"
+        for _ in range(5):
+            with pytest.raises(ClientError):
+                await query(guard)
+        assert guard.breaker.state == "closed"
+        assert guard.breaker.consecutive_failures == 0
+
+    asyncio.run(scenario())
+
+
+def test_success_resets_the_failure_count(fast_breaker):
+    async def scenario():
+        driver = FakeDriver()
+        guard = GuardedDriver(driver, "neo4j")
+        for mode in ("down", "down", "up", "down", "down"):
+            driver.mode = mode
+            try:
+                await query(guard)
+            except ServiceUnavailable:
+                pass
+        assert guard.breaker.state == "closed"
+        assert guard.breaker.consecutive_failures == 2
+
+    asyncio.run(scenario())
+
+
+def test_client_side_misuse_does_not_count(fast_breaker):
+    async def scenario():
+        driver = FakeDriver()
+        guard = GuardedDriver(driver, "neo4j")
+        driver.mode = "consumed"
+        for _ in range(5):
+            with pytest.raises(ResultConsumedError):
+                await query(guard)
+        assert guard.breaker.state == "closed"
+        assert guard.breaker.counts["failures"] == 0
+
+    asyncio.run(scenario())
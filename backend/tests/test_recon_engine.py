@@ -0,0 +1,38 @@
+import pandas as pd
+
+from recon.engine import reconcile_frames
+
+
+def supply(rows):
+    columns = ["seller_gstin", "buyer_gstin", "invoice_id", "invoice_date", "tax_amount", "claimed_tax_amount", "return_id"]
+    return pd.DataFrame(rows, columns=columns)
+
+
+def test_duplicate_invoice_rows_reconcile_once():
+    frame = supply([
+        ("S1", "B1", "INV1", "2024-01-05", 100.0, 100.0, "R1"),
+        ("S1", "B1", "INV1", "2024-01-05", 100.0, 90.0, None),
+        ("S1", "B2", "INV2", "2024-01-06", 50.0, 50.0, "R1"),
+    ])
+    mismatches, summary = reconcile_frames(frame, fuzzy_match=False)
+    assert summary["invoices"] == 2
+    assert mismatches["invoice_id"].tolist() == ["INV1"]
+    row = mismatches.iloc[0]
+    assert row["tax_discrepancy"]
+    assert not row["missing_return"]
+    assert not row["missing_claim"]
+    assert row["claimed_tax_amount"] == 90.0
+
+
+def test_separate_claims_and_returns():
+    frame = supply([
+        ("S1", "B1", "INV1", "2024-01-05", 100.0, None, None),
+        ("S1", "B2", "INV2", "2024-01-06", 50.0, None, None),
+    ])
+    claims = pd.DataFrame({"seller_gstin": ["S1", "S9"], "buyer_gstin": ["B1", "B9"],
+                           "invoice_id": ["INV1", "INV9"], "claimed_tax_amount": [100.0, 10.0]})
+    returns = pd.DataFrame({"seller_gstin": ["S1"], "invoice_id": ["INV1"], "return_id": ["R1"]})
+    mismatches, summary = reconcile_frames(frame, claims, returns, fuzzy_match=False)
+    assert mismatches["invoice_id"].tolist() == ["INV2"]
+    assert mismatches.iloc[0]["missing_return"] and mismatches.iloc[0]["missing_claim"]
+    assert summary["unmatched_claims"] == 1
@@ -1,18 +1,42 @@
-import { useEffect } from 'react'
+import { useEffect, useRef } from 'react'
 import { apiBase } from '../services/api'
 
+type Payload = Record<string, Record<string, any>>
+
+// The server sends a full "snapshot" on connect (and whenever this client fell
+// behind), then "diff" messages holding only changed keys; null removes a key.
+function merge(state: Payload, message: any): Payload {
+  const { type, seq, ...sections } = message
+  if (type !== 'diff') return sections
+  const next: Payload = { ...state }
+  for (const [section, changes] of Object.entries(sections as Payload)) {
+    const merged = { ...(state[section] || {}) }
+    for (const [key, value] of Object.entries(changes)) {
+      if (value === null) delete merged[key]
+      else merged[key] = value
+    }
+    next[section] = merged
+  }
+  return next
+}
+
 export default function useDashboardStream(onData: (data: any) => void) {
+  // Latest callback without reopening the socket on every render
+  const callback = useRef(onData)
+  callback.current = onData
+
   useEffect(() => {
     const wsUrl = apiBase.replace('http', 'ws') + '/ws/dashboard'
     const ws = new WebSocket(wsUrl)
+    let state: Payload = {}
     ws.onmessage = (ev) => {
       try {
-        const data = JSON.parse(ev.data)
-        onData(data)
+        state = merge(state, JSON.parse(ev.data))
+        callback.current(state)
       } catch {}
     }
     return () => {
       ws.close()
     }
-  }, [onData])
+  }, [])
 }
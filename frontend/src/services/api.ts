@@ -28,7 +28,18 @@ export const getDashboardSummary = (params?: any) => api.get('/dashboard-summary
 export const getVendorRisk = (gstin: string) => api.get(`/vendor-risk/${gstin}`).then(r => r.data)
 export const getVendorSamples = () => api.get('/vendor-samples').then(r => r.data)
 export const getInvoiceTrace = (invoice_id: string) => api.get(`/invoice-trace/${invoice_id}`).then(r => r.data)
-export const getReconcile = () => api.get('/reconcile').then(r => r.data)
+export const postInvoiceTraces = (invoice_ids: string[]) => api.post('/invoice-trace/batch', { invoice_ids }).then(r => r.data)
+// /reconcile is keyset-paged: follow X-Next-Cursor until the last page so callers get every mismatch
+export const getReconcile = async (params?: any) => {
+  const items: any[] = []
+  let after: string | undefined
+  do {
+    const r = await api.get('/reconcile', { params: { ...params, after } })
+    items.push(...r.data)
+    after = r.headers['x-next-cursor'] || undefined
+  } while (after)
+  return items
+}
 export const getGraphData = () => api.get('/graph-data').then(r => r.data)
 export const postSimulateRisk = (payload: any) => api.post('/simulate-risk', payload).then(r => r.data)
 export const postModelTrain = () => api.post('/model/train').then(r => r.data)